@@ -0,0 +1,63 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import shutil
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def change_same_length_near_end(settings, section_count):
+    # key_2 holds "590", so another three-digit number keeps the line's length
+    settings.set_value("key_2", 591, f"section_{section_count - 3}")
+
+
+def change_length_near_end(settings, section_count):
+    settings.set_value("key_2", 5900, f"section_{section_count - 3}")
+
+
+def add_key_near_end(settings, section_count):
+    settings.add_entry("new_key", "new value", f"section_{section_count - 3}")
+
+
+def change_length_near_start(settings, section_count):
+    settings.set_value("key_2", 5900, "section_2")
+
+
+def time_save(file_path, work_path, change, section_count, in_place_save, repeat):
+    times = []
+
+    for _ in range(repeat):
+        shutil.copyfile(file_path, work_path)
+        settings = SettingsManager(work_path, in_place_save=in_place_save, instrument=True)
+        change(settings, section_count)
+        start = time.perf_counter()
+        settings.save()
+        times.append(time.perf_counter() - start)
+
+    return min(times), settings.stats()["counters"]["bytes_written"]
+
+
+def main(section_count=2000, keys_per_section=50, repeat=5):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        work_path = os.path.join(directory, "settings_work.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        print(f"save one change to a {os.path.getsize(file_path) / 2 ** 20:.1f} MiB file")
+
+        for change in (change_same_length_near_end, change_length_near_end, add_key_near_end,
+                       change_length_near_start):
+            print(f"  {change.__name__}")
+
+            for in_place_save in (False, True):
+                elapsed, bytes_written = time_save(file_path, work_path, change, section_count, in_place_save, repeat)
+                label = "in place:" if in_place_save else "replace file:"
+                print(f"    {label:14} {elapsed * 1000:7.2f} ms, {bytes_written:9} bytes written")
+
+
+if __name__ == "__main__":
+    main()
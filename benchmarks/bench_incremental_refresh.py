@@ -0,0 +1,66 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+class FullRefreshSettingsManager(SettingsManager):
+    # refresh as it was before unchanged sections were kept and changes listed, kept as the "before" measurement
+    def refresh(self):
+        with self._lock:
+            self._set_state(*self._load_state())
+
+    def _parse_changed_sections(self):
+        return self._parse_file()
+
+
+def edit_file(file_path, lines, section_count, edited_count, value):
+    # Changes key_2 of edited_count sections spread over the file
+    step = section_count // edited_count
+    lines_per_section = len(lines) // section_count
+    lines = list(lines)
+
+    for section_index in range(0, step * edited_count, step):
+        lines[section_index * lines_per_section + 3] = f"key_2 = {value}\n"
+
+    with open(file_path, "w") as file:
+        file.writelines(lines)
+
+
+def time_refresh(settings_type, file_path, lines, section_count, edited_count, repeat):
+    settings = settings_type(file_path)
+    times = []
+
+    for index in range(repeat):
+        edit_file(file_path, lines, section_count, edited_count, index)
+        start = time.perf_counter()
+        settings.refresh()
+        times.append(time.perf_counter() - start)
+
+    return min(times)
+
+
+def main(section_count=2000, keys_per_section=50, repeat=5):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        with open(file_path) as file:
+            lines = file.readlines()
+
+        print(f"refresh after editing a {os.path.getsize(file_path) / 2 ** 20:.1f} MiB file of {section_count} sections")
+
+        for edited_count in (1, section_count // 100, section_count // 10, section_count):
+            before = time_refresh(FullRefreshSettingsManager, file_path, lines, section_count, edited_count, repeat)
+            after = time_refresh(SettingsManager, file_path, lines, section_count, edited_count, repeat)
+            print(f"  {edited_count:5} sections edited: before {before * 1000:7.1f} ms, after {after * 1000:7.1f} ms "
+                  f"({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+import tracemalloc
+from settingsmanager import SettingsManager, iter_entries
+from bench_refresh import generate_file
+
+
+def scan_with_manager(file_path, sections):
+    settings = SettingsManager(file_path)
+    selected = settings.get_sections() if sections is None else [settings.get_section(name) for name in sections]
+    return sum(len(section.get_attributes()) for section in selected)
+
+
+def scan_with_iter_entries(file_path, sections):
+    return sum(1 for _ in iter_entries(file_path, sections))
+
+
+def measure(scan, file_path, sections):
+    start = time.perf_counter()
+    count = scan(file_path, sections)
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced in a separate run, as tracing slows the scan down
+    tracemalloc.start()
+    scan(file_path, sections)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main(section_count=2000, keys_per_section=50):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        file_size = os.path.getsize(file_path)
+
+        print(f"scan every entry of a {file_size / 2 ** 20:.1f} MiB file, then only section_1000")
+
+        for sections in (None, ["section_1000"]):
+            for scan in (scan_with_manager, scan_with_iter_entries):
+                count, elapsed, peak = measure(scan, file_path, sections)
+                print(f"  {scan.__name__ + ':':24} {count:7} entries, {elapsed * 1000:7.1f} ms, "
+                      f"peak {peak / 2 ** 20:5.1f} MiB allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import shutil
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def update_and_save(settings, update_count):
+    for index in range(update_count):
+        settings.set_value("key_2", index, "section_0")
+        settings.save()
+
+
+def update_with_journal(settings, update_count):
+    for index in range(update_count):
+        settings.set_value("key_2", index, "section_0")
+
+
+def time_updates(update, file_path, work_path, update_count, **kwargs):
+    shutil.copyfile(file_path, work_path)
+    settings = SettingsManager(work_path, **kwargs)
+    start = time.perf_counter()
+    update(settings, update_count)
+    return time.perf_counter() - start
+
+
+def main(section_count=2000, keys_per_section=50, update_count=200):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        work_path = os.path.join(directory, "settings_work.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        print(f"{update_count} updates of one key in a {os.path.getsize(file_path) / 2 ** 20:.1f} MiB file")
+        elapsed = time_updates(update_and_save, file_path, work_path, update_count)
+        print(f"  {'save after each:':32} {elapsed * 1000:8.1f} ms, {elapsed / update_count * 10 ** 6:8.1f} us each")
+
+        for journal_threshold in (update_count + 1, 50):
+            elapsed = time_updates(update_with_journal, file_path, work_path, update_count, journal=True,
+                                   journal_threshold=journal_threshold)
+            label = f"journal, compacting every {journal_threshold}:"
+            print(f"  {label:32} {elapsed * 1000:8.1f} ms, {elapsed / update_count * 10 ** 6:8.1f} us each")
+
+
+if __name__ == "__main__":
+    main()
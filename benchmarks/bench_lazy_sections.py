@@ -0,0 +1,52 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+import tracemalloc
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def load(file_path, lazy_sections, sections_used):
+    settings = SettingsManager(file_path, lazy_sections=lazy_sections)
+
+    for section_name in sections_used:
+        settings.get_section(section_name).get_attributes()
+
+    return settings
+
+
+def measure(file_path, lazy_sections, sections_used):
+    start = time.perf_counter()
+    load(file_path, lazy_sections, sections_used)
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced in a separate run, as tracing slows the load down
+    tracemalloc.start()
+    settings = load(file_path, lazy_sections, sections_used)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(section_count=2000, keys_per_section=50):
+    sections_used = ["section_0", "section_1000", "section_1999"]
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        file_size = os.path.getsize(file_path)
+
+        before, before_peak = measure(file_path, False, sections_used)
+        after, after_peak = measure(file_path, True, sections_used)
+
+    print(f"load and use {len(sections_used)} of {section_count} sections, {file_size / 2 ** 20:.1f} MiB file")
+    print(f"  full refresh:  {before * 1000:.1f} ms, peak {before_peak / 2 ** 20:.1f} MiB allocated")
+    print(f"  lazy sections: {after * 1000:.1f} ms, peak {after_peak / 2 ** 20:.1f} MiB allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import timeit
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def load_and_read_all(file_path):
+    # Equivalent to the eager conversion done at load time before values were converted lazily
+    settings = SettingsManager(file_path)
+
+    for section in settings.get_sections():
+        section.get_attributes()
+
+    return settings
+
+
+def load_and_read_few(file_path, keys_read):
+    settings = SettingsManager(file_path)
+
+    for section_name, key in keys_read:
+        getattr(settings.get_section(section_name), key)
+
+    return settings
+
+
+def main(section_count=500, keys_per_section=40, repeat=5):
+    keys_read = [("section_0", "key_0"), ("section_10", "key_2"), ("section_200", "key_3"), ("section_499", "key_1")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        before = min(timeit.repeat(lambda: load_and_read_all(file_path), number=1, repeat=repeat))
+        after = min(timeit.repeat(lambda: load_and_read_few(file_path, keys_read), number=1, repeat=repeat))
+
+    print(f"load and read {len(keys_read)} of {section_count * keys_per_section} keys")
+    print(f"  converting every value: {before * 1000:.1f} ms")
+    print(f"  converting on access:   {after * 1000:.1f} ms ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
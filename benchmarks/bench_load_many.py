@@ -0,0 +1,57 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def load_one_at_a_time(paths, workers):
+    return [SettingsManager(path) for path in paths]
+
+
+def load_in_threads(paths, workers):
+    return SettingsManager.load_many(paths, max_workers=workers)
+
+
+def load_in_processes(paths, workers):
+    return SettingsManager.load_many(paths, max_workers=workers, use_processes=True)
+
+
+def measure(load, paths, workers, repeat=3):
+    times = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = load(paths, workers)
+        times.append(time.perf_counter() - start)
+        assert all(isinstance(settings, SettingsManager) for settings in results)
+
+    return min(times)
+
+
+def main(file_count=2000, section_count=5, keys_per_section=10):
+    worker_counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = [os.path.join(directory, f"tenant_{index}.txt") for index in range(file_count)]
+
+        for path in paths:
+            generate_file(path, section_count, keys_per_section)
+
+        print(f"load {file_count} files of {section_count * (keys_per_section + 2)} lines on {os.cpu_count()} cores")
+        baseline = measure(load_one_at_a_time, paths, 1)
+        print(f"  {'one at a time:':24} {baseline * 1000:8.1f} ms")
+
+        for load in (load_in_threads, load_in_processes):
+            for workers in worker_counts:
+                elapsed = measure(load, paths, workers)
+                print(f"  {load.__name__ + f', {workers} workers:':24} {elapsed * 1000:8.1f} ms, "
+                      f"{baseline / elapsed:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import gc
+import tempfile
+import tracemalloc
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def measure(file_path, convert_values):
+    # Memory held by a loaded manager, excluding the file lines, which are the same whatever the section layout
+    gc.collect()
+    tracemalloc.start()
+    settings = SettingsManager(file_path)
+
+    if convert_values:
+        for section in settings.get_sections():
+            section.get_attributes()
+
+    settings._lines_raw = None
+    settings._lines_cleaned = None
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def main():
+    shapes = [("many sections", 100000, 3), ("wide sections", 100, 3000)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+
+        for name, section_count, keys_per_section in shapes:
+            generate_file(file_path, section_count, keys_per_section)
+            key_count = section_count * keys_per_section
+            print(f"{name}: {section_count} sections of {keys_per_section} keys")
+
+            for convert_values in (False, True):
+                size = measure(file_path, convert_values)
+                state = "values converted" if convert_values else "values unread"
+                print(f"  {state + ':':18} {size / 2 ** 20:6.1f} MiB, {size / key_count:5.0f} bytes per key")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import multiprocessing
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def save_keys(file_path, process_index, save_count):
+    settings = SettingsManager(file_path, merge_on_save=True)
+
+    for save_index in range(save_count):
+        settings.set_value(f"process_{process_index}_key_{save_index}", save_index, "section_0")
+        settings.save()
+
+
+def main(section_count=100, keys_per_section=20, process_count=8, save_count=50):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        processes = [multiprocessing.Process(target=save_keys, args=(file_path, index, save_count))
+                     for index in range(process_count)]
+        start = time.perf_counter()
+
+        for process in processes:
+            process.start()
+
+        for process in processes:
+            process.join()
+
+        elapsed = time.perf_counter() - start
+        keys = SettingsManager(file_path).section_0.get_attributes()
+        keys_saved = len([key for key in keys if key.startswith("process_")])
+
+    print(f"{process_count} processes each saving {save_count} new keys to one file with merge_on_save")
+    print(f"  {process_count * save_count / elapsed:.0f} saves/s, {keys_saved} of {process_count * save_count} "
+          f"keys in the final file")
+
+
+if __name__ == "__main__":
+    main()
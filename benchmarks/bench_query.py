@@ -0,0 +1,59 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+import timeit
+from fnmatch import fnmatchcase
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+# Each query as it was written by hand before the query methods, kept as the "before" measurement
+def find_by_scan(settings, section_pattern, key_pattern):
+    return [(section.get_name(), key, value) for section in settings.get_sections()
+            if fnmatchcase(section.get_name(), section_pattern)
+            for key, value in section.get_attributes().items() if fnmatchcase(key, key_pattern)]
+
+
+def sections_with_by_scan(settings, key):
+    return [section for section in settings.get_sections() if key in section.get_attributes()]
+
+
+def prefix_by_scan(settings, section, prefix):
+    return {key: value for key, value in settings.get_section(section).get_attributes().items()
+            if key.startswith(prefix)}
+
+
+def main(section_count=2000, keys_per_section=50, repeat=20):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        settings = SettingsManager(file_path)
+
+        start = time.perf_counter()
+        settings.find("section_0")
+        print(f"{section_count} sections of {keys_per_section} keys, index built in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        queries = [("find one key in every section", lambda: find_by_scan(settings, "*", "key_7"),
+                    lambda: settings.find("*", "key_7")),
+                   ("find keys in sections by glob", lambda: find_by_scan(settings, "section_19??", "key_1*"),
+                    lambda: settings.find("section_19??", "key_1*")),
+                   ("sections_with", lambda: sections_with_by_scan(settings, "key_49"),
+                    lambda: settings.sections_with("key_49")),
+                   ("prefix", lambda: prefix_by_scan(settings, "section_1000", "key_4"),
+                    lambda: settings.prefix("section_1000", "key_4"))]
+
+        for name, before_query, after_query in queries:
+            assert sorted(map(repr, before_query())) == sorted(map(repr, after_query()))
+            before = min(timeit.repeat(before_query, number=1, repeat=repeat))
+            after = min(timeit.repeat(after_query, number=1, repeat=repeat))
+            print(f"  {name + ':':32} before {before * 1000:8.3f} ms, after {after * 1000:8.3f} ms "
+                  f"({before / after:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import timeit
+from settingsmanager import SettingsManager
+
+
+class LegacySettingsManager(SettingsManager):
+    # refresh as it was before the single-pass tokenizer, kept as the "before" measurement
+    def refresh(self):
+        self._clear_attributes()
+        self._read_file()
+
+        section = None
+
+        for index, line in enumerate(self._lines_cleaned):
+            if self._is_line_a_heading(line):
+                if section is not None:
+                    self._set_section_end_index(section, index, self._lines_cleaned)
+
+                heading_name = self._get_heading_from_line(line)
+                section = self.add_section(heading_name)
+                section._start_index_in_file = index
+                continue
+
+            if self._is_line_an_entry(line):
+                key = self._get_key_from_line(line)
+                value = self._get_value_from_line(line, self._parse_bool, self._parse_float, self._parse_int)
+                self.add_entry(key, value, section)
+
+        if section is not None:
+            self._set_section_end_index(section, len(self._lines_cleaned), self._lines_cleaned)
+
+
+def generate_file(file_path, section_count, keys_per_section):
+    values = ["some text value", "True", "590", "1.989", "a, list, of, items", "12.345!"]
+
+    with open(file_path, "w") as file:
+        for section_index in range(section_count):
+            file.write(f"[section_{section_index}]\n")
+
+            for key_index in range(keys_per_section):
+                file.write(f"key_{key_index} = {values[key_index % len(values)]}\n")
+
+            file.write("# comment line\n\n")
+
+
+def main(section_count=500, keys_per_section=40, repeat=5):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        legacy = LegacySettingsManager(file_path)
+        settings = SettingsManager(file_path)
+
+        for section in settings.get_sections():
+            assert section.get_attributes() == legacy.get_section(section.get_name()).get_attributes()
+
+        line_count = len(settings._lines_raw)
+        before = min(timeit.repeat(legacy.refresh, number=1, repeat=repeat))
+        after = min(timeit.repeat(settings.refresh, number=1, repeat=repeat))
+
+    print(f"refresh, {line_count} lines")
+    print(f"  before: {before * 1000:.1f} ms")
+    print(f"  after:  {after * 1000:.1f} ms ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import shutil
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+class ListDeleteSettingsManager(SettingsManager):
+    # Removal by deleting each line from the file lines and shifting every later section, kept as the "before"
+    # measurement
+    def remove_entry(self, key, section):
+        section = self.get_section(section)
+
+        for index in range(section._start_index_in_file + 1, section._end_index_in_file):
+            if self._tokenize_line(self._lines_cleaned[index])[1] == key:
+                break
+
+        del self._lines_raw[index]
+        del self._lines_cleaned[index]
+        del section._entries[key]
+        section.__dict__.pop(key, None)
+        section._end_index_in_file -= 1
+
+        for other in self.get_sections():
+            if other._start_index_in_file > index:
+                other._start_index_in_file -= 1
+                other._end_index_in_file -= 1
+
+    def save(self, new_file_path=None):
+        # Written in full, as the lines no longer match the file
+        self._write_file(self._file_path)
+
+
+def time_removals(settings_type, file_path, work_path, section_count, removal_count):
+    shutil.copyfile(file_path, work_path)
+    settings = settings_type(work_path)
+    step = section_count // removal_count
+    start = time.perf_counter()
+
+    for section_index in range(0, step * removal_count, step):
+        settings.remove_entry("key_2", f"section_{section_index}")
+
+    removed = time.perf_counter() - start
+    settings.save()
+    return removed, time.perf_counter() - start
+
+
+def main(section_count=2000, keys_per_section=50):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        work_path = os.path.join(directory, "settings_work.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        print(f"remove keys from a {os.path.getsize(file_path) / 2 ** 20:.1f} MiB file of {section_count} sections, "
+              f"then save")
+
+        for removal_count in (1, 100, 1000):
+            before_removed, before = time_removals(ListDeleteSettingsManager, file_path, work_path, section_count,
+                                                   removal_count)
+            after_removed, after = time_removals(SettingsManager, file_path, work_path, section_count, removal_count)
+
+            with open(work_path) as file:
+                assert "key_2 =" not in file.read().split("[section_1]")[0]
+
+            print(f"  {removal_count:5} keys: before {before * 1000:8.1f} ms ({before_removed * 1000:8.1f} ms removing), "
+                  f"after {after * 1000:7.1f} ms ({after_removed * 1000:6.2f} ms removing)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+class LegacySettingsManager(SettingsManager):
+    # Inserts each new key with list.insert and shifts every later section, as save() did before batching
+    def save(self, new_file_path=None):
+        if new_file_path is None:
+            new_file_path = self._file_path
+
+        self._file_path = new_file_path
+        sections = self.get_sections()
+
+        for section in sections:
+            if section._start_index_in_file is None:
+                self._insert_new_section_line(section)
+
+        for section in sections:
+            section_attrs_to_add = section.get_attributes()
+
+            for index in range(section._start_index_in_file + 1, section._end_index_in_file):
+                line = self._lines_cleaned[index]
+
+                if self._is_line_an_entry(line):
+                    key = self._get_key_from_line(line)
+                    value = getattr(section, key)
+                    self._lines_raw[index] = self._generate_file_line(key, value)
+
+                    del section_attrs_to_add[key]
+
+            for key in section_attrs_to_add:
+                value = section_attrs_to_add.get(key)
+                self._legacy_insert_line_into_section(section, self._generate_file_line(key, value))
+
+        with open(new_file_path, "w") as file:
+            file.writelines(self._lines_raw)
+
+    def _legacy_insert_line_into_section(self, section, value):
+        index = section._end_index_in_file
+        self._lines_raw.insert(index, value)
+        self._lines_cleaned.insert(index, self._clean_line(value))
+        section._end_index_in_file += 1
+
+        for section in self.get_sections():
+            if section._start_index_in_file >= index:
+                section._start_index_in_file += 1
+                section._end_index_in_file += 1
+
+
+def time_save_with_new_keys(settings_class, file_path, new_keys_per_section):
+    settings = settings_class(file_path)
+
+    for section in settings.get_sections():
+        for key_index in range(new_keys_per_section):
+            section.add_entry(f"new_key_{key_index}", key_index)
+
+    start = time.perf_counter()
+    settings.save(file_path + ".out")
+    elapsed = time.perf_counter() - start
+
+    with open(file_path + ".out") as file:
+        return elapsed, file.read()
+
+
+def main(section_count=300, keys_per_section=20, new_keys_per_section=10):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        before, output_before = time_save_with_new_keys(LegacySettingsManager, file_path, new_keys_per_section)
+        after, output_after = time_save_with_new_keys(SettingsManager, file_path, new_keys_per_section)
+        assert output_before == output_after
+
+    print(f"save, {section_count * new_keys_per_section} new keys across {section_count} sections")
+    print(f"  before: {before * 1000:.1f} ms")
+    print(f"  after:  {after * 1000:.1f} ms ({before / after:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
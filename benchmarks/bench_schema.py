@@ -0,0 +1,54 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import timeit
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+# The types of the values generate_file writes, in the order it cycles through them
+VALUE_TYPES = [str, bool, int, float, list, str]
+
+
+def make_schema(section_count, keys_per_section):
+    keys = {f"key_{key_index}": VALUE_TYPES[key_index % len(VALUE_TYPES)] for key_index in range(keys_per_section)}
+    return {f"section_{section_index}": keys for section_index in range(section_count)}
+
+
+def load_and_read_lists(file_path, list_keys, schema=None):
+    # Without a schema, list values are read as strings and split by the caller on every read
+    settings = SettingsManager(file_path, schema=schema)
+
+    for section in settings.get_sections():
+        values = section.get_attributes()
+
+        for key in list_keys:
+            value = values[key]
+
+            if schema is None:
+                value = settings.convert_string_to_list(value)
+
+    return settings
+
+
+def main(section_count=500, keys_per_section=40, repeat=5):
+    schema = make_schema(section_count, keys_per_section)
+    list_keys = [f"key_{key_index}" for key_index in range(keys_per_section) if VALUE_TYPES[key_index % 6] is list]
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        guessed = min(timeit.repeat(lambda: load_and_read_lists(file_path, list_keys), number=1, repeat=repeat))
+        declared = min(timeit.repeat(lambda: load_and_read_lists(file_path, list_keys, schema), number=1,
+                                     repeat=repeat))
+
+    print(f"load, read all {section_count * keys_per_section} values and split the lists")
+    print(f"  types guessed: {guessed * 1000:.1f} ms")
+    print(f"  with schema:   {declared * 1000:.1f} ms ({guessed / declared:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
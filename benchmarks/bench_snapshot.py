@@ -0,0 +1,63 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import gc
+import tempfile
+import time
+import tracemalloc
+from settingsmanager import SettingsManager
+from settingsmanager import SettingsSnapshot
+from bench_refresh import generate_file
+
+
+def read_values(settings, lookup_count, section_count):
+    for index in range(lookup_count):
+        getattr(settings.get_section(f"section_{index * 7919 % section_count}"), "key_2")
+
+
+def measure(load, lookup_count, section_count):
+    # Time a worker spends to start reading settings, the time of each lookup, then the memory it holds after them
+    start = time.perf_counter()
+    settings = load()
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    read_values(settings, lookup_count, section_count)
+    lookup_time = time.perf_counter() - start
+    del settings
+
+    gc.collect()
+    tracemalloc.start()
+    settings = load()
+    read_values(settings, lookup_count, section_count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return load_time, size, lookup_time / lookup_count
+
+
+def main(section_count=2000, keys_per_section=50, lookup_count=10000):
+    name = f"bench_snapshot_{os.getpid()}"
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        publisher = SettingsManager(file_path)
+        publisher.publish_snapshot(name)
+
+        try:
+            print(f"one worker reading a {os.path.getsize(file_path) / 2 ** 20:.1f} MiB file, {lookup_count} lookups")
+
+            for label, load in (("parse the file:", lambda: SettingsManager(file_path)),
+                                ("attach snapshot:", lambda: SettingsSnapshot(name))):
+                load_time, size, lookup_time = measure(load, lookup_count, section_count)
+                print(f"  {label:18} {load_time * 1000:8.2f} ms to start, {size / 2 ** 20:6.2f} MiB held, "
+                      f"{lookup_time * 10 ** 6:5.2f} us per lookup")
+        finally:
+            publisher.stop_publishing_snapshot()
+
+
+if __name__ == "__main__":
+    main()
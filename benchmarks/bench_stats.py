@@ -0,0 +1,34 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import timeit
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def main(section_count=500, keys_per_section=40, repeat=7):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+
+        plain = SettingsManager(file_path)
+        instrumented = SettingsManager(file_path, instrument=True)
+
+        print(f"refresh, {len(plain._lines_raw)} lines")
+
+        for name, settings in (("not instrumented", plain), ("instrumented", instrumented)):
+            elapsed = min(timeit.repeat(settings.refresh, number=1, repeat=repeat))
+            print(f"  {name + ':':17} {elapsed * 1000:.1f} ms")
+
+        print("last refresh, by phase:")
+
+        for phase, timings in instrumented.stats()["phases"].items():
+            if timings["calls"] > 0:
+                print(f"  {phase + ':':17} {timings['last'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
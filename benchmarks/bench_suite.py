@@ -0,0 +1,238 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from settingsmanager import SettingsManager
+from generators import SHAPES
+
+# Operations that time a batch of calls report the time per call
+CALLS_PER_BATCH = 1000
+NEW_KEYS_PER_SAVE = 100
+
+
+def get_file_path(file_path, work_path):
+    return file_path
+
+
+def load(file_path, work_path):
+    return SettingsManager(file_path)
+
+
+def load_with_check_stat(file_path, work_path):
+    return SettingsManager(file_path, check_stat=True)
+
+
+def load_with_sections_to_look_up(file_path, work_path):
+    settings = SettingsManager(file_path)
+    rng = random.Random(0)
+    section_names = [section.get_name() for section in settings.get_sections()]
+    return settings, [rng.choice(section_names) for _ in range(CALLS_PER_BATCH)]
+
+
+def load_with_keys_to_set(file_path, work_path):
+    settings = SettingsManager(file_path)
+    rng = random.Random(0)
+    sections = [section for section in settings.get_sections() if len(section._get_keys()) > 0]
+    keys = []
+
+    for _ in range(CALLS_PER_BATCH):
+        section = rng.choice(sections)
+        keys.append((rng.choice(list(section._get_keys())), section.get_name()))
+
+    return settings, keys
+
+
+def load_copy(file_path, work_path):
+    # Saved to a copy, so every run starts from the generated file
+    shutil.copyfile(file_path, work_path)
+    return SettingsManager(work_path)
+
+
+def load_copy_with_new_keys(file_path, work_path):
+    settings = load_copy(file_path, work_path)
+    sections = settings.get_sections()
+
+    for index in range(NEW_KEYS_PER_SAVE):
+        sections[index % len(sections)].add_entry(f"new_key_{index}", index)
+
+    return settings
+
+
+def construct(file_path):
+    return SettingsManager(file_path)
+
+
+def refresh(settings):
+    settings.refresh()
+
+
+def refresh_and_has_changed(settings):
+    settings.refresh_and_has_changed()
+
+
+def look_up_sections(settings_and_names):
+    settings, section_names = settings_and_names
+
+    for section_name in section_names:
+        settings.get_section(section_name)
+
+
+def set_values(settings_and_keys):
+    settings, keys = settings_and_keys
+
+    for index, (key, section_name) in enumerate(keys):
+        settings.set_value(key, index, section_name)
+
+
+def save(settings):
+    settings.save()
+
+
+# name: (setup(file path, work path) returning the argument of run, run(argument), calls per run)
+OPERATIONS = {
+    "construct": (get_file_path, construct, 1),
+    "refresh": (load, refresh, 1),
+    "refresh_and_has_changed": (load, refresh_and_has_changed, 1),
+    "refresh_and_has_changed_check_stat": (load_with_check_stat, refresh_and_has_changed, 1),
+    "get_section": (load_with_sections_to_look_up, look_up_sections, CALLS_PER_BATCH),
+    "set_value": (load_with_keys_to_set, set_values, CALLS_PER_BATCH),
+    "save_new_keys": (load_copy_with_new_keys, save, 1),
+    "save_no_changes": (load_copy, save, 1),
+}
+
+
+def measure(setup, run, file_path, work_path, repeat):
+    # Returns the run times, then the peak and retained memory allocated by one more run beyond what setup left
+    # allocated. Memory is traced separately, as tracing slows the run down.
+    times = []
+
+    for _ in range(repeat):
+        argument = setup(file_path, work_path)
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    argument = setup(file_path, work_path)
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    # Kept until measured, so what the run leaves allocated includes the manager itself for construct
+    result = run(argument)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return times, peak - baseline, size - baseline
+
+
+def get_metadata():
+    version = {}
+
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "settingsmanager", "version.py")) as file:
+        exec(file.read(), version)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "version": version["VERSION"],
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def run_suite(shapes, line_counts, operations, repeat):
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        work_path = os.path.join(directory, "settings_work.txt")
+
+        for shape in shapes:
+            for line_count in line_counts:
+                SHAPES[shape](file_path, line_count)
+                file_size = os.path.getsize(file_path)
+
+                for operation in operations:
+                    setup, run, calls = OPERATIONS[operation]
+                    times, peak, retained = measure(setup, run, file_path, work_path, repeat)
+                    result = {
+                        "shape": shape,
+                        "lines": line_count,
+                        "file_bytes": file_size,
+                        "operation": operation,
+                        "calls": calls,
+                        "seconds_min": min(times) / calls,
+                        "seconds_median": statistics.median(times) / calls,
+                        "peak_bytes": peak,
+                        "retained_bytes": retained,
+                    }
+                    results.append(result)
+                    print(f"{shape:14} {line_count:8} {operation:35} {result['seconds_min'] * 10 ** 6:12.1f} us "
+                          f"{peak / 2 ** 20:8.1f} MiB peak", file=sys.stderr)
+
+    return results
+
+
+def compare(results, baseline_results):
+    # Prints the change in time and peak memory for each result also in the baseline
+    baseline = {(result["shape"], result["lines"], result["operation"]): result for result in baseline_results}
+
+    print(f"{'shape':14} {'lines':>8} {'operation':35} {'time':>8} {'peak':>8}", file=sys.stderr)
+
+    for result in results:
+        before = baseline.get((result["shape"], result["lines"], result["operation"]))
+
+        if before is None:
+            continue
+
+        time_ratio = result["seconds_min"] / before["seconds_min"] if before["seconds_min"] > 0 else float("nan")
+        peak_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] > 0 else float("nan")
+        print(f"{result['shape']:14} {result['lines']:8} {result['operation']:35} {time_ratio:7.2f}x "
+              f"{peak_ratio:7.2f}x", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times and memory-profiles SettingsManager on synthetic files, "
+                                                 "writing the results as JSON.")
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--lines", nargs="+", type=int, default=[10 ** 3, 10 ** 4, 10 ** 5],
+                        help="line counts of the generated files, eg 1000 10000 100000 1000000")
+    parser.add_argument("--operations", nargs="+", choices=list(OPERATIONS), default=list(OPERATIONS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="file to write the JSON results to, instead of stdout")
+    parser.add_argument("--compare", help="JSON results of an earlier run, to print the change against")
+    args = parser.parse_args()
+
+    results = run_suite(args.shapes, args.lines, args.operations, args.repeat)
+    report = {"metadata": get_metadata(), "results": results}
+
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            compare(results, json.load(file)["results"])
+
+
+if __name__ == "__main__":
+    main()
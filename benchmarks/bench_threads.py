@@ -0,0 +1,73 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import threading
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def run_threads(targets, duration):
+    stop = threading.Event()
+    counts = [0] * len(targets)
+    errors = []
+
+    def run(index, target):
+        try:
+            while not stop.is_set():
+                target()
+                counts[index] += 1
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=run, args=(index, target)) for index, target in enumerate(targets)]
+
+    for thread in threads:
+        thread.start()
+
+    time.sleep(duration)
+    stop.set()
+
+    for thread in threads:
+        thread.join()
+
+    return counts, errors
+
+
+def main(section_count=200, keys_per_section=20, reader_count=4, writer_count=4, duration=1.0):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+        generate_file(file_path, section_count, keys_per_section)
+        settings = SettingsManager(file_path, thread_safe=True)
+
+        def read():
+            return settings.section_100.key_1
+
+        def write(index):
+            return lambda: settings.set_value(f"thread_{index}", 1, "section_0")
+
+        readers = [read] * reader_count
+        writers = [write(index) for index in range(writer_count)]
+
+        print(f"thread safe manager, {reader_count} readers, {writer_count} writers, {duration:.1f} s per run")
+
+        counts, errors = run_threads(readers, duration)
+        print(f"  reads/s, no reloads:      {sum(counts) / duration:12.0f} ({len(errors)} errors)")
+
+        counts, errors = run_threads(readers + [settings.refresh], duration)
+        print(f"  reads/s, during reloads:  {sum(counts[:-1]) / duration:12.0f} ({len(errors)} errors, "
+              f"{counts[-1]} reloads)")
+
+        counts, errors = run_threads(readers + writers, duration)
+        print(f"  reads/s, during writes:   {sum(counts[:reader_count]) / duration:12.0f} ({len(errors)} errors)")
+        print(f"  writes/s, {writer_count} writers:      {sum(counts[reader_count:]) / duration:12.0f}")
+
+        counts, errors = run_threads(writers[:1], duration)
+        print(f"  writes/s, 1 writer:       {sum(counts) / duration:12.0f} ({len(errors)} errors)")
+
+
+if __name__ == "__main__":
+    main()
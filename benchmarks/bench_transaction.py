@@ -0,0 +1,72 @@
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import tempfile
+import time
+from settingsmanager import SettingsManager
+from bench_refresh import generate_file
+
+
+def make_changes(section_count, change_count):
+    # Half edit existing keys and half add new ones, spread across the sections
+    changes = {}
+
+    for index in range(change_count):
+        key = f"key_{index // section_count}" if index % 2 == 0 else f"new_key_{index // section_count}"
+        changes.setdefault(f"section_{index % section_count}", {})[key] = index
+
+    return changes
+
+
+def save_per_key(settings, changes):
+    for section_name, values in changes.items():
+        for key, value in values.items():
+            settings.set_value(key, value, section_name)
+            settings.save()
+
+
+def save_once(settings, changes):
+    for section_name, values in changes.items():
+        for key, value in values.items():
+            settings.set_value(key, value, section_name)
+
+    settings.save()
+
+
+def update_many(settings, changes):
+    settings.update_many(changes)
+
+
+def measure(file_path, changes, apply_changes):
+    settings = SettingsManager(file_path)
+    start = time.perf_counter()
+    apply_changes(settings, changes)
+    elapsed = time.perf_counter() - start
+
+    with open(file_path) as file:
+        return elapsed, file.read()
+
+
+def main(section_count=300, keys_per_section=20, change_count=1000):
+    changes = make_changes(section_count, change_count)
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "settings.txt")
+
+        for apply_changes in (save_per_key, save_once, update_many):
+            generate_file(file_path, section_count, keys_per_section)
+            results.append((apply_changes.__name__, *measure(file_path, changes, apply_changes)))
+
+    assert len(set(output for _, _, output in results)) == 1
+
+    print(f"{change_count} changes across {section_count} sections of {keys_per_section} keys")
+
+    for name, elapsed, _ in results:
+        print(f"  {name + ':':14} {elapsed * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
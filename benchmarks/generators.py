@@ -0,0 +1,83 @@
+import random
+
+# Synthetic settings files of a given number of lines in several shapes. Each is generated from a fixed seed, so the
+# same shape and line count always give the same file.
+
+_WORDS = ["alpha", "beta", "gamma", "delta", "server", "timeout", "path", "user", "enabled", "retry"]
+
+
+def _text_value(rng):
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(1, 4)))
+
+
+def _mixed_value(rng):
+    kind = rng.randrange(6)
+
+    if kind == 0:
+        return _text_value(rng)
+    elif kind == 1:
+        return rng.choice(["True", "False", "true", "FALSE"])
+    elif kind == 2:
+        return str(rng.randint(-10 ** 6, 10 ** 6))
+    elif kind == 3:
+        return f"{rng.uniform(-1000, 1000):.4f}"
+    elif kind == 4:
+        return ", ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 6)))
+
+    # Looks like a number but is text
+    return f"{rng.randint(1, 99)}.{rng.randint(1, 99)}.{rng.randint(1, 99)}"
+
+
+def _write_sections(file_path, line_count, keys_per_section, make_value, blank_lines_between_keys=0, seed=0,
+                    separators=(" = ",)):
+    rng = random.Random(seed)
+    written = 0
+    section_index = 0
+
+    with open(file_path, "w") as file:
+        while written < line_count:
+            file.write(f"[section_{section_index}]\n")
+            written += 1
+
+            for key_index in range(keys_per_section):
+                if written >= line_count:
+                    break
+
+                file.write(f"key_{key_index}{rng.choice(separators)}{make_value(rng)}\n")
+                written += 1
+
+                for _ in range(rng.randint(0, blank_lines_between_keys)):
+                    file.write("\n")
+                    written += 1
+
+            file.write("\n")
+            written += 1
+            section_index += 1
+
+
+def generate_many_sections(file_path, line_count, seed=0):
+    # Small sections of five keys, so there are about line_count / 7 sections
+    _write_sections(file_path, line_count, 5, _text_value, seed=seed)
+
+
+def generate_wide_sections(file_path, line_count, seed=0):
+    # Ten sections, each with about line_count / 10 keys
+    _write_sections(file_path, line_count, max(line_count // 10, 1), _text_value, seed=seed)
+
+
+def generate_blank_lines(file_path, line_count, seed=0):
+    # Sections laid out like space_test in test/settings_test.txt, with up to three blank lines after each key
+    _write_sections(file_path, line_count, 20, _text_value, blank_lines_between_keys=3, seed=seed)
+
+
+def generate_mixed_types(file_path, line_count, seed=0):
+    # Booleans, integers, floats, lists and text, with the spacing around "=" varied as it is in hand-written files
+    _write_sections(file_path, line_count, 20, _mixed_value, seed=seed, separators=(" = ", "=", "= ", " ="))
+
+
+SHAPES = {
+    "many_sections": generate_many_sections,
+    "wide_sections": generate_wide_sections,
+    "blank_lines": generate_blank_lines,
+    "mixed_types": generate_mixed_types,
+}
@@ -1,2 +1,8 @@
 from settingsmanager.settingsmanager import SettingsManager
-from settingsmanager.settingsmanager import Section
\ No newline at end of file
+from settingsmanager.settingsmanager import Section
+from settingsmanager.merge import SaveConflictError
+from settingsmanager.schema import SchemaError
+from settingsmanager.asyncsettingsmanager import AsyncSettingsManager
+from settingsmanager.stream import iter_entries
+from settingsmanager.layered import LayeredSettings
+from settingsmanager.snapshot import SettingsSnapshot
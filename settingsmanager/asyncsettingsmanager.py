@@ -0,0 +1,124 @@
+import asyncio
+import functools
+from settingsmanager.settingsmanager import SettingsManager
+from settingsmanager.watcher import FileWatcher
+
+
+class _Coalescer:
+    # Runs one call of an operation at a time. Calls made while one is running do not queue up behind it: they all
+    # share a single follow-up run, which starts once the running call ends and so sees every change made before
+    # any of them were called.
+    def __init__(self):
+        self._running = None
+        self._pending = None
+
+    async def run(self, function):
+        if self._pending is not None:
+            task = self._pending
+        elif self._running is not None:
+            task = self._pending = self._start(function, self._running)
+        else:
+            task = self._running = self._start(function, None)
+
+        # Shielded, so a caller that is cancelled does not cancel the run for the others sharing it
+        return await asyncio.shield(task)
+
+    def _start(self, function, previous):
+        task = asyncio.ensure_future(self._run(function, previous))
+        task.add_done_callback(self._on_done)
+        return task
+
+    async def _run(self, function, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+            self._running, self._pending = self._pending, None
+
+        return await function()
+
+    def _on_done(self, task):
+        if self._running is task:
+            self._running = None
+
+        # Marks the error as retrieved, in case every caller sharing the run was cancelled
+        if not task.cancelled():
+            task.exception()
+
+
+class AsyncSettingsManager(SettingsManager):
+    # A SettingsManager for asyncio applications. Reading the file, parsing it and writing it happen in an executor,
+    # so the event loop is never blocked on them. Reading and editing values is done as with SettingsManager.
+    def __init__(self, file_path, executor=None, **kwargs):
+        # Always thread safe, as refreshes and saves run on the executor's threads
+        self._executor = executor
+        self._coalescers = {}
+        self._io_lock = None
+        super().__init__(file_path, thread_safe=True, **kwargs)
+
+    @classmethod
+    async def load(cls, file_path, executor=None, **kwargs):
+        # Creates the manager without blocking the event loop on the initial refresh
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(cls, file_path, executor=executor, **kwargs))
+
+    async def arefresh(self):
+        return await self._coalesce("refresh", self._refresh)
+
+    async def asave(self, new_file_path=None):
+        await self._coalesce(("save", new_file_path), functools.partial(self._run_exclusive, self.save, new_file_path))
+
+    async def arefresh_and_has_changed(self):
+        if self._check_stat and not await self._run_exclusive(self._has_file_changed):
+            return False
+
+        self._poll_counts["parsed"] += 1
+        contents_before = self._get_file_contents()
+        await self.arefresh()
+        return contents_before != self._get_file_contents()
+
+    async def awatch(self, debounce_ms=100, poll_interval_ms=500):
+        # Yields the manager each time the file changes, once it has been refreshed. The file is watched as by
+        # watch, until the iteration stops.
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        watcher = FileWatcher(self._file_path, functools.partial(loop.call_soon_threadsafe, changed.set),
+                              debounce_ms, poll_interval_ms)
+        watcher.start()
+
+        try:
+            while True:
+                await changed.wait()
+                changed.clear()
+
+                # On the executor, taking turns with refreshes and saves
+                if await self._run_exclusive(self._refresh_watched_file):
+                    yield self
+        finally:
+            watcher.stop()
+
+    async def _refresh(self):
+        # refresh only takes the lock to swap the parsed state in, so writes made on the loop meanwhile do not wait
+        # for the parse
+        return await self._run_exclusive(self.refresh)
+
+    async def _coalesce(self, operation, function):
+        coalescer = self._coalescers.get(operation)
+
+        if coalescer is None:
+            coalescer = self._coalescers[operation] = _Coalescer()
+
+        return await coalescer.run(function)
+
+    async def _run_exclusive(self, function, *args):
+        async with self._get_io_lock():
+            return await self._run_in_executor(function, *args)
+
+    def _get_io_lock(self):
+        # Refreshes and saves take turns, so a refresh never reads a half-saved file and the event loop never waits
+        # on the manager's lock for one of them
+        if self._io_lock is None:
+            self._io_lock = asyncio.Lock()
+
+        return self._io_lock
+
+    def _run_in_executor(self, function, *args):
+        return asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
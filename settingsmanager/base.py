@@ -1,7 +1,16 @@
 import re
 
+LINE_OTHER = 0
+LINE_HEADING = 1
+LINE_ENTRY = 2
+
+# Matches a whole cleaned line as either a heading or a valid "key=value" entry
+_LINE_PATTERN = re.compile(r"\[(?P<heading>.+)\]|(?P<key>[a-zA-Z][a-zA-Z_0-9]*)=(?P<value>.*)", re.DOTALL)
+
 
 class BaseClass:
+    __slots__ = ()
+
     def _get_keys(self):
         attrs = self.get_attributes()
         return attrs.keys()
@@ -120,6 +129,50 @@ class BaseClass:
 
         return value
 
+    @classmethod
+    def _tokenize_line(cls, line):
+        # Classifies a cleaned line in one pass, returning (kind, key or heading name, raw value)
+        match = _LINE_PATTERN.fullmatch(line)
+
+        if match is not None and match.lastgroup == "heading":
+            return LINE_HEADING, match.group("heading"), None
+
+        # Entries are checked against a second clean of the line, as _is_line_an_entry does
+        line_recleaned = cls._clean_line(line)
+
+        if line_recleaned != line:
+            match = _LINE_PATTERN.fullmatch(line_recleaned)
+
+        if match is None:
+            return LINE_OTHER, None, None
+
+        return LINE_ENTRY, match.group("key"), match.group("value")
+
+    @staticmethod
+    def _convert_value(value, parse_bool=True, parse_float=True, parse_int=True):
+        # Same result as the _attempt_parse_* chain, without the repeated type and count checks
+        if parse_bool:
+            value_lower = value.lower()
+
+            if value_lower == "true":
+                return True
+            if value_lower == "false":
+                return False
+
+        if "." in value:
+            if parse_float:
+                try:
+                    return float(value)
+                except ValueError:
+                    pass
+        elif parse_int:
+            try:
+                return int(value)
+            except ValueError:
+                pass
+
+        return value
+
     @staticmethod
     def _attempt_parse_bool(value):
         if isinstance(value, str):
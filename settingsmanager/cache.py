@@ -0,0 +1,81 @@
+import hashlib
+import marshal
+import os
+import stat
+import tempfile
+
+# Bumped whenever the layout of the cached data changes
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".settingscache"
+
+
+def get_cache_path(file_path, cache_dir=None):
+    # Stored beside the settings file, or under cache_dir named after a hash of the settings file's path
+    file_path = os.path.abspath(file_path)
+
+    if cache_dir is None:
+        directory, file_name = os.path.split(file_path)
+        return os.path.join(directory, f".{file_name}{CACHE_SUFFIX}")
+
+    path_hash = hashlib.blake2b(os.fsencode(file_path), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, path_hash + CACHE_SUFFIX)
+
+
+def make_cache_key(file_path, file_signature, parse_flags):
+    return CACHE_VERSION, marshal.version, os.path.abspath(file_path), tuple(file_signature), tuple(parse_flags)
+
+
+def read_cache(cache_path, cache_key):
+    # Returns the cached data, or None if there is no cache for this key or it cannot be read. Unmarshalling runs
+    # code paths an attacker could target with a crafted file, so the cache is only read if nobody else could have
+    # written it.
+    try:
+        if not _is_private(os.stat(os.path.dirname(cache_path))):
+            return None
+
+        file_descriptor = os.open(cache_path, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0))
+
+        with os.fdopen(file_descriptor, "rb") as file:
+            if not _is_private(os.fstat(file.fileno())):
+                return None
+
+            cached_key, data = marshal.load(file)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+    if cached_key != cache_key:
+        return None
+
+    return data
+
+
+def write_cache(cache_path, cache_key, data):
+    # Best effort: a cache that cannot be written just means the next load parses the file again. Not written to a
+    # directory others could write to, as read_cache would refuse it.
+    try:
+        directory = os.path.dirname(cache_path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+        if not _is_private(os.stat(directory)):
+            return
+
+        file_descriptor, temp_file_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            marshal.dump((cache_key, data), file)
+
+        os.replace(temp_file_path, cache_path)
+    except (OSError, ValueError):
+        os.remove(temp_file_path)
+
+
+def _is_private(file_stat):
+    # Owned by the current user and not writable by its group or others. Ownership cannot be checked without
+    # os.getuid, eg on Windows.
+    if not hasattr(os, "getuid"):
+        return True
+
+    return file_stat.st_uid == os.getuid() and not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
@@ -0,0 +1,120 @@
+import re
+from bisect import bisect_left, insort
+from fnmatch import fnmatchcase
+
+# Indexes of the section names and keys of a SettingsManager, for find, sections_with and prefix. Names are kept
+# sorted, so a glob pattern only looks at the names starting with its literal prefix, and each key maps to the
+# sections defining it.
+
+_WILDCARD_PATTERN = re.compile(r"[*?\[]")
+
+
+def get_literal_prefix(pattern):
+    # The part of a glob pattern before its first wildcard
+    match = _WILDCARD_PATTERN.search(pattern)
+    return pattern if match is None else pattern[:match.start()]
+
+
+class KeyIndex:
+    def __init__(self):
+        # The section indexed under each name. Keys added to a section that has since been replaced, eg by a
+        # refresh, are ignored.
+        self._sections = {}
+        self._section_names = []
+        self._keys = {}
+        self._sections_by_key = {}
+
+    def sync(self, sections):
+        # Indexes a registry of sections, only looking at the keys of sections that are not already indexed as they
+        # are. Returns the sections newly indexed.
+        indexed = []
+
+        for name, section in sections.items():
+            if self._sections.get(name) is not section:
+                self.index_section(name, section)
+                indexed.append(section)
+
+        for name in [name for name in self._sections if name not in sections]:
+            self.index_section(name, None)
+
+        return indexed
+
+    def index_section(self, name, section):
+        # Replaces whatever is indexed under name with the keys of section, or removes it if section is None
+        keys = self._keys.pop(name, None)
+
+        if keys is not None:
+            for key in keys:
+                self._remove_section_from_key(key, name)
+
+            if section is None:
+                del self._section_names[bisect_left(self._section_names, name)]
+                del self._sections[name]
+                return
+        elif section is None:
+            return
+        else:
+            insort(self._section_names, name)
+
+        self._sections[name] = section
+        self._keys[name] = sorted(section._get_keys())
+
+        for key in self._keys[name]:
+            self._sections_by_key.setdefault(key, set()).add(name)
+
+    def add_key(self, section, key):
+        name = section.get_name()
+
+        if self._sections.get(name) is not section:
+            return
+
+        insort(self._keys[name], key)
+        self._sections_by_key.setdefault(key, set()).add(name)
+
+    def remove_key(self, section, key):
+        name = section.get_name()
+
+        if self._sections.get(name) is not section:
+            return
+
+        keys = self._keys[name]
+        del keys[bisect_left(keys, key)]
+        self._remove_section_from_key(key, name)
+
+    def get_section(self, name):
+        return self._sections[name]
+
+    def find_section_names(self, pattern):
+        return self._match(self._section_names, pattern)
+
+    def find_keys(self, name, pattern):
+        return self._match(self._keys.get(name, ()), pattern)
+
+    def get_keys_with_prefix(self, name, prefix):
+        return self._get_names_with_prefix(self._keys.get(name, ()), prefix)
+
+    def get_section_names_with_key(self, key):
+        return sorted(self._sections_by_key.get(key, ()))
+
+    def _remove_section_from_key(self, key, name):
+        names = self._sections_by_key[key]
+        names.discard(name)
+
+        if len(names) == 0:
+            del self._sections_by_key[key]
+
+    @classmethod
+    def _match(cls, names, pattern):
+        return [name for name in cls._get_names_with_prefix(names, get_literal_prefix(pattern))
+                if fnmatchcase(name, pattern)]
+
+    @staticmethod
+    def _get_names_with_prefix(names, prefix):
+        # The sorted names that start with prefix, found without looking at the others
+        start = bisect_left(names, prefix)
+        end = start
+
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+
+        return names[start:end]
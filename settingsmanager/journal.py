@@ -0,0 +1,79 @@
+import os
+
+# In journal mode, each change is appended to a log beside the settings file as a "section.key = value" record, or a
+# "[section]" record for a new section, instead of the whole file being rewritten. Refreshing replays the log over the
+# file, and saving folds it back into the file and empties it.
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def get_journal_path(file_path):
+    directory, file_name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{file_name}{JOURNAL_SUFFIX}")
+
+
+class Journal:
+    def __init__(self, file_path, threshold, on_threshold, stats):
+        # on_threshold() is called once threshold records have been appended since the journal was last emptied
+        self._path = get_journal_path(file_path)
+        self._threshold = threshold
+        self._on_threshold = on_threshold
+        self._stats = stats
+        self._file = None
+        self.record_count = 0
+
+    def read(self):
+        # Returns the records, dropping a last record left incomplete by a crash so later records are not
+        # appended to it
+        self._close()
+
+        try:
+            with open(self._path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            data = b""
+
+        end = data.rfind(b"\n") + 1
+
+        if end < len(data):
+            os.truncate(self._path, end)
+
+        records = data[:end].decode().splitlines(keepends=True)
+        self.record_count = len(records)
+        return records
+
+    def append_entry(self, section_name, line):
+        # line is the entry as it would be written to the file
+        self._append(f"{section_name}.{line}")
+
+    def append_section(self, section_name):
+        self._append(f"[{section_name}]\n")
+
+    def reset(self, file_path):
+        # Empties the journal of file_path once the file holds every change, and appends to it from then on
+        self._close()
+        self._path = get_journal_path(file_path)
+        self.record_count = 0
+
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+    def _append(self, record):
+        if self._file is None:
+            self._file = open(self._path, "a", encoding="utf-8")
+
+        # Flushed, but not synced, so a record survives the process crashing but not the machine
+        self._file.write(record)
+        self._file.flush()
+        self.record_count += 1
+        self._stats.count("journal_appends")
+
+        if self.record_count >= self._threshold:
+            self._on_threshold()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,186 @@
+from settingsmanager.base import BaseClass
+from settingsmanager.settingsmanager import SettingsManager
+
+
+class LayeredSection(BaseClass):
+    # A read-only view of one section merged across the layers, looked up in the merged values of the LayeredSettings
+    __slots__ = ("_layered", "_name")
+
+    def __init__(self, layered, heading_name):
+        self._layered = layered
+        self._name = heading_name
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, ie for entries
+        if not name.startswith("_"):
+            try:
+                return self._layered._get_merged_values(self._name)[name]
+            except KeyError:
+                pass
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def get_attributes(self):
+        return dict(self._layered._get_merged_values(self._name))
+
+    def get_name(self):
+        return self._name
+
+    def _get_keys(self):
+        return self._layered._get_merged_values(self._name).keys()
+
+
+class LayeredSettings(BaseClass):
+    def __init__(self, layers, write_layer=-1, **kwargs):
+        # layers are SettingsManager instances or file paths, from lowest to highest priority, eg
+        # [base, environment, host]. A value is taken from the highest layer that defines it. Paths are loaded with
+        # kwargs as SettingsManager options. Writes go to write_layer unless another layer is given.
+        if len(layers) == 0:
+            raise ValueError("At least one layer is needed")
+
+        self._layers = [layer if isinstance(layer, SettingsManager) else SettingsManager(layer, **kwargs)
+                        for layer in layers]
+        self._write_layer = self._get_layer_index(write_layer)
+
+        # Per layer, the values of each of its sections, and the merged values of each section across the layers.
+        # A change to one layer only rebuilds the merged values of the sections in that layer.
+        self._layer_values = [self._read_layer_values(layer) for layer in self._layers]
+        self._merged_values = {}
+        self._views = {}
+
+        for section_name in self._get_all_section_names():
+            self._merge_section(section_name)
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, ie for sections
+        if not name.startswith("_") and name in self._merged_values:
+            return self.get_section(name)
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def get_attributes(self):
+        return {section_name: self.get_section(section_name) for section_name in self._merged_values}
+
+    def get_layers(self):
+        return list(self._layers)
+
+    def get_sections(self):
+        return [self.get_section(section_name) for section_name in self._merged_values]
+
+    def get_section(self, section):
+        if isinstance(section, LayeredSection):
+            section = section.get_name()
+        elif not isinstance(section, str):
+            raise ValueError(f"Section parameter must be a string (ie the section name), not {type(section)}.")
+
+        if section not in self._merged_values:
+            raise AttributeError(f"Section '{section}' not found.")
+
+        view = self._views.get(section)
+
+        if view is None:
+            view = self._views[section] = LayeredSection(self, section)
+
+        return view
+
+    def get_value(self, key, section):
+        try:
+            return self._get_merged_values(self.get_section(section).get_name())[key]
+        except KeyError:
+            raise AttributeError(f"Key '{key}' not found in section '{section}'.") from None
+
+    def set_value(self, key, value, section, layer=None):
+        # Sets the value in one layer, the write layer by default, adding the section and key to it if needed
+        layer_index = self._write_layer if layer is None else self._get_layer_index(layer)
+        settings = self._layers[layer_index]
+        section_name = section.get_name() if isinstance(section, LayeredSection) else section
+
+        if section_name not in settings.get_attributes():
+            settings.add_section(section_name)
+
+        settings.set_value(key, value, section_name)
+        self._layer_values[layer_index].setdefault(section_name, {})[key] = value
+        self._merge_section(section_name)
+
+    def save(self):
+        # Layers without changes are not written
+        for layer in self._layers:
+            layer.save()
+
+    def refresh(self):
+        for layer_index, layer in enumerate(self._layers):
+            layer.refresh()
+            self._update_layer(layer_index)
+
+    def refresh_and_has_changed(self):
+        # Only layers whose file has changed are re-read, and only their sections are merged again
+        has_changed = False
+
+        for layer_index, layer in enumerate(self._layers):
+            if layer.refresh_and_has_changed():
+                self._update_layer(layer_index)
+                has_changed = True
+
+        return has_changed
+
+    def invalidate(self, layer=None):
+        # For changes made to a layer directly rather than through set_value
+        layer_indices = range(len(self._layers)) if layer is None else [self._get_layer_index(layer)]
+
+        for layer_index in layer_indices:
+            self._update_layer(layer_index)
+
+    def _get_layer_index(self, layer):
+        if isinstance(layer, SettingsManager):
+            for layer_index, settings in enumerate(self._layers):
+                if settings is layer:
+                    return layer_index
+
+            raise ValueError("Not one of the layers")
+
+        if not -len(self._layers) <= layer < len(self._layers):
+            raise IndexError(f"Layer index {layer} out of range")
+
+        return layer % len(self._layers)
+
+    def _get_merged_values(self, section_name):
+        try:
+            return self._merged_values[section_name]
+        except KeyError:
+            raise AttributeError(f"Section '{section_name}' not found.") from None
+
+    def _get_all_section_names(self):
+        section_names = {}
+
+        for layer_values in self._layer_values:
+            section_names.update(dict.fromkeys(layer_values))
+
+        return section_names
+
+    @staticmethod
+    def _read_layer_values(layer):
+        return {section.get_name(): section.get_attributes() for section in layer.get_sections()}
+
+    def _update_layer(self, layer_index):
+        section_names = dict.fromkeys(self._layer_values[layer_index])
+        self._layer_values[layer_index] = self._read_layer_values(self._layers[layer_index])
+        section_names.update(dict.fromkeys(self._layer_values[layer_index]))
+
+        for section_name in section_names:
+            self._merge_section(section_name)
+
+    def _merge_section(self, section_name):
+        merged_values = None
+
+        for layer_values in self._layer_values:
+            values = layer_values.get(section_name)
+
+            if values is not None:
+                merged_values = dict(values) if merged_values is None else {**merged_values, **values}
+
+        # Replaced rather than updated, so a view being read never sees a partial merge
+        if merged_values is None:
+            self._merged_values.pop(section_name, None)
+            self._views.pop(section_name, None)
+        else:
+            self._merged_values[section_name] = merged_values
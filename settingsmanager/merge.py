@@ -0,0 +1,66 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where saves are not locked
+    fcntl = None
+
+CONFLICT_POLICIES = ("raise", "ours", "theirs")
+
+# Lock paths held by each thread, so a save holding the lock can read and patch the file without waiting on itself
+_held_locks = threading.local()
+
+
+class SaveConflictError(RuntimeError):
+    def __init__(self, conflicts):
+        # conflicts is a list of (section name, key, base value, our value, their value), with None for a key
+        # missing from that version
+        self.conflicts = conflicts
+        keys = ", ".join(f"{section_name}.{key}" for section_name, key, _, _, _ in conflicts)
+        super().__init__(f"Keys changed both in memory and on disk since the last refresh: {keys}")
+
+
+def get_lock_path(file_path):
+    directory, file_name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{file_name}.lock")
+
+
+@contextmanager
+def lock_file(file_path):
+    # Holds an exclusive advisory lock on a sidecar of file_path. The settings file itself cannot be locked, as
+    # saving replaces it with a new file. A thread already holding the lock takes it again without waiting.
+    if fcntl is None:
+        yield
+        return
+
+    lock_path = get_lock_path(file_path)
+    held_locks = _held_locks.__dict__.setdefault("paths", set())
+
+    if lock_path in held_locks:
+        yield
+        return
+
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        held_locks.add(lock_path)
+
+        try:
+            yield
+        finally:
+            held_locks.discard(lock_path)
+            fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def resolve_conflict(conflict_policy, section_name, key, base, ours, theirs):
+    # Returns (keep ours, value), where the value only applies when ours is kept
+    if conflict_policy == "ours":
+        return True, ours
+    elif conflict_policy == "theirs":
+        return False, None
+    elif callable(conflict_policy):
+        return True, conflict_policy(section_name, key, base, ours, theirs)
+
+    raise ValueError(f"Unknown conflict policy {conflict_policy!r}")
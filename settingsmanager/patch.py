@@ -0,0 +1,131 @@
+import hashlib
+import marshal
+import os
+import tempfile
+from settingsmanager.merge import lock_file
+
+# Saving in place writes the changed byte ranges to a journal beside the settings file before touching the file
+# itself. A crash while the file is being patched leaves the journal behind, and the next read of the file applies
+# it again, so the file always ends up either as it was or as saved. Patching and recovering both hold the file's
+# save lock, so a reader never mistakes a patch in progress for one interrupted by a crash.
+
+PATCH_VERSION = 1
+PATCH_SUFFIX = ".patch"
+_DIGEST_SIZE = 16
+
+
+def get_patch_path(file_path):
+    directory, file_name = os.path.split(os.path.abspath(file_path))
+    return os.path.join(directory, f".{file_name}{PATCH_SUFFIX}")
+
+
+def patch_file(file_path, patches, size):
+    # Writes each (byte offset, bytes) of patches into the file and truncates it to size. The caller holds
+    # lock_file(file_path). Returns the stat of the patched file and the number of bytes written, counting the
+    # journal.
+    with open(file_path, "r+b") as file:
+        file_stat = os.fstat(file.fileno())
+        journal_bytes = _write_journal(file_path, (file_stat.st_dev, file_stat.st_ino), patches, size)
+        _apply_patches(file.fileno(), patches, size)
+        file_stat = os.fstat(file.fileno())
+
+    # The file is fully patched, so a journal already removed, eg by a process that did not take the lock, is fine
+    try:
+        os.remove(get_patch_path(file_path))
+    except FileNotFoundError:
+        pass
+
+    return file_stat, journal_bytes + sum(len(data) for _, data in patches)
+
+
+def recover_file(file_path):
+    # Finishes a patch interrupted by a crash, if there is one. A journal that does not belong to the file as it is
+    # now, eg as the file has since been replaced by a full save, is discarded. Readers that cannot write the file
+    # leave the journal for a writer.
+    patch_path = get_patch_path(file_path)
+
+    if not os.path.exists(patch_path):
+        return
+
+    if not os.access(file_path, os.W_OK) or not os.access(os.path.dirname(patch_path), os.W_OK):
+        return
+
+    # A writer still patching holds the lock until it has removed the journal
+    with lock_file(file_path):
+        _recover_file(file_path, patch_path)
+
+
+def _recover_file(file_path, patch_path):
+    try:
+        with open(patch_path, "rb") as file:
+            data = file.read()
+    except FileNotFoundError:
+        return
+
+    try:
+        version, file_id, patches, size = marshal.loads(data[_DIGEST_SIZE:])
+        valid = version == PATCH_VERSION and hashlib.blake2b(data[_DIGEST_SIZE:],
+                                                             digest_size=_DIGEST_SIZE).digest() == data[:_DIGEST_SIZE]
+    except (EOFError, ValueError, TypeError):
+        valid = False
+
+    try:
+        with open(file_path, "r+b") as file:
+            file_stat = os.fstat(file.fileno())
+
+            if valid and (file_stat.st_dev, file_stat.st_ino) == tuple(file_id):
+                _apply_patches(file.fileno(), patches, size)
+    except FileNotFoundError:
+        pass
+
+    try:
+        os.remove(patch_path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_journal(file_path, file_id, patches, size):
+    # The journal is only in place, under its final name, once it is complete and on disk
+    payload = marshal.dumps((PATCH_VERSION, file_id, patches, size))
+    data = hashlib.blake2b(payload, digest_size=_DIGEST_SIZE).digest() + payload
+    patch_path = get_patch_path(file_path)
+    directory = os.path.dirname(patch_path)
+    file_descriptor, temp_file_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+
+    try:
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(temp_file_path, patch_path)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+    fsync_directory(directory)
+    return len(data)
+
+
+def _apply_patches(file_descriptor, patches, size):
+    for offset, data in patches:
+        os.pwrite(file_descriptor, data, offset)
+
+    os.ftruncate(file_descriptor, size)
+    os.fsync(file_descriptor)
+
+
+def fsync_directory(directory):
+    # Makes a file renamed into directory durable under its new name. Not possible on every platform, where the
+    # rename is left to the OS.
+    try:
+        directory_descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+
+    try:
+        os.fsync(directory_descriptor)
+    except OSError:
+        pass
+    finally:
+        os.close(directory_descriptor)
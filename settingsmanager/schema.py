@@ -0,0 +1,61 @@
+from settingsmanager.base import BaseClass
+
+# Stands in for the default of a key declared without one
+NO_DEFAULT = object()
+
+
+class SchemaError(ValueError):
+    def __init__(self, errors):
+        # errors is a list of (section name, key, line number, raw value, message), with 1-based line numbers
+        self.errors = errors
+        details = "; ".join(f"{section_name}.{key} on line {line_number}: {message}"
+                            for section_name, key, line_number, _, message in errors)
+        super().__init__(f"Values do not match the schema: {details}")
+
+
+def convert_bool(value):
+    value_lower = value.lower()
+
+    if value_lower == "true":
+        return True
+    if value_lower == "false":
+        return False
+
+    raise ValueError(f"invalid literal for bool: {value!r}")
+
+
+def convert_str(value):
+    return value
+
+
+# Converters for the types a schema can name. Any other callable is used as its own converter.
+CONVERTERS = {
+    bool: convert_bool,
+    int: int,
+    float: float,
+    str: convert_str,
+    list: BaseClass.convert_string_to_list,
+}
+
+
+def compile_schema(schema):
+    # Turns {section name: {key: type or (type, default)}} into {section name: {key: (converter, default)}}, so
+    # loading looks up one converter per key rather than working out the type of each value
+    compiled = {}
+
+    for section_name, keys in schema.items():
+        BaseClass._is_key_or_section_name_valid(section_name)
+        compiled_keys = compiled[section_name] = {}
+
+        for key, declaration in keys.items():
+            BaseClass._is_key_or_section_name_valid(key)
+            value_type, default = declaration if isinstance(declaration, tuple) else (declaration, NO_DEFAULT)
+            converter = CONVERTERS.get(value_type, value_type)
+
+            if not callable(converter):
+                raise ValueError(f"Type of {section_name}.{key} must be bool, int, float, str, list or a callable, "
+                                 f"not {value_type!r}")
+
+            compiled_keys[key] = (converter, default)
+
+    return compiled
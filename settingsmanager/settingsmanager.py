@@ -1,18 +1,131 @@
-from settingsmanager.base import BaseClass
+import hashlib
+import io
+import locale
+import os
+import sys
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from fnmatch import fnmatchcase
+from operator import itemgetter
+from settingsmanager.base import BaseClass, LINE_HEADING, LINE_ENTRY, LINE_OTHER
+from settingsmanager.cache import get_cache_path, make_cache_key, read_cache, write_cache
+from settingsmanager.index import KeyIndex, get_literal_prefix
+from settingsmanager.journal import Journal
+from settingsmanager.merge import CONFLICT_POLICIES, SaveConflictError, lock_file, resolve_conflict
+from settingsmanager.patch import fsync_directory, patch_file, recover_file
+from settingsmanager.schema import NO_DEFAULT, SchemaError, compile_schema
+from settingsmanager.snapshot import SnapshotPublisher
+from settingsmanager.source import FileSource, index_headings
+from settingsmanager.stats import NO_STATS, Stats
+from settingsmanager.watcher import FileWatcher
+
+# Stand in for the lock and undo logs of a manager that is not thread safe or not in a transaction, and for the
+# dirty keys of a section without changes, saving a set per section
+_NO_LOCK = nullcontext()
+_NO_UNDO_LOGS = ()
+_NO_KEYS = frozenset()
+_MISSING = object()
+
+# Options of load_many passed on to the worker processes that parse the files, as they affect the parse
+_PROCESS_PARSE_OPTIONS = ("parse_bool", "parse_int", "parse_float", "check_stat", "use_cache", "cache_dir")
+
+# Files sent to a load_many worker process at a time, so the cost of a round trip is shared between several files
+_PROCESS_CHUNK_SIZE = 16
 
 
 class Section(BaseClass):
+    # Sections are created for every heading in the file, so their internal fields are slots rather than entries in
+    # the instance __dict__, which only holds entry values
+    __slots__ = ("_name", "_start_index_in_file", "_end_index_in_file", "_dirty_keys", "_entries", "_parse_flags",
+                 "_source", "_loaded", "_lock", "_undo_logs", "_journal", "_index", "__dict__")
+
     def __init__(self, heading_name):
         self._name = heading_name
         self._start_index_in_file = None
         self._end_index_in_file = None
 
+        # Replaced by a set once a key is changed
+        self._dirty_keys = _NO_KEYS
+
+        # Entry keys in file order, mapped to the raw string read from the file until the value is first accessed.
+        # It is then converted, using _parse_flags, and stored as an attribute, and the raw string is dropped.
+        self._entries = {}
+        self._parse_flags = (True, True, True)
+
+        # (FileSource, start byte, end byte) of the section when it was indexed by a lazy refresh. Its entries are
+        # only read and parsed from there once something needs them.
+        self._source = None
+        self._loaded = True
+
+        # Shared with the manager, which serialises writes when it is thread safe, records the previous value of
+        # each key changed in a transaction, in journal mode appends each change to the journal and, once queried,
+        # indexes each key added
+        self._lock = _NO_LOCK
+        self._undo_logs = _NO_UNDO_LOGS
+        self._journal = None
+        self._index = None
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+            return
+
+        # Public attributes are entries, so any assignment marks the key as needing to be saved. The value is
+        # stored before the key is listed, so readers never see a key without a value.
+        with self._lock:
+            self._load()
+
+            if self._undo_logs:
+                self._record_undo(name)
+
+            is_new_key = self._index is not None and name not in self._entries
+            super().__setattr__(name, value)
+            self._entries[name] = None
+
+            if is_new_key:
+                self._index.add_key(self, name)
+
+            if self._dirty_keys is _NO_KEYS:
+                self._dirty_keys = set()
+
+            self._dirty_keys.add(name)
+
+            # Changes made in a transaction are saved to the file when it ends instead
+            if self._journal is not None and not self._undo_logs:
+                self._journal.append_entry(self._name, self._generate_file_line(name, value))
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, ie for entries that have not been loaded or converted yet
+        if name.startswith("_"):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        self._load()
+
+        if self._entries.get(name) is None:
+            # Not an entry, or converted by another thread since the lookup that got here
+            return object.__getattribute__(self, name)
+
+        # Converted under the lock, so a value assigned by another thread in the meantime is kept
+        with self._lock:
+            raw_value = self._entries.get(name)
+
+            if raw_value is not None:
+                super().__setattr__(name, self._convert_value(raw_value, *self._parse_flags))
+                self._entries[name] = None
+
+        return object.__getattribute__(self, name)
+
     def add_entry(self, key, value):
         if self._is_key_or_section_name_valid(key):
-            if hasattr(self, key):
-                raise AttributeError(f"Duplicate key '{key}' in section '{self._name}'")
+            with self._lock:
+                self._add_parsed_entry(key, value)
 
-            self.set_value(key, value)
+    def get_attributes(self):
+        self._load()
+        return {key: getattr(self, key) for key in list(self._entries)}
 
     def get_name(self):
         return self._name
@@ -21,95 +134,433 @@ class Section(BaseClass):
         if self._is_key_or_section_name_valid(key):
             setattr(self, key, value)
 
+    def _get_keys(self):
+        # A live view of the keys, in file order
+        self._load()
+        return self._entries.keys()
+
+    def _add_parsed_entry(self, key, value):
+        # Key has already been validated, either by add_entry or by the tokenizer
+        self._check_key_is_new(key)
+        setattr(self, key, value)
+
+    def _add_raw_entry(self, key, raw_value):
+        # Adds a value read from the file without converting it or marking it as changed
+        self._check_key_is_new(key)
+        self._entries[key] = raw_value
+
+    def _set_raw_value(self, key, raw_value):
+        # Sets a value replayed from the journal. It is converted when first read, like a value from the file, and
+        # stays unsaved until the next save writes it to the file.
+        self._load()
+        self.__dict__.pop(key, None)
+        self._entries[key] = raw_value
+
+        if self._dirty_keys is _NO_KEYS:
+            self._dirty_keys = set()
+
+        self._dirty_keys.add(key)
+
+    def _remove_key(self, key):
+        # The key stays listed as changed, which is how the next save finds the line to drop from the file
+        self._load()
+
+        if key not in self._entries:
+            raise AttributeError(f"Key '{key}' not found in section '{self._name}'")
+
+        if self._undo_logs:
+            self._record_undo(key)
+
+        del self._entries[key]
+        self.__dict__.pop(key, None)
+
+        if self._dirty_keys is _NO_KEYS:
+            self._dirty_keys = set()
+
+        self._dirty_keys.add(key)
+
+        if self._index is not None:
+            self._index.remove_key(self, key)
+
+    def _get_removed_keys(self):
+        return [key for key in self._dirty_keys if key not in self._entries]
+
+    def _get_raw_value(self, key):
+        # The value of key as read from the file, or None if it has been converted, changed or is missing
+        return self._entries.get(key)
+
+    def _check_key_is_new(self, key, entries=None):
+        if entries is None:
+            self._load()
+            entries = self._entries
+
+        if key in entries or hasattr(type(self), key):
+            raise AttributeError(f"Duplicate key '{key}' in section '{self._name}'")
+
+    def _load(self):
+        if self._loaded:
+            return
+
+        with self._lock:
+            if self._loaded:
+                return
+
+            source, start, end = self._source
+            lines = io.TextIOWrapper(io.BytesIO(source.read_section(self._name, start, end)[1])).readlines()
+            entries = {}
+
+            # The first line is the heading
+            for line in lines[1:]:
+                kind, key, raw_value = self._tokenize_line(self._clean_line(line))
+
+                if kind == LINE_ENTRY:
+                    self._check_key_is_new(key, entries)
+                    entries[sys.intern(key)] = raw_value
+
+            # Entries are only published once complete, for threads that skip the lock above
+            self._entries = entries
+            self._loaded = True
+
+    def _record_undo(self, name):
+        # Only the value from before the transaction is kept
+        undo_log = self._undo_logs[-1]
+
+        if (self, name) not in undo_log:
+            undo_log[(self, name)] = (self.__dict__.get(name, _MISSING), self._entries.get(name, _MISSING),
+                                      name in self._dirty_keys)
+
+    def _undo(self, name, value, raw_value, was_dirty):
+        if value is _MISSING:
+            self.__dict__.pop(name, None)
+        else:
+            self.__dict__[name] = value
+
+        if raw_value is _MISSING:
+            self._entries.pop(name, None)
+        else:
+            self._entries[name] = raw_value
+
+        if not was_dirty and name in self._dirty_keys:
+            self._dirty_keys.discard(name)
+
+    def _is_new(self):
+        return self._start_index_in_file is None and self._source is None
+
+    def _has_unsaved_changes(self):
+        return self._is_new() or len(self._dirty_keys) > 0
+
 
 class SettingsManager(BaseClass):
-    def __init__(self, file_path, parse_bool=True, parse_int=True, parse_float=True):
+    # Set by load_many to a file already parsed in a worker process, which the first refresh uses instead of
+    # parsing the file again
+    _parsed_data = None
+
+    def __init__(self, file_path, parse_bool=True, parse_int=True, parse_float=True, check_stat=False,
+                 lazy_sections=False, use_cache=False, cache_dir=None, thread_safe=False, merge_on_save=False,
+                 conflict_policy="raise", instrument=False, stats_hook=None, schema=None, in_place_save=False,
+                 journal=False, journal_threshold=1000, compact_in_background=False):
+        if conflict_policy not in CONFLICT_POLICIES and not callable(conflict_policy):
+            raise ValueError(f"conflict_policy must be one of {CONFLICT_POLICIES} or a callable, not {conflict_policy!r}")
+
+        if journal and merge_on_save:
+            raise ValueError("journal cannot be combined with merge_on_save, as the journal has a single writer")
+
+        if compact_in_background and not thread_safe:
+            raise ValueError("compact_in_background needs thread_safe=True")
+
         self._parse_bool = parse_bool
         self._parse_int = parse_int
         self._parse_float = parse_float
+        self._parse_flags = (parse_bool, parse_float, parse_int)
+        self._check_stat = check_stat
+        self._lazy_sections = lazy_sections
+        self._use_cache = use_cache
+        self._cache_dir = cache_dir
+        self._merge_on_save = merge_on_save
+        self._conflict_policy = conflict_policy
+        self._in_place_save = in_place_save
         self._file_path = file_path
 
+        # {section name: {key: type or (type, default)}}. Declared keys are converted by their type's converter as
+        # the file is loaded, rather than having their type guessed when first read, and missing keys with a default
+        # are filled in.
+        self._schema = None if schema is None else compile_schema(schema)
+
+        # Sections by name. refresh builds a new registry and swaps it in with one assignment, so readers on other
+        # threads always see either the old sections or the new ones.
+        self._sections = {}
+        self._lock = threading.RLock() if thread_safe else _NO_LOCK
+
+        # Held by refresh and save for as long as they read or write the file, so that values are only read and
+        # changed under the lock above while the new state is swapped in. Always taken before the lock above.
+        self._file_lock = threading.RLock() if thread_safe else _NO_LOCK
+
+        # Holds the undo log of the transaction in progress, if any. Shared with the sections.
+        self._undo_logs = []
+
         self._lines_raw = None
         self._lines_cleaned = None
 
+        # With lazy_sections, the FileSource the sections were indexed from and the sections in file order. The file
+        # lines are only read and decoded when saving.
+        self._file_source = None
+        self._source_sections = None
+
+        # (st_mtime_ns, st_size, st_ino) and content hash of the file as last read, used when check_stat is set
+        self._file_signature = None
+        self._file_hash = None
+        self._poll_counts = {"stat": 0, "hash": 0, "parsed": 0}
+
+        # Phase timings and counters, kept only when instrumented. stats_hook(phase, seconds) is called as each phase
+        # ends, and stats_hook(counter, increment) as each counter is added to.
+        self._stats = Stats(stats_hook) if instrument or stats_hook is not None else NO_STATS
+
+        self._watcher = None
+        self._watch_callback = None
+
+        # In journal mode, changes are appended to the journal as they are made, and saved to the file once
+        # journal_threshold records have been appended, on a background thread with compact_in_background
+        self._journal = None
+        self._compact_in_background = compact_in_background
+        self._compaction_thread = None
+
+        # Publishes the sections to shared memory after each refresh and save that changes them, once publish_snapshot
+        # is called
+        self._snapshot_publisher = None
+
+        # Sections removed since the last save, whose lines the next save drops from the file
+        self._removed_sections = []
+
+        # Journal records replayed by the last load, to tell whether any were appended while it ran
+        self._records_replayed = 0
+
+        # Section names and keys indexed for find, sections_with and prefix. Built by the first query, then kept up to
+        # date as keys and sections are added and refreshes replace sections.
+        self._index = None
+
+        if journal:
+            self._journal = Journal(file_path, journal_threshold, self._on_journal_threshold, self._stats)
+
         self.refresh()
 
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, ie for sections
+        if not name.startswith("_"):
+            try:
+                return self._sections[name]
+            except KeyError:
+                pass
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    @classmethod
+    def load_many(cls, paths, executor=None, max_workers=None, use_processes=False, **kwargs):
+        # Loads the files concurrently, with kwargs as the options of every manager. Returns, in the order of paths,
+        # each file's manager or the exception raised loading it. Files are read and parsed on a thread pool of
+        # max_workers threads, or on executor if given. With use_processes, or a ProcessPoolExecutor as executor,
+        # they are parsed in worker processes instead, and only the sections are built in this one.
+        if executor is None:
+            pool_type = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+            with pool_type(max_workers) as executor:
+                return cls.load_many(paths, executor, **kwargs)
+
+        if not isinstance(executor, ProcessPoolExecutor):
+            futures = [executor.submit(cls, path, **kwargs) for path in paths]
+            return [future.exception() or future.result() for future in futures]
+
+        if kwargs.get("lazy_sections"):
+            raise ValueError("Files loaded with lazy_sections cannot be parsed in worker processes")
+
+        paths = list(paths)
+        parse_options = {name: kwargs[name] for name in _PROCESS_PARSE_OPTIONS if name in kwargs}
+        futures = [executor.submit(_parse_in_process, paths[index:index + _PROCESS_CHUNK_SIZE], parse_options)
+                   for index in range(0, len(paths), _PROCESS_CHUNK_SIZE)]
+        results = []
+
+        for index, future in enumerate(futures):
+            chunk_paths = paths[index * _PROCESS_CHUNK_SIZE:(index + 1) * _PROCESS_CHUNK_SIZE]
+
+            try:
+                parsed_chunk = future.result()
+            except Exception as exception:
+                # The worker itself failed, eg it was killed, so every file in the chunk failed with it
+                results.extend([exception] * len(chunk_paths))
+                continue
+
+            for path, parsed_data in zip(chunk_paths, parsed_chunk):
+                if isinstance(parsed_data, Exception):
+                    results.append(parsed_data)
+                    continue
+
+                try:
+                    results.append(cls._from_parsed_data(path, parsed_data, kwargs))
+                except Exception as exception:
+                    results.append(exception)
+
+        return results
+
     def add_section(self, heading_name):
-        if self._is_key_or_section_name_valid(heading_name):
-            section = Section(heading_name)
-            setattr(self, heading_name, section)
+        with self._lock:
+            section = self._create_section(heading_name)
+
+            if self._undo_logs:
+                self._undo_logs[-1].setdefault((None, heading_name), self._sections.get(heading_name, _MISSING))
+
+            self._sections[heading_name] = section
+
+            if self._index is not None:
+                self._index.index_section(heading_name, section)
+
+            if self._journal is not None and not self._undo_logs:
+                self._journal.append_section(heading_name)
+
             return section
 
     def add_entry(self, key, value, section):
         section = self.get_section(section)
         section.add_entry(key, value)
 
-    def refresh(self):
-        self._clear_attributes()
-        self._read_file()
+    def remove_section(self, section):
+        # The section's lines are dropped from the file by the next save
+        section = self.get_section(section)
 
-        section = None
+        with self._file_lock, self._lock:
+            heading_name = section.get_name()
 
-        for index, line in enumerate(self._lines_cleaned):
-            # Create section
-            if self._is_line_a_heading(line):
-                if section is not None:
-                    self._set_section_end_index(section, index)
-
-                heading_name = self._get_heading_from_line(line)
-                section = self.add_section(heading_name)
-                section._start_index_in_file = index
-                continue
+            if self._sections.get(heading_name) is not section:
+                raise AttributeError(f"Section '{heading_name}' not found.")
+
+            if self._undo_logs:
+                self._undo_logs[-1].setdefault((None, heading_name), section)
+
+            self._remove_section(heading_name)
+            self._save_removal()
+
+    def remove_entry(self, key, section):
+        # The key's line is dropped from the file by the next save
+        section = self.get_section(section)
 
-            # Set up entry within the section, if one was found
-            if self._is_line_an_entry(line):
-                key = self._get_key_from_line(line)
-                value = self._get_value_from_line(line, self._parse_bool, self._parse_float, self._parse_int)
-                self.add_entry(key, value, section)
+        with self._file_lock, self._lock:
+            section._remove_key(key)
+            self._save_removal()
 
-        if section is not None:
-            self._set_section_end_index(section, len(self._lines_cleaned))
+    def get_attributes(self):
+        return dict(self._sections)
+
+    def refresh(self):
+        # The file is read and parsed without holding the lock, which is only taken to swap the new state in, so
+        # reading and changing values never waits for the parse. Returns the keys the refresh added, removed and
+        # changed, as described in _swap_in_state.
+        with self._file_lock:
+            state = self._load_state()
+
+            with self._lock:
+                # Records appended to the journal during the load are missing from the state, so it is loaded again,
+                # this time with writes held off
+                if self._journal is not None and self._journal.record_count != self._records_replayed:
+                    state = self._load_state()
+
+                return self._swap_in_state(state)
 
     def save(self, new_file_path=None):
-        if new_file_path is None:
-            new_file_path = self._file_path
+        with self._file_lock, self._stats.phase("save"):
+            # Skipped saves leave the snapshot alone, so workers do not see a change that never happened
+            if self._save_with_journal_or_merge(new_file_path) and self._snapshot_publisher is not None:
+                with self._lock:
+                    self._snapshot_publisher.publish(self.get_sections())
 
-        self._file_path = new_file_path
-        sections = self.get_sections()
+    def _save_with_journal_or_merge(self, new_file_path):
+        # Returns whether the file was written or changes made to it by other processes were merged in
+        if self._journal is not None:
+            # Folds the journal into the file. Saving elsewhere leaves the old file and its journal as they were. The
+            # file is written under the lock, as records appended while it was written would be lost with the journal.
+            with self._lock:
+                saved = self._save(new_file_path)
+                self._journal.reset(self._file_path)
+                self._stats.count("journal_compactions")
 
-        # Add new sections to the file lines
-        for section in sections:
-            # If it is missing, add to the raw file lines
-            if section._start_index_in_file is None:
-                self._insert_new_section_line(section)
+            return saved
 
-        # Iterate through each section and add/update keys
-        for section in sections:
-            # Update existing keys in the section and check for missing ones
-            section_attrs_to_add = section.get_attributes()
+        if not self._merge_on_save:
+            return self._save(new_file_path)
 
-            for index in range(section._start_index_in_file + 1, section._end_index_in_file):
-                line = self._lines_cleaned[index]
+        # Other processes saving the same file wait on the lock, then merge onto whatever this one wrote
+        file_path = self._file_path if new_file_path is None else new_file_path
+
+        with lock_file(file_path):
+            return self._save(new_file_path, merge=True)
+
+    @contextmanager
+    def transaction(self):
+        # Changes made in the block are saved with a single write when it ends. If the block or the save raises,
+        # every change made in the block is undone. A transaction within a transaction is part of the outer one.
+        with self._file_lock, self._lock:
+            if self._undo_logs:
+                yield self
+                return
 
-                if self._is_line_an_entry(line):
-                    key = self._get_key_from_line(line)
-                    value = getattr(section, key)
-                    self._lines_raw[index] = self._generate_file_line(key, value)
+            state = (self._sections, self._lines_raw, self._lines_cleaned, self._file_signature, self._file_hash,
+                     self._file_source, self._source_sections)
+            self._undo_logs.append({})
 
-                    del section_attrs_to_add[key]
+            try:
+                yield self
+                self.save()
+            except BaseException:
+                self._rollback(self._undo_logs[-1], state)
+                raise
+            finally:
+                self._undo_logs.clear()
 
-            # Add missing section keys
-            for key in section_attrs_to_add:
-                value = section_attrs_to_add.get(key)
-                self._insert_line_into_section(section, self._generate_file_line(key, value))
+    def update_many(self, changes):
+        # Sets many values and saves them with a single write. changes maps sections, or section names, to dicts of
+        # keys and values. Every section and key is checked before anything is changed.
+        with self._file_lock, self._lock:
+            section_changes = [(self.get_section(section), values) for section, values in changes.items()]
 
-        # Save lines
-        with open(new_file_path, "w") as file:
-            file.writelines(self._lines_raw)
+            for section, values in section_changes:
+                for key in values:
+                    self._is_key_or_section_name_valid(key)
+
+                    if hasattr(type(section), key):
+                        raise AttributeError(f"Key '{key}' in section '{section.get_name()}' is a method name")
+
+            with self.transaction():
+                for section, values in section_changes:
+                    for key, value in values.items():
+                        setattr(section, key, value)
 
     def get_sections(self):
-        attrs = self.get_attributes()
-        return [v for k, v in attrs.items() if isinstance(v, Section)]
+        return list(self._sections.values())
+
+    def find(self, section_pattern="*", key_pattern="*"):
+        # (section name, key, value) of every key matching both glob patterns, sorted by section name then key
+        with self._lock:
+            index = self._get_index()
+
+            if get_literal_prefix(key_pattern) == key_pattern:
+                # A single key, so only the sections defining it are looked at
+                section_names = [name for name in index.get_section_names_with_key(key_pattern)
+                                 if fnmatchcase(name, section_pattern)]
+                return [(name, key_pattern, getattr(index.get_section(name), key_pattern)) for name in section_names]
+
+            return [(name, key, getattr(index.get_section(name), key))
+                    for name in index.find_section_names(section_pattern) for key in index.find_keys(name, key_pattern)]
+
+    def sections_with(self, key):
+        # The sections that define key, sorted by name
+        with self._lock:
+            index = self._get_index()
+            return [index.get_section(name) for name in index.get_section_names_with_key(key)]
+
+    def prefix(self, section, prefix):
+        # The keys of section starting with prefix, and their values, sorted by key
+        section = self.get_section(section)
+
+        with self._lock:
+            keys = self._get_index().get_keys_with_prefix(section.get_name(), prefix)
+            return {key: getattr(section, key) for key in keys}
 
     def get_section(self, section):
         if isinstance(section, Section):
@@ -119,34 +570,1125 @@ class SettingsManager(BaseClass):
         else:
             raise ValueError(f"Section parameter must be a string (ie the section name), not {type(section)}.")
 
-        sections = self.get_sections()
-
-        for section in sections:
-            if section.get_name() == section_name:
-                return section
-
-        raise AttributeError(f"Section '{section_name}' not found.")
+        try:
+            return self._sections[section_name]
+        except KeyError:
+            raise AttributeError(f"Section '{section_name}' not found.") from None
 
     def set_value(self, key, value, section):
         section = self.get_section(section)
         section.set_value(key, value)
 
     def refresh_and_has_changed(self):
-        lines_before = self._lines_cleaned
+        if self._check_stat and not self._has_file_changed():
+            return False
+
+        self._poll_counts["parsed"] += 1
+
+        contents_before = self._get_file_contents()
         self.refresh()
-        return lines_before != self._lines_cleaned
+        return contents_before != self._get_file_contents()
+
+    def get_poll_counts(self):
+        # How refresh_and_has_changed calls were answered: by stat alone, by content hash, or by parsing
+        return dict(self._poll_counts)
+
+    def stats(self):
+        # Calls, total seconds and last seconds per phase of refresh and save, and counters of the work done, or
+        # None unless the manager was created with instrument=True or a stats_hook
+        return self._stats.get()
+
+    def reset_stats(self):
+        self._stats.reset()
+
+    def watch(self, callback, debounce_ms=100, poll_interval_ms=500):
+        # Refreshes in a background thread whenever the file changes, then calls callback(settings). Uses inotify
+        # on Linux and falls back to polling the file's stat every poll_interval_ms elsewhere. The refresh races with
+        # anything else using the manager, so it must be thread safe.
+        if self._lock is _NO_LOCK:
+            raise ValueError("watch needs thread_safe=True")
+
+        if self._watcher is not None:
+            raise RuntimeError(f"Already watching '{self._file_path}'")
+
+        self._watch_callback = callback
+        self._watcher = FileWatcher(self._file_path, self._on_file_changed, debounce_ms, poll_interval_ms)
+        self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+            self._watcher = None
+            self._watch_callback = None
+
+    def publish_snapshot(self, name):
+        # Publishes the sections to shared memory as name, for worker processes to read with SettingsSnapshot(name)
+        # without parsing the file. Published again after every refresh or save that changes the sections, until
+        # stop_publishing_snapshot.
+        with self._lock:
+            if self._snapshot_publisher is not None:
+                raise RuntimeError(f"Already publishing '{self._file_path}'")
+
+            self._snapshot_publisher = SnapshotPublisher(name)
+            self._snapshot_publisher.publish(self.get_sections())
+
+    def stop_publishing_snapshot(self):
+        # Unlinks the shared memory. Workers still attached keep reading the last generation they attached.
+        with self._lock:
+            if self._snapshot_publisher is not None:
+                self._snapshot_publisher.close()
+                self._snapshot_publisher = None
+
+    def _on_file_changed(self):
+        if self._refresh_watched_file() and self._watch_callback is not None:
+            self._watch_callback(self)
+
+    def _refresh_watched_file(self):
+        # Refreshes once a watcher has seen the file change, for watch and awatch, and returns whether the settings
+        # changed. Skipped while the file is missing (eg mid-replace) rather than letting refresh create an empty one.
+        if not os.path.exists(self._file_path):
+            return False
+
+        try:
+            return self.refresh_and_has_changed()
+        except (OSError, ValueError, AttributeError):
+            # A partially written or invalid file; the next change will be picked up again
+            return False
+
+    @classmethod
+    def _from_parsed_data(cls, file_path, parsed_data, kwargs):
+        settings = cls.__new__(cls)
+        settings._parsed_data = parsed_data
+        settings.__init__(file_path, **kwargs)
+        return settings
+
+    def _get_parsed_data(self):
+        # The file as parsed by the last refresh, in the layout of the parse cache. Only valid while every value is
+        # still a raw string.
+        return (self._lines_raw, self._lines_cleaned, self._file_signature, self._file_hash,
+                self._dump_sections(self._sections))
+
+    def _get_file_contents(self):
+        # What refresh_and_has_changed compares. Lazily refreshed managers do not hold the file lines, so their
+        # content hash is used instead.
+        if self._lazy_sections:
+            return self._file_hash
+
+        return self._lines_cleaned
+
+    def _has_file_changed(self):
+        # Only hashes the file when its stat signature has moved, and only parses when the hash has too
+        try:
+            file_signature = self._get_file_signature(os.stat(self._file_path))
+        except FileNotFoundError:
+            return True
+
+        if file_signature == self._file_signature:
+            self._poll_counts["stat"] += 1
+            return False
+
+        try:
+            with open(self._file_path, "rb") as file:
+                file_signature = self._get_file_signature(os.fstat(file.fileno()))
+                file_hash = hashlib.blake2b(file.read()).digest()
+        except FileNotFoundError:
+            return True
+
+        if file_hash == self._file_hash:
+            self._file_signature = file_signature
+            self._poll_counts["hash"] += 1
+            return False
+
+        return True
+
+    @staticmethod
+    def _get_file_signature(file_stat):
+        return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
+
+    def _save(self, new_file_path, merge=False):
+        # The changes are rendered into the file lines under the lock, then the file is written and synced without
+        # it, so values can be read and changed meanwhile. The file lock keeps refreshes and other saves out until
+        # the write is done. Returns whether the file was written or merged.
+        if new_file_path is None:
+            new_file_path = self._file_path
+
+        path_changed = new_file_path != self._file_path
+        merged = False
+
+        with self._lock:
+            if merge and not path_changed and self._get_file_signature_on_disk() != self._file_signature:
+                with self._stats.phase("merge"):
+                    self._merge_file_changes()
+
+                merged = True
+
+            sections = self.get_sections()
+            sections_changed = [section for section in sections if section._has_unsaved_changes()]
+
+            # Nothing to write unless a value has changed or the file is being saved somewhere new
+            if len(sections_changed) == 0 and len(self._removed_sections) == 0 and not path_changed:
+                self._stats.count("saves_skipped")
+                return merged
+
+            self._stats.count("saves")
+            self._load_lines()
+
+            # Reading the lines of a lazy refresh can turn sections into new ones, if the file changed on disk since
+            sections_changed = [section for section in sections if section._has_unsaved_changes()]
+
+            # Put back if the write fails, so the lines still match the file and the changes are still unsaved
+            saved_state = (self._file_path, self._lines_raw, self._lines_cleaned, self._removed_sections,
+                           [(section, section._start_index_in_file, section._end_index_in_file, section._dirty_keys)
+                            for section in sections])
+            self._file_path = new_file_path
+            self._lines_raw = list(self._lines_raw)
+            self._lines_cleaned = list(self._lines_cleaned)
+
+            # Rendering only changes lines within these, so they are all an in-place save has to compare
+            line_ranges = sorted((section._start_index_in_file, section._end_index_in_file)
+                                 for section in sections_changed if section._start_index_in_file is not None)
+
+            try:
+                with self._stats.phase("render"):
+                    # Lines before both the first line dropped and the first line inserted keep their indices, which
+                    # are the same in both the old and the new lines
+                    first_dropped_index = self._drop_removed_lines(sections_changed)
+                    first_inserted_index = self._render_changes(sections_changed)
+                    first_moved_index = min((index for index in (first_dropped_index, first_inserted_index)
+                                             if index is not None), default=None)
+            except BaseException:
+                self._restore_saved_state(saved_state)
+                raise
+
+        try:
+            with self._stats.phase("write"):
+                if path_changed or not self._patch_file(saved_state[1], line_ranges, first_moved_index):
+                    self._write_file(new_file_path)
+        except BaseException:
+            with self._lock:
+                self._restore_saved_state(saved_state)
+
+            raise
+
+        return True
+
+    def _restore_saved_state(self, saved_state):
+        # Puts back the lines and unsaved changes from before a failed save. Keys changed and sections removed while
+        # the file was being written stay changed and removed.
+        self._file_path, self._lines_raw, self._lines_cleaned, removed_sections, sections_saved = saved_state
+        self._removed_sections = removed_sections + self._removed_sections
+
+        for section, start_index, end_index, dirty_keys in sections_saved:
+            section._start_index_in_file = start_index
+            section._end_index_in_file = end_index
+
+            if len(section._dirty_keys) > 0:
+                dirty_keys = section._dirty_keys.union(dirty_keys)
+
+            section._dirty_keys = dirty_keys
+
+    def _drop_removed_lines(self, sections_changed):
+        # Drops the lines of removed sections and keys from the file lines in a single pass, so each removal only
+        # has to mark the section or key as removed. A removed section also takes the blank lines after it, or
+        # before it if it ends the file, so the layout around it is kept. Comments directly above the next heading,
+        # after a blank line, are left to that heading. Returns the index of the first line dropped, from which every
+        # line may have moved, or None.
+        lines_cleaned = self._lines_cleaned
+        indices = []
+
+        for section in self._removed_sections:
+            start_index = section._start_index_in_file
+            end_index = section._end_index_in_file
+
+            if end_index < len(lines_cleaned) and lines_cleaned[end_index] != "":
+                end_index = self._get_end_index_before_comments(start_index, end_index)
+
+            while end_index < len(lines_cleaned) and lines_cleaned[end_index] == "":
+                end_index += 1
+
+            if end_index == len(lines_cleaned):
+                while start_index > 0 and lines_cleaned[start_index - 1] == "":
+                    start_index -= 1
+
+            indices.extend(range(start_index, end_index))
+
+        self._removed_sections = []
+
+        for section in sections_changed:
+            removed_keys = section._get_removed_keys()
+
+            if len(removed_keys) == 0:
+                continue
+
+            section._dirty_keys = section._dirty_keys.difference(removed_keys) or _NO_KEYS
+
+            if section._start_index_in_file is None:
+                continue
+
+            for index in range(section._start_index_in_file + 1, section._end_index_in_file):
+                kind, key, _ = self._tokenize_line(lines_cleaned[index])
+
+                if kind == LINE_ENTRY and key in removed_keys:
+                    indices.append(index)
+
+        if len(indices) == 0:
+            return None
+
+        # Removed sections can share the blank lines between them
+        indices = sorted(set(indices))
+        self._remove_lines(indices)
+        self._stats.count("lines_removed", len(indices))
+        return indices[0]
+
+    def _get_end_index_before_comments(self, start_index, end_index):
+        # The index of the first line of the comments that end a section directly above the next heading, if a blank
+        # line separates them from the rest of the section, or end_index
+        lines_cleaned = self._lines_cleaned
+        index = end_index
+
+        while (index > start_index + 1 and lines_cleaned[index - 1] != ""
+               and self._tokenize_line(lines_cleaned[index - 1])[0] == LINE_OTHER):
+            index -= 1
+
+        if start_index + 1 < index < end_index and lines_cleaned[index - 1] == "":
+            return index
+
+        return end_index
+
+    def _render_changes(self, sections_changed):
+        # Returns the index of the first line inserted, or None
+        first_inserted_index = None
+
+        # Add new sections to the file lines
+        for section in sections_changed:
+            # If it is missing, add to the raw file lines
+            if section._is_new():
+                if first_inserted_index is None:
+                    first_inserted_index = len(self._lines_raw)
+
+                self._insert_new_section_line(section)
+
+        # Re-render changed keys in each section, collecting new lines to insert in one pass
+        insertions = []
+        lines_rendered = 0
+
+        for section in sections_changed:
+            keys_to_add = set(section._dirty_keys)
+
+            # Sections whose only changes were removed keys have nothing left to render
+            if len(keys_to_add) == 0:
+                continue
+
+            for index in range(section._start_index_in_file + 1, section._end_index_in_file):
+                kind, key, _ = self._tokenize_line(self._lines_cleaned[index])
+
+                if kind == LINE_ENTRY and key in keys_to_add:
+                    line = self._generate_file_line(key, getattr(section, key))
+                    self._lines_raw[index] = line
+                    self._lines_cleaned[index] = self._clean_line(line)
+                    keys_to_add.remove(key)
+                    lines_rendered += 1
+
+            # Add missing section keys, in the order they were added to the section
+            for key in section._get_keys():
+                if key in keys_to_add:
+                    insertions.append((section._end_index_in_file, self._generate_file_line(key, getattr(section, key))))
+
+            section._dirty_keys = _NO_KEYS
+
+        self._insert_lines(insertions)
+        self._stats.count("lines_rendered", lines_rendered + len(insertions))
+
+        if len(insertions) > 0:
+            first_index = min(index for index, _ in insertions)
+
+            if first_inserted_index is None or first_index < first_inserted_index:
+                first_inserted_index = first_index
+
+        return first_inserted_index
+
+    def _merge_file_changes(self):
+        # Three-way merge at key level: the file as last read is the base, unsaved changes in memory are ours and
+        # the file on disk now is theirs. The manager is reloaded from theirs and our changes are applied on top,
+        # unless theirs also changed the same key to a different value.
+        self._load_lines()
+        base_values = self._get_raw_values(self._lines_cleaned)
+        state = self._parse_file()
+        their_sections = state[0]
+        changes = []
+        conflicts = []
+        removed_keys = set()
+
+        for section in self.get_sections():
+            section_name = section.get_name()
+            their_section = their_sections.get(section_name)
+
+            if section._is_new():
+                changes.append((section_name, None, None))
+
+            for key in section._get_keys():
+                if key not in section._dirty_keys:
+                    continue
+
+                ours = getattr(section, key)
+                ours_raw = self._tokenize_line(self._clean_line(self._generate_file_line(key, ours)))[2]
+                theirs = None if their_section is None else their_section._get_raw_value(key)
+                base = base_values.get((section_name, key))
+
+                if theirs == base or theirs == ours_raw:
+                    changes.append((section_name, key, ours))
+                else:
+                    conflicts.append((section_name, key, base, ours, theirs))
+
+            # Removed keys are None on our side, and a conflict resolved to None removes the key
+            for key in section._get_removed_keys():
+                theirs = None if their_section is None else their_section._get_raw_value(key)
+                base = base_values.get((section_name, key))
+                removed_keys.add((section_name, key))
+
+                if theirs == base or theirs is None:
+                    changes.append((section_name, key, None))
+                else:
+                    conflicts.append((section_name, key, base, None, theirs))
+
+        if len(conflicts) > 0 and self._conflict_policy == "raise":
+            raise SaveConflictError(conflicts)
+
+        for section_name, key, base, ours, theirs in conflicts:
+            keep_ours, value = resolve_conflict(self._conflict_policy, section_name, key, base, ours, theirs)
+
+            if keep_ours:
+                changes.append((section_name, key, value))
+
+        # Sections we removed are removed from theirs, before sections we added are added again
+        removed_section_names = [section.get_name() for section in self._removed_sections]
+        self._apply_schema(their_sections, state[2])
+        self._removed_sections = []
+        self._set_state(*state)
+
+        for section_name in removed_section_names:
+            if section_name in self._sections:
+                self._remove_section(section_name)
+
+        for section_name, key, value in changes:
+            section = self._sections.get(section_name)
+
+            if section is None:
+                section = self.add_section(section_name)
+
+            if key is None:
+                continue
+
+            if value is None and (section_name, key) in removed_keys:
+                if key in section._get_keys():
+                    section._remove_key(key)
+            else:
+                section.set_value(key, value)
+
+    def _apply_schema(self, sections, lines_cleaned):
+        # Converts the declared keys of newly loaded sections and fills in missing keys that have a default. Every
+        # value that cannot be converted is reported in one SchemaError, before the sections are used.
+        if self._schema is None:
+            return
+
+        errors = []
+
+        for section_name, keys in self._schema.items():
+            section = sections.get(section_name)
+
+            if section is None:
+                continue
+
+            section._load()
+            entries = section._entries
+
+            for key, (converter, default) in keys.items():
+                raw_value = entries.get(key)
+
+                if raw_value is not None:
+                    try:
+                        value = converter(raw_value)
+                    except (ValueError, TypeError) as exception:
+                        line_number = self._get_line_number(section, key, lines_cleaned)
+                        errors.append((section_name, key, line_number, raw_value, str(exception)))
+                        continue
+                elif key not in entries and default is not NO_DEFAULT:
+                    value = default
+                else:
+                    continue
+
+                # Stored as a converted value that has not been changed, so defaults are not written to the file
+                section.__dict__[key] = value
+                entries[key] = None
+
+        if len(errors) > 0:
+            raise SchemaError(errors)
+
+    def _get_line_number(self, section, key, lines_cleaned):
+        # 1-based line number of key in the file, only looked up to report an error
+        if lines_cleaned is None:
+            # Lazily loaded section, so count the lines up to it in the file
+            source, start, end = section._source
+            start, data = source.read_section(section.get_name(), start, end)
+            first_index = source.read_all()[:start].count(b"\n")
+            section_lines = [self._clean_line(line) for line in io.TextIOWrapper(io.BytesIO(data)).readlines()]
+        else:
+            first_index = section._start_index_in_file
+            section_lines = lines_cleaned[section._start_index_in_file:section._end_index_in_file]
+
+        for index, line in enumerate(section_lines):
+            kind, name, _ = self._tokenize_line(line)
+
+            if kind == LINE_ENTRY and name == key:
+                return first_index + index + 1
+
+        return None
+
+    def _rollback(self, undo_log, state):
+        # Restores the state from before a transaction, then the keys and sections changed in it. Keys removed by
+        # the undo are not tracked, so the index is built again by the next query.
+        self._index = None
+        self._set_state(*state)
+
+        for (section, name), previous in undo_log.items():
+            if section is not None:
+                section._undo(name, *previous)
+            elif previous is _MISSING:
+                self._sections.pop(name, None)
+            else:
+                self._sections[name] = previous
+
+        self._removed_sections = [section for section in self._removed_sections
+                                  if self._sections.get(section.get_name()) is not section]
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = KeyIndex()
+            self._sync_index()
+
+        return self._index
+
+    def _sync_index(self):
+        # Only sections that are not already indexed as they are get their keys indexed, so this follows an
+        # incremental refresh at the cost of the sections it rebuilt
+        for section in self._index.sync(self._sections):
+            section._index = self._index
+
+    def _get_raw_values(self, lines_cleaned):
+        # Raw values by (section name, key) for the given file lines
+        raw_values = {}
+        section_name = None
+
+        for line in lines_cleaned:
+            kind, name, value = self._tokenize_line(line)
+
+            if kind == LINE_HEADING:
+                section_name = name
+            elif kind == LINE_ENTRY:
+                raw_values[(section_name, name)] = value
+
+        return raw_values
+
+    def _get_file_signature_on_disk(self):
+        try:
+            return self._get_file_signature(os.stat(self._file_path))
+        except FileNotFoundError:
+            return None
+
+    def _create_section(self, heading_name):
+        if self._is_key_or_section_name_valid(heading_name):
+            section = Section(heading_name)
+            section._parse_flags = self._parse_flags
+            section._lock = self._lock
+            section._undo_logs = self._undo_logs
+            section._journal = self._journal
+            section._index = self._index
+            return section
+
+    def _remove_section(self, heading_name):
+        section = self._sections.pop(heading_name)
+
+        # A section that was never saved has no lines to drop
+        if not section._is_new():
+            self._removed_sections.append(section)
+
+        if self._index is not None:
+            self._index.index_section(heading_name, None)
+
+    def _save_removal(self):
+        # The journal only records values and sections, so in journal mode removals are saved straight away, unless
+        # a transaction will save them when it ends
+        if self._journal is not None and not self._undo_logs:
+            self.save()
+
+    def _on_journal_threshold(self):
+        # Called by a write, holding the lock. Waiting there for the file lock could deadlock with a refresh waiting
+        # for the lock to swap its state in, so if a refresh or save holds the file lock, the next write tries again.
+        if not self._compact_in_background:
+            if self._file_lock is _NO_LOCK:
+                self.save()
+            elif self._file_lock.acquire(blocking=False):
+                try:
+                    self.save()
+                finally:
+                    self._file_lock.release()
+        elif self._compaction_thread is None or not self._compaction_thread.is_alive():
+            self._compaction_thread = threading.Thread(target=self.save, daemon=True)
+            self._compaction_thread.start()
+
+    def _replay_journal(self, sections):
+        # Applies the changes appended to the journal since the file was last saved to newly loaded sections. The
+        # journal is read under the lock, as writes append to it.
+        with self._lock:
+            records = self._journal.read()
+            self._records_replayed = len(records)
+
+        for record in records:
+            if record[:1] == "[":
+                # The section is already in the file if a crash came between saving and emptying the journal
+                section_name = self._get_heading_from_line(record.rstrip())
+
+                if section_name not in sections:
+                    sections[section_name] = self._create_section(section_name)
+
+                continue
+
+            section_name, _, line = record.partition(".")
+            kind, key, raw_value = self._tokenize_line(self._clean_line(line))
+
+            if kind != LINE_ENTRY:
+                continue
+
+            section = sections.get(section_name)
+
+            if section is None:
+                section = sections[section_name] = self._create_section(section_name)
+
+            section._set_raw_value(sys.intern(key), raw_value)
+
+    def _swap_in_state(self, state):
+        # Sets the state built by _load_state. Returns {"added": [...], "removed": [...], "changed": [...]}, each a
+        # list of (section name, key, old value, new value), or None on the first refresh and with lazy_sections,
+        # whose sections are not parsed to be compared.
+        previous_sections = None if self._lines_cleaned is None else self._sections
+        self._removed_sections = []
+        self._set_state(*state)
+        changes = None
+
+        if previous_sections is not None and self._lines_cleaned is not None:
+            changes = self._diff_sections(previous_sections, self._sections)
+
+        # Only published when something may have changed, so polling workers do not see a change the manager did not
+        if self._snapshot_publisher is not None and (changes is None or any(changes.values())):
+            self._snapshot_publisher.publish(self.get_sections())
+
+        return changes
+
+    def _diff_sections(self, previous_sections, sections):
+        # Sections kept by an incremental refresh are the same objects in both, so their keys are not compared. Raw
+        # values are compared first, so only values that were already read are converted. Only called for sections
+        # that are loaded, as lazy sections are not compared.
+        added = []
+        removed = []
+        changed = []
+
+        for section_name, section in sections.items():
+            previous_section = previous_sections.get(section_name)
+
+            if previous_section is section:
+                continue
+
+            if previous_section is None:
+                self._list_entries(section, added, False)
+                continue
+
+            previous_entries = previous_section._entries
+            entries = section._entries
+
+            for key, raw_value in entries.items():
+                previous_raw_value = previous_entries.get(key, _MISSING)
+
+                if previous_raw_value is _MISSING:
+                    added.append((section_name, key, None, getattr(section, key)))
+                elif raw_value is None or raw_value != previous_raw_value:
+                    old_value = getattr(previous_section, key)
+                    new_value = getattr(section, key)
+
+                    if old_value != new_value or type(old_value) is not type(new_value):
+                        changed.append((section_name, key, old_value, new_value))
+
+            removed.extend((section_name, key, getattr(previous_section, key), None) for key in previous_entries
+                           if key not in entries)
+
+        for section_name, previous_section in previous_sections.items():
+            if section_name not in sections:
+                self._list_entries(previous_section, removed, True)
+
+        return {"added": added, "removed": removed, "changed": changed}
+
+    @staticmethod
+    def _list_entries(section, entries, as_old):
+        # Lists every key of a section added or removed as a whole, or the section alone if it has no keys
+        section_name = section.get_name()
+        keys = list(section._get_keys())
+
+        if len(keys) == 0:
+            entries.append((section_name, None, None, None))
+
+        for key in keys:
+            value = getattr(section, key)
+            entries.append((section_name, key, value, None) if as_old else (section_name, key, None, value))
+
+    def _set_state(self, sections, lines_raw, lines_cleaned, file_signature, file_hash, file_source=None,
+                   source_sections=None, kept_sections=()):
+        # kept_sections are (section, start index, end index) of sections an incremental refresh kept from the
+        # previous state. They are only moved to their new lines here, as the previous state is still in use until
+        # then.
+        for section, start_index, end_index in kept_sections:
+            section._start_index_in_file = start_index
+            section._end_index_in_file = end_index
+
+        self._sections = sections
+
+        if self._index is not None:
+            # Indexing lazy sections would parse them all, so their index is built again by the next query instead
+            if self._lazy_sections:
+                self._index = None
+            else:
+                self._sync_index()
+        self._lines_raw = lines_raw
+        self._lines_cleaned = lines_cleaned
+        self._file_signature = file_signature
+        self._file_hash = file_hash
+        self._file_source = file_source
+        self._source_sections = source_sections
+
+    def _load_state(self):
+        # Builds the sections and lines for refresh without touching the current ones. Returns the state for
+        # _set_state.
+        with self._stats.phase("refresh"):
+            self._stats.count("refreshes")
+
+            if self._lazy_sections:
+                with self._stats.phase("map"):
+                    state = self._map_sections()
+
+                if self._journal is not None:
+                    self._replay_journal(state[0])
+
+                self._apply_schema(state[0], None)
+                self._stats.count("sections_rebuilt", len(state[0]))
+                return state
+
+            state = None
+
+            if self._parsed_data is not None:
+                lines_raw, lines_cleaned, file_signature, file_hash, sections_dumped = self._parsed_data
+                state = self._load_sections(sections_dumped), lines_raw, lines_cleaned, file_signature, file_hash
+                self._parsed_data = None
+            elif self._use_cache:
+                with self._stats.phase("cache_load"):
+                    state = self._load_cache()
+
+                if state is not None:
+                    self._stats.count("cache_hits")
+            elif self._lines_cleaned is not None and self._journal is None:
+                # The parse cache needs every value as a raw string, and journal records are replayed into the
+                # sections, so both rebuild every section instead
+                state = self._parse_changed_sections()
+                self._apply_schema(state[0], state[2])
+                return state
+
+            if state is None:
+                state = self._parse_file()
+
+                if self._use_cache:
+                    self._save_cache(*state)
+
+            if self._journal is not None:
+                self._replay_journal(state[0])
+
+            self._apply_schema(state[0], state[2])
+            self._stats.count("sections_rebuilt", len(state[0]))
+            return state
+
+    def _parse_file(self):
+        # Reads and parses the file into new sections without touching the current ones. Returns the state for
+        # _set_state.
+        lines_raw, lines_cleaned, file_signature, file_hash = self._read_lines()
+        sections = {}
+        section = None
+
+        with self._stats.phase("parse"):
+            for index, line in enumerate(lines_cleaned):
+                kind, name, value = self._tokenize_line(line)
+
+                # Create section
+                if kind == LINE_HEADING:
+                    if section is not None:
+                        self._set_section_end_index(section, index, lines_cleaned)
+
+                    section = self._create_section(name)
+                    section._start_index_in_file = index
+                    sections[name] = section
+
+                # Set up entry within the section, if one was found
+                elif kind == LINE_ENTRY:
+                    self.get_section(section)._add_raw_entry(sys.intern(name), value)
+
+            if section is not None:
+                self._set_section_end_index(section, len(lines_cleaned), lines_cleaned)
+
+        self._stats.count("lines_parsed", len(lines_cleaned))
+        return sections, lines_raw, lines_cleaned, file_signature, file_hash
+
+    def _parse_changed_sections(self):
+        # Reads the file and only parses the sections whose lines differ from those they were loaded from. Sections
+        # that are unchanged and have no unsaved changes are kept, so references to them stay valid. Returns the
+        # state for _set_state.
+        lines_raw, lines_cleaned, file_signature, file_hash = self._read_lines()
+        previous_lines = self._lines_cleaned
+        previous_sections = self._sections
+        sections = {}
+        kept_sections = []
+
+        with self._stats.phase("parse"):
+            heading_indices = [index for index, line in enumerate(lines_cleaned)
+                               if line[:1] == "[" and self._is_line_a_heading(line)]
+            first_index = heading_indices[0] if len(heading_indices) > 0 else len(lines_cleaned)
+
+            for line in lines_cleaned[:first_index]:
+                if self._tokenize_line(line)[0] == LINE_ENTRY:
+                    # Raises the same error as adding the entry to no section does
+                    self.get_section(None)
+
+            lines_parsed = first_index
+            heading_indices.append(len(lines_cleaned))
+
+            for start_index, next_index in zip(heading_indices, heading_indices[1:]):
+                name = self._get_heading_from_line(lines_cleaned[start_index])
+                end_index = next_index
+
+                while lines_cleaned[end_index - 1] == "":
+                    end_index -= 1
+
+                section = previous_sections.get(name)
+
+                if (section is not None and name not in sections and not section._has_unsaved_changes()
+                        and section._start_index_in_file is not None
+                        and section._end_index_in_file - section._start_index_in_file == end_index - start_index
+                        and previous_lines[section._start_index_in_file:section._end_index_in_file]
+                        == lines_cleaned[start_index:end_index]):
+                    kept_sections.append((section, start_index, end_index))
+                    sections[name] = section
+                    continue
+
+                section = self._create_section(name)
+                section._start_index_in_file = start_index
+                section._end_index_in_file = end_index
+                sections[name] = section
+
+                for line in lines_cleaned[start_index + 1:end_index]:
+                    kind, key, value = self._tokenize_line(line)
+
+                    if kind == LINE_ENTRY:
+                        section._add_raw_entry(sys.intern(key), value)
+
+                lines_parsed += end_index - start_index
+
+        self._stats.count("lines_parsed", lines_parsed)
+        self._stats.count("sections_rebuilt", len(heading_indices) - 1 - len(kept_sections))
+        return sections, lines_raw, lines_cleaned, file_signature, file_hash, None, None, kept_sections
 
     def _read_file(self):
+        self._lines_raw, self._lines_cleaned, self._file_signature, self._file_hash = self._read_lines()
+
+    def _read_lines(self):
+        with self._stats.phase("read"):
+            recover_file(self._file_path)
+
+            try:
+                with open(self._file_path, "rb") as file:
+                    file_signature = self._get_file_signature(os.fstat(file.fileno()))
+                    data = file.read()
+            except FileNotFoundError:
+                # creates file if not found
+                with open(self._file_path, "w") as file:
+                    file_signature = self._get_file_signature(os.fstat(file.fileno()))
+                    data = b""
+
+            # Decoded as open(file_path, "r") would, but from the same bytes that are hashed
+            lines_raw = io.TextIOWrapper(io.BytesIO(data)).readlines()
+
+        self._stats.count("bytes_read", len(data))
+
+        with self._stats.phase("clean"):
+            lines_cleaned = [self._clean_line(line) for line in lines_raw]
+
+        file_hash = None
+
+        if self._check_stat or self._use_cache:
+            file_hash = hashlib.blake2b(data).digest()
+
+        return lines_raw, lines_cleaned, file_signature, file_hash
+
+    def _load_cache(self):
+        # Restores the lines, sections and raw values parsed by an earlier refresh of the file, if the file's stat
+        # signature and the parse flags are unchanged since. Returns the state for _set_state, or None if there is
+        # no usable cache.
         try:
-            with open(self._file_path, "r") as file:
-                self._lines_raw = file.readlines()
-                self._clean_file_lines()
+            file_signature = self._get_file_signature(os.stat(self._file_path))
+        except FileNotFoundError:
+            return None
+
+        cache_key = make_cache_key(self._file_path, file_signature, self._parse_flags)
+        data = read_cache(get_cache_path(self._file_path, self._cache_dir), cache_key)
+
+        if data is None:
+            return None
+
+        try:
+            lines_raw, lines_cleaned, file_hash, sections_cached = data
+            sections = self._load_sections(sections_cached)
+        except (TypeError, ValueError):
+            # Not the layout this version writes, so parse the file instead
+            return None
+
+        return sections, lines_raw, lines_cleaned, file_signature, file_hash
+
+    def _save_cache(self, sections, lines_raw, lines_cleaned, file_signature, file_hash):
+        # Called straight after parsing, while every value is still a raw string
+        cache_key = make_cache_key(self._file_path, file_signature, self._parse_flags)
+        data = (lines_raw, lines_cleaned, file_hash, self._dump_sections(sections))
+        write_cache(get_cache_path(self._file_path, self._cache_dir), cache_key, data)
+
+    def _load_sections(self, sections_dumped):
+        sections = {}
+
+        for name, start_index, end_index, keys, raw_values in sections_dumped:
+            section = self._create_section(name)
+            section._start_index_in_file = start_index
+            section._end_index_in_file = end_index
+            section._entries = dict(zip(keys, raw_values))
+            sections[name] = section
+
+        return sections
+
+    @staticmethod
+    def _dump_sections(sections):
+        # The sections as plain lists and strings, for the parse cache and for load_many's worker processes
+        return [(section.get_name(), section._start_index_in_file, section._end_index_in_file, list(section._entries),
+                 list(section._entries.values())) for section in sections.values()]
+
+    def _map_sections(self):
+        # Indexes the sections by scanning the file for headings. Each section reads and parses its own entries the
+        # first time they are used. Lines are assumed to end in "\n" or "\r\n". Returns the state for _set_state.
+        source, headings, preamble, file_signature, file_hash = self._map_file()
+        encoding = locale.getpreferredencoding(False)
+
+        # Entries above the first heading are an error, as with a full refresh
+        for line in io.TextIOWrapper(io.BytesIO(preamble)).readlines():
+            if self._tokenize_line(self._clean_line(line))[0] == LINE_ENTRY:
+                # Raises the same error as adding the entry to no section does
+                self.get_section(None)
+
+        sections = {}
+        source_sections = []
+
+        for index, (start, heading) in enumerate(headings):
+            end = headings[index + 1][0] if index + 1 < len(headings) else file_signature[1]
+            section = self._create_section(heading.decode(encoding))
+            section._source = (source, start, end)
+            section._loaded = False
+            sections[section.get_name()] = section
+            source_sections.append(section)
+
+        return sections, None, None, file_signature, file_hash, source, source_sections
+
+    def _map_file(self):
+        # Reads the file a block at a time to find its headings, without keeping it open or mapped afterwards
+        recover_file(self._file_path)
+
+        try:
+            file = open(self._file_path, "rb")
         except FileNotFoundError:
             # creates file if not found
-            with open(self._file_path, "w"):
-                self._lines_raw = []
-                self._clean_file_lines()
-                pass
+            file = open(self._file_path, "w+b")
+
+        with file:
+            file_stat = os.fstat(file.fileno())
+            headings, file_hash = index_headings(file)
+            file.seek(0)
+            preamble = file.read(headings[0][0] if len(headings) > 0 else file_stat.st_size)
+
+        source = FileSource(self._file_path, file_stat, locale.getpreferredencoding(False))
+        return source, headings, preamble, self._get_file_signature(file_stat), file_hash
+
+    def _load_lines(self):
+        # Reads and decodes the file and finds the line indices of its sections, if a lazy refresh skipped that
+        if self._lines_raw is not None:
+            return
+
+        self._lines_raw = io.TextIOWrapper(io.BytesIO(self._file_source.read_all())).readlines()
+        self._clean_file_lines()
+
+        sections = self._source_sections
+
+        if self._file_source.has_changed():
+            sections = self._match_changed_sections(sections)
+
+        position = 0
+
+        for index, line in enumerate(self._lines_cleaned):
+            if position < len(sections) and self._is_line_a_heading(line):
+                if self._get_heading_from_line(line) == sections[position].get_name():
+                    if position > 0:
+                        self._set_section_end_index(sections[position - 1], index, self._lines_cleaned)
+
+                    sections[position]._start_index_in_file = index
+                    position += 1
+
+        if position > 0:
+            self._set_section_end_index(sections[position - 1], len(self._lines_cleaned), self._lines_cleaned)
+
+    def _match_changed_sections(self, sections):
+        # The file changed on disk after it was indexed, so the sections are matched to its headings by name and
+        # returned in its order. Sections no longer in it are saved as new ones, with every entry they have, and
+        # removing them has nothing left to drop.
+        sections_by_name = {section.get_name(): section for section in sections}
+        names = dict.fromkeys(self._get_heading_from_line(line) for line in self._lines_cleaned
+                              if self._is_line_a_heading(line))
+        sections = [sections_by_name[name] for name in names if name in sections_by_name]
+        matched_ids = {id(section) for section in sections}
+
+        for section in self._sections.values():
+            if section._source is not None and id(section) not in matched_ids:
+                section._load()
+                section._source = None
+                section._dirty_keys = set(section._entries)
+
+        self._removed_sections = [section for section in self._removed_sections if id(section) in matched_ids]
+        return sections
+
+    def _write_file(self, file_path):
+        # Writes to a temporary file beside the target and swaps it in, so a crash mid-write never leaves a
+        # truncated settings file. A symlinked file is resolved, so the file it points to is replaced rather than
+        # the link.
+        file_path = os.path.realpath(file_path)
+        directory = os.path.dirname(file_path)
+        file_descriptor, temp_file_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+
+        try:
+            with os.fdopen(file_descriptor, "w") as file:
+                file.writelines(self._lines_raw)
+                file.flush()
+                os.fsync(file.fileno())
+                file_signature = self._get_file_signature(os.fstat(file.fileno()))
+
+            os.chmod(temp_file_path, self._get_file_mode(file_path))
+            os.replace(temp_file_path, file_path)
+        except BaseException:
+            os.remove(temp_file_path)
+            raise
+
+        fsync_directory(directory)
+
+        # The file now matches the lines in memory, so it no longer counts as changed on disk
+        self._file_signature = file_signature
+        self._file_hash = None
+        self._stats.count("bytes_written", file_signature[1])
+
+    def _patch_file(self, lines_raw_before, line_ranges, first_moved_index):
+        # With in_place_save, writes only the lines that changed into the file, rather than replacing the whole file.
+        # Changed lines that keep their length in bytes are patched where they are, otherwise the file is rewritten
+        # from the first changed line. line_ranges are the (start, end) indices, in lines_raw_before, of the sections
+        # that changed, and first_moved_index the first line inserted or dropped, from which lines no longer line up,
+        # or None. Returns False, leaving the file alone, if it cannot be patched or patching would write more than
+        # replacing the file.
+        if not self._in_place_save or self._file_source is not None or not hasattr(os, "pwrite"):
+            return False
+
+        # Patching a file changed by someone else would mix the two
+        if self._get_file_signature_on_disk() != self._file_signature:
+            return False
+
+        encoding = locale.getpreferredencoding(False)
+        lines_raw = self._lines_raw
+        patches = None
+
+        # Lines inserted and dropped can cancel out, so only a save that did neither keeps every line at its index
+        if first_moved_index is None:
+            changed_indices = [index for start, end in line_ranges for index in range(start, end)
+                               if lines_raw[index] is not lines_raw_before[index]
+                               and lines_raw[index] != lines_raw_before[index]]
+            patches = []
+            offset = 0
+            previous_index = 0
+
+            for index in changed_indices:
+                offset += len("".join(lines_raw_before[previous_index:index]).encode(encoding))
+                data = lines_raw[index].encode(encoding)
+
+                if len(data) != len(lines_raw_before[index].encode(encoding)):
+                    patches = None
+                    break
+
+                patches.append((offset, data))
+                offset += len(data)
+                previous_index = index + 1
+            else:
+                size = offset + len("".join(lines_raw_before[previous_index:]).encode(encoding))
+
+        if patches is None:
+            # Lines first differ at the first changed section, or where lines were first inserted or dropped
+            first_index = line_ranges[0][0] if line_ranges else len(lines_raw_before)
+
+            if first_moved_index is not None:
+                first_index = min(first_index, first_moved_index)
+
+            # Estimated from the number of lines before encoding anything, as this is the common way out for changes
+            # early in the file
+            if 2 * (len(lines_raw) - first_index) > len(lines_raw):
+                return False
+
+            offset = len("".join(lines_raw_before[:first_index]).encode(encoding))
+            data = "".join(lines_raw[first_index:]).encode(encoding)
+            patches = [(offset, data)]
+            size_before = offset + len("".join(lines_raw_before[first_index:]).encode(encoding))
+            size = offset + len(data)
+        else:
+            size_before = size
+
+        # The lines only give the byte offsets if they encode back to the file as read, which they do not for
+        # "\r\n" line endings as they are read as "\n"
+        if size_before != self._file_signature[1]:
+            return False
+
+        # Each patch is written twice, to the journal and to the file, so past half of the file replacing it writes
+        # less
+        if 2 * sum(len(data) for _, data in patches) > size:
+            return False
+
+        # Readers wait for the patch rather than finishing it as if this save had crashed
+        with lock_file(self._file_path):
+            file_stat, bytes_written = patch_file(self._file_path, patches, size)
+
+        self._file_signature = self._get_file_signature(file_stat)
+        self._file_hash = None
+        self._stats.count("saves_patched")
+        self._stats.count("bytes_written", bytes_written)
+        self._stats.count("bytes_not_rewritten", size - sum(len(data) for _, data in patches))
+        return True
+
+    @staticmethod
+    def _get_file_mode(file_path):
+        # Keep the permissions of the file being replaced. A new file is created empty to find those open() gives
+        # it, as the process umask can only be read by changing it for every thread.
+        try:
+            return os.stat(file_path).st_mode & 0o7777
+        except FileNotFoundError:
+            with open(file_path, "a") as file:
+                return os.fstat(file.fileno()).st_mode & 0o7777
 
     def _clean_file_lines(self):
         lines_cleaned = []
@@ -157,34 +1699,74 @@ class SettingsManager(BaseClass):
         self._lines_cleaned = lines_cleaned
 
     def _clear_attributes(self):
-        keys = self._get_keys()
+        self._sections = {}
 
-        for key in keys:
-            delattr(self, key)
-
-    def _set_section_end_index(self, section, index):
+    @staticmethod
+    def _set_section_end_index(section, index, lines_cleaned):
         # Ignores blank lines at end of the section
         end_index = index
 
-        while self._lines_cleaned[end_index-1] == "":
+        while lines_cleaned[end_index-1] == "":
             end_index -= 1
 
         section._end_index_in_file = end_index
 
     def _insert_line_into_section(self, section, value):
-        # Insert into this section
-        index = section._end_index_in_file
-        self._lines_raw.insert(index, value)
-        self._lines_cleaned.insert(index, self._clean_line(value))
-        section._end_index_in_file += 1
+        self._insert_lines([(section._end_index_in_file, value)])
 
-        # Shift later sections
-        sections = self.get_sections()
+    def _insert_lines(self, insertions):
+        # Inserts (index, raw line) pairs in a single pass over the file lines, rather than one list insert
+        # and one section shift per line. Lines sharing an index keep their order.
+        if len(insertions) == 0:
+            return
+
+        insertions = sorted(insertions, key=itemgetter(0))
+        lines_raw = []
+        lines_cleaned = []
+        previous_index = 0
 
-        for section in sections:
-            if section._start_index_in_file >= index:
-                section._start_index_in_file += 1
-                section._end_index_in_file += 1
+        for index, line in insertions:
+            lines_raw.extend(self._lines_raw[previous_index:index])
+            lines_cleaned.extend(self._lines_cleaned[previous_index:index])
+            lines_raw.append(line)
+            lines_cleaned.append(self._clean_line(line))
+            previous_index = index
+
+        lines_raw.extend(self._lines_raw[previous_index:])
+        lines_cleaned.extend(self._lines_cleaned[previous_index:])
+        self._lines_raw = lines_raw
+        self._lines_cleaned = lines_cleaned
+
+        # Each section moves down by the number of lines inserted at or before its indices, which
+        # includes lines inserted at the end of the section itself
+        indices = [index for index, _ in insertions]
+
+        for section in self.get_sections():
+            if section._start_index_in_file is not None:
+                section._start_index_in_file += bisect_right(indices, section._start_index_in_file)
+                section._end_index_in_file += bisect_right(indices, section._end_index_in_file)
+
+    def _remove_lines(self, indices):
+        # Removes the lines at the sorted indices in a single pass over the file lines. Each section moves up by the
+        # number of lines removed before its indices, which includes lines removed from the section itself.
+        lines_raw = []
+        lines_cleaned = []
+        previous_index = 0
+
+        for index in indices:
+            lines_raw.extend(self._lines_raw[previous_index:index])
+            lines_cleaned.extend(self._lines_cleaned[previous_index:index])
+            previous_index = index + 1
+
+        lines_raw.extend(self._lines_raw[previous_index:])
+        lines_cleaned.extend(self._lines_cleaned[previous_index:])
+        self._lines_raw = lines_raw
+        self._lines_cleaned = lines_cleaned
+
+        for section in self.get_sections():
+            if section._start_index_in_file is not None:
+                section._start_index_in_file -= bisect_left(indices, section._start_index_in_file)
+                section._end_index_in_file -= bisect_left(indices, section._end_index_in_file)
 
     def _insert_new_section_line(self, section):
         section_name = section.get_name()
@@ -195,3 +1777,16 @@ class SettingsManager(BaseClass):
 
         section._start_index_in_file = len(self._lines_raw) - 1
         section._end_index_in_file = section._start_index_in_file + 1
+
+
+def _parse_in_process(file_paths, parse_options):
+    # Runs in a load_many worker process. Returns each file's parsed data, or the exception raised parsing it.
+    results = []
+
+    for file_path in file_paths:
+        try:
+            results.append(SettingsManager(file_path, **parse_options)._get_parsed_data())
+        except Exception as exception:
+            results.append(exception)
+
+    return results
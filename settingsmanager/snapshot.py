@@ -0,0 +1,353 @@
+import marshal
+import mmap
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+from settingsmanager.base import BaseClass
+
+# A parsed, read-only copy of the sections published to shared memory, for worker processes that only read settings.
+# A small control segment, named as given, holds the number of the current generation, and each generation is a
+# segment of its own named "<name>_<generation>". Workers find everything by binary search in the shared segment and
+# only decode the values they read, so they parse nothing and hold little memory of their own.
+#
+# Layout of a generation, in order:
+#   header
+#   sections in file order: name offset, name length, index of first entry, entry count
+#   section indices sorted by name
+#   entries, per section in file order: key offset, key length, value offset, value length
+#   entry indices, per section sorted by key
+#   names, keys and marshalled values
+
+_MAGIC = b"SMSNAP01"
+_HEADER = struct.Struct("<8sQII")
+_RECORD = struct.Struct("<IIII")
+_INDEX = struct.Struct("<I")
+_GENERATION = struct.Struct("<Q")
+
+# Times a worker retries when a generation is replaced while it attaches
+_ATTACH_ATTEMPTS = 100
+
+
+def get_segment_name(name, generation):
+    return f"{name}_{generation}"
+
+
+def build_snapshot(sections, generation):
+    # sections is a list of (section name, [(key, value), ...]) in file order. Values marshal can not store are
+    # stored as they would be written to the file.
+    section_records = []
+    section_names = []
+    entry_records = []
+    entry_sorted = []
+    heap = bytearray()
+
+    def add_to_heap(data):
+        heap.extend(data)
+        return len(heap) - len(data), len(data)
+
+    for section_name, entries in sections:
+        name_bytes = section_name.encode()
+        first_entry = len(entry_records)
+        keys = []
+
+        for key, value in entries:
+            try:
+                value_bytes = marshal.dumps(value)
+            except ValueError:
+                value_bytes = marshal.dumps(str(value))
+
+            key_bytes = key.encode()
+            keys.append(key_bytes)
+            entry_records.append(add_to_heap(key_bytes) + add_to_heap(value_bytes))
+
+        entry_sorted.extend(first_entry + index for index in sorted(range(len(keys)), key=keys.__getitem__))
+        section_names.append(name_bytes)
+        section_records.append(add_to_heap(name_bytes) + (first_entry, len(keys)))
+
+    section_sorted = sorted(range(len(section_names)), key=section_names.__getitem__)
+    heap_offset = (_HEADER.size + (_RECORD.size + _INDEX.size) * len(section_records)
+                   + (_RECORD.size + _INDEX.size) * len(entry_records))
+
+    data = bytearray(_HEADER.pack(_MAGIC, generation, len(section_records), len(entry_records)))
+
+    for name_offset, name_length, first_entry, entry_count in section_records:
+        data += _RECORD.pack(heap_offset + name_offset, name_length, first_entry, entry_count)
+
+    for index in section_sorted:
+        data += _INDEX.pack(index)
+
+    for key_offset, key_length, value_offset, value_length in entry_records:
+        data += _RECORD.pack(heap_offset + key_offset, key_length, heap_offset + value_offset, value_length)
+
+    for index in entry_sorted:
+        data += _INDEX.pack(index)
+
+    data += heap
+    return data
+
+
+class SnapshotPublisher:
+    # Owns the shared memory of a published snapshot. Each publish writes a new generation, then points the control
+    # segment at it and unlinks the previous one. Workers still reading the previous one keep it until they let go.
+    def __init__(self, name):
+        self._name = name
+        self._control = shared_memory.SharedMemory(name=name, create=True, size=_GENERATION.size)
+        self._segment = None
+        self._generation = 0
+
+    def publish(self, sections):
+        generation = self._generation + 1
+        data = build_snapshot([(section.get_name(), section.get_attributes().items()) for section in sections],
+                              generation)
+        segment = shared_memory.SharedMemory(name=get_segment_name(self._name, generation), create=True,
+                                             size=len(data))
+        segment.buf[:len(data)] = data
+
+        _GENERATION.pack_into(self._control.buf, 0, generation)
+        previous_segment = self._segment
+        self._segment = segment
+        self._generation = generation
+
+        if previous_segment is not None:
+            previous_segment.close()
+            previous_segment.unlink()
+
+    def get_generation(self):
+        return self._generation
+
+    def close(self):
+        for segment in (self._segment, self._control):
+            if segment is not None:
+                segment.close()
+                segment.unlink()
+
+        self._segment = None
+        self._control = None
+
+
+class SettingsSnapshot(BaseClass):
+    def __init__(self, name):
+        # Attaches to the snapshot published as name by SettingsManager.publish_snapshot
+        self._name = name
+        self._control = _attach(name)
+        self._generation = None
+        self._section_views = {}
+        self._attach_generation()
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, ie for sections
+        if not name.startswith("_"):
+            section = self._get_section_view(name)
+
+            if section is not None:
+                return section
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def get_attributes(self):
+        return {section.get_name(): section for section in self.get_sections()}
+
+    def get_sections(self):
+        return [self._get_section_view(name) for name in self._generation.get_section_names()]
+
+    def get_section(self, section):
+        if not isinstance(section, str):
+            raise ValueError(f"Section parameter must be a string (ie the section name), not {type(section)}.")
+
+        section_view = self._get_section_view(section)
+
+        if section_view is None:
+            raise AttributeError(f"Section '{section}' not found.")
+
+        return section_view
+
+    def get_generation(self):
+        return self._generation.number
+
+    def refresh_and_has_changed(self):
+        # Costs one read of the control segment unless a new generation has been published. Sections taken from
+        # the snapshot before keep the values of their generation.
+        if _GENERATION.unpack_from(self._control.buf)[0] == self._generation.number:
+            return False
+
+        self._attach_generation()
+        return True
+
+    def close(self):
+        self._section_views = {}
+        self._generation = None
+        self._control.close()
+
+    def _get_section_view(self, name):
+        section_view = self._section_views.get(name)
+
+        if section_view is None:
+            found = self._generation.find_section(name)
+
+            if found is None:
+                return None
+
+            section_view = self._section_views[name] = SnapshotSection(self._generation, name, *found)
+
+        return section_view
+
+    def _attach_generation(self):
+        for _ in range(_ATTACH_ATTEMPTS):
+            number = _GENERATION.unpack_from(self._control.buf)[0]
+
+            try:
+                generation = _Generation(_attach(get_segment_name(self._name, number)))
+            except FileNotFoundError:
+                # Replaced by a newer generation since its number was read
+                time.sleep(0.001)
+                continue
+
+            if generation.number == number:
+                self._generation = generation
+                self._section_views = {}
+                return
+
+        raise FileNotFoundError(f"No snapshot generation could be attached for '{self._name}'")
+
+
+class SnapshotSection(BaseClass):
+    # Values are decoded from shared memory when first read, then kept like converted values in a Section
+    def __init__(self, generation, heading_name, first_entry, entry_count):
+        self._generation = generation
+        self._name = heading_name
+        self._first_entry = first_entry
+        self._entry_count = entry_count
+
+    def __getattr__(self, name):
+        if not name.startswith("_"):
+            value = self._generation.find_value(self._first_entry, self._entry_count, name)
+
+            if value is not _NOT_FOUND:
+                self.__dict__[name] = value
+                return value
+
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __setattr__(self, name, value):
+        if not name.startswith("_"):
+            raise AttributeError(f"Snapshot section '{self._name}' is read-only")
+
+        super().__setattr__(name, value)
+
+    def get_attributes(self):
+        return {key: getattr(self, key) for key in self._get_keys()}
+
+    def get_name(self):
+        return self._name
+
+    def _get_keys(self):
+        return self._generation.get_keys(self._first_entry, self._entry_count)
+
+
+_NOT_FOUND = object()
+
+
+class _Generation:
+    # One attached generation. Kept alive by the sections taken from it, and closed once none are left.
+    def __init__(self, segment):
+        self._segment = segment
+        magic, self.number, self._section_count, self._entry_count = _HEADER.unpack_from(segment.buf)
+
+        if magic != _MAGIC:
+            raise ValueError(f"Shared memory '{segment.name}' does not hold a settings snapshot")
+
+        self._sections_offset = _HEADER.size
+        self._section_sorted_offset = self._sections_offset + _RECORD.size * self._section_count
+        self._entries_offset = self._section_sorted_offset + _INDEX.size * self._section_count
+        self._entry_sorted_offset = self._entries_offset + _RECORD.size * self._entry_count
+
+    def __del__(self):
+        self._segment.close()
+
+    def get_section_names(self):
+        return [self._get_name(self._sections_offset, index) for index in range(self._section_count)]
+
+    def find_section(self, name):
+        # Returns (index of first entry, entry count) of the section, or None
+        index = self._search(name.encode(), self._sections_offset, self._section_sorted_offset, 0, self._section_count)
+
+        if index is None:
+            return None
+
+        return _RECORD.unpack_from(self._segment.buf, self._sections_offset + _RECORD.size * index)[2:]
+
+    def get_keys(self, first_entry, entry_count):
+        return [self._get_name(self._entries_offset, index) for index in range(first_entry, first_entry + entry_count)]
+
+    def find_value(self, first_entry, entry_count, key):
+        index = self._search(key.encode(), self._entries_offset, self._entry_sorted_offset, first_entry, entry_count)
+
+        if index is None:
+            return _NOT_FOUND
+
+        _, _, value_offset, value_length = _RECORD.unpack_from(self._segment.buf,
+                                                               self._entries_offset + _RECORD.size * index)
+        return marshal.loads(self._segment.buf[value_offset:value_offset + value_length])
+
+    def _search(self, name, records_offset, sorted_offset, first, count):
+        # Binary search of the records first to first + count, in the order given by their sorted indices
+        buf = self._segment.buf
+        low = first
+        high = first + count
+
+        while low < high:
+            middle = (low + high) // 2
+            index = _INDEX.unpack_from(buf, sorted_offset + _INDEX.size * middle)[0]
+            name_offset, name_length = _RECORD.unpack_from(buf, records_offset + _RECORD.size * index)[:2]
+            candidate = bytes(buf[name_offset:name_offset + name_length])
+
+            if candidate == name:
+                return index
+            elif candidate < name:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None
+
+    def _get_name(self, records_offset, index):
+        # The section name or key of a record
+        name_offset, name_length = _RECORD.unpack_from(self._segment.buf, records_offset + _RECORD.size * index)[:2]
+        return bytes(self._segment.buf[name_offset:name_offset + name_length]).decode()
+
+
+def _attach(name):
+    # Attached without registering with the resource tracker, which would otherwise unlink the segment when this
+    # process exits even though the publisher owns it
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    if os.name == "nt":
+        # Only POSIX segments are tracked
+        return shared_memory.SharedMemory(name=name)
+
+    return _PosixSegment(name)
+
+
+class _PosixSegment:
+    # The attach half of SharedMemory, read-only, for Pythons before track=False. Unregistering a tracked segment
+    # instead would also drop the publisher's registration when it shares this process's resource tracker.
+    def __init__(self, name):
+        import _posixshmem
+
+        self.name = name
+        fd = _posixshmem.shm_open("/" + name, os.O_RDONLY, mode=0o600)
+
+        try:
+            self._mmap = mmap.mmap(fd, os.fstat(fd).st_size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        self.buf.release()
+        self._mmap.close()
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import re
+import threading
+
+# With lazy_sections, the sections of the settings file are indexed by their byte offsets and only read from the file
+# once they are used. Nothing of the file is kept open or mapped in between, as another process may truncate or
+# replace it. Each read opens the file again and checks it is still the one that was indexed. Once it is not, the
+# remaining sections are read from the file as it is now, found by their heading.
+
+# Heading lines, as _is_line_a_heading sees them once trailing whitespace is stripped
+HEADING_PATTERN = re.compile(rb"^\[(.+)\][ \t\r\f\v]*$", re.MULTILINE)
+
+# Bytes read at a time while indexing, so the whole file is never held in memory
+_BLOCK_SIZE = 1 << 20
+
+
+def index_headings(file):
+    # Returns the (start byte, heading bytes) of each heading in the binary file, read from its current position to
+    # the end, and the blake2b digest of what was read
+    hasher = hashlib.blake2b()
+    headings = []
+    offset = 0
+    rest = b""
+
+    while True:
+        block = file.read(_BLOCK_SIZE)
+        hasher.update(block)
+        data = rest + block
+
+        # Only whole lines are scanned, the partial last one is kept for the next block
+        end = data.rfind(b"\n") + 1 if block else len(data)
+        headings.extend((offset + match.start(), match.group(1)) for match in HEADING_PATTERN.finditer(data, 0, end))
+
+        if not block:
+            return headings, hasher.digest()
+
+        offset += end
+        rest = data[end:]
+
+
+class FileSource:
+    def __init__(self, file_path, file_stat, encoding):
+        self._file_path = file_path
+        self._file_id = self._get_file_id(file_stat)
+        self._encoding = encoding
+        self._lock = threading.Lock()
+
+        # Once the file no longer matches the one indexed, its content as first read after that and the (start byte,
+        # end byte) of each section in it, by name
+        self._changed_data = None
+        self._changed_sections = None
+
+    def read_section(self, name, start, end):
+        # Returns the start byte and the bytes of section name, indexed at [start, end). Empty if the file has
+        # changed and the section is no longer in it.
+        if self._changed_sections is None:
+            data = self._read(start, end)
+
+            if data is not None:
+                return start, data
+
+        data, sections = self._read_changed()
+        start, end = sections.get(name, (0, 0))
+        return start, data[start:end]
+
+    def read_all(self):
+        if self._changed_sections is None:
+            data = self._read(0, None)
+
+            if data is not None:
+                return data
+
+        return self._read_changed()[0]
+
+    def has_changed(self):
+        # Whether a read found the file changed since it was indexed
+        return self._changed_sections is not None
+
+    def _read(self, start, end):
+        # Bytes [start, end) of the file, or None if it is no longer the file indexed
+        try:
+            with open(self._file_path, "rb") as file:
+                if self._get_file_id(os.fstat(file.fileno())) != self._file_id:
+                    return None
+
+                file.seek(start)
+                data = file.read() if end is None else file.read(end - start)
+
+                # A writer that kept the file, eg saving in place, may have changed it while it was read
+                if self._get_file_id(os.fstat(file.fileno())) != self._file_id:
+                    return None
+        except FileNotFoundError:
+            return None
+
+        return data
+
+    def _read_changed(self):
+        with self._lock:
+            if self._changed_sections is None:
+                try:
+                    with open(self._file_path, "rb") as file:
+                        data = file.read()
+                except FileNotFoundError:
+                    data = b""
+
+                matches = list(HEADING_PATTERN.finditer(data))
+                sections = {}
+
+                for index, match in enumerate(matches):
+                    end = matches[index + 1].start() if index + 1 < len(matches) else len(data)
+                    sections[match.group(1).decode(self._encoding)] = match.start(), end
+
+                self._changed_data = data
+                self._changed_sections = sections
+
+        return self._changed_data, self._changed_sections
+
+    @staticmethod
+    def _get_file_id(file_stat):
+        return file_stat.st_dev, file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns
@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import nullcontext
+
+# Instrumentation for SettingsManager. A manager created without instrument=True uses NO_STATS, whose methods do
+# nothing, so the only cost left in refresh and save is a few no-op calls.
+
+PHASES = ("read", "clean", "parse", "cache_load", "map", "merge", "render", "write", "refresh", "save")
+COUNTERS = ("refreshes", "lines_parsed", "bytes_read", "sections_rebuilt", "cache_hits", "saves", "saves_skipped",
+            "lines_rendered", "bytes_written", "saves_patched", "bytes_not_rewritten", "journal_appends",
+            "journal_compactions", "lines_removed")
+
+
+class Stats:
+    def __init__(self, hook=None):
+        # hook(phase, seconds) is called as each phase ends, and hook(counter, increment) as each counter is added to.
+        # Phase and counter names never overlap.
+        self._hook = hook
+        self._lock = threading.Lock()
+        self.reset()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+        if self._hook is not None:
+            self._hook(name, value)
+
+    def get(self):
+        # Cumulative and last-run seconds and run counts per phase, and the counters
+        with self._lock:
+            return {
+                "phases": {name: dict(phase) for name, phase in self._phases.items()},
+                "counters": dict(self._counters),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._phases = {name: {"calls": 0, "total": 0.0, "last": 0.0} for name in PHASES}
+            self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def _add_time(self, name, seconds):
+        with self._lock:
+            phase = self._phases[name]
+            phase["calls"] += 1
+            phase["total"] += seconds
+            phase["last"] = seconds
+
+        if self._hook is not None:
+            self._hook(name, seconds)
+
+
+class _Phase:
+    __slots__ = ("_stats", "_name", "_start")
+
+    def __init__(self, stats, name):
+        self._stats = stats
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Failed runs are not timed
+        if exc_type is None:
+            self._stats._add_time(self._name, time.perf_counter() - self._start)
+
+
+class _NoStats:
+    _NO_PHASE = nullcontext()
+
+    def phase(self, name):
+        return self._NO_PHASE
+
+    def count(self, name, value=1):
+        pass
+
+    def get(self):
+        return None
+
+    def reset(self):
+        pass
+
+
+NO_STATS = _NoStats()
@@ -0,0 +1,43 @@
+from settingsmanager.base import BaseClass, LINE_HEADING, LINE_ENTRY
+from settingsmanager.patch import recover_file
+from settingsmanager.settingsmanager import Section
+
+
+def iter_entries(file_path, sections=None, parse_bool=True, parse_int=True, parse_float=True):
+    # Yields (section name, key, value, line number) for each entry in the file, reading one line at a time rather
+    # than loading the whole file. Entries are parsed as refresh parses them. If sections is given, only entries
+    # in those sections are parsed; lines in other sections are skipped unless they could be a heading. Line numbers
+    # start at 1.
+    if sections is not None:
+        sections = set(sections)
+
+    section_name = None
+    section_keys = None
+    skipping = False
+
+    # Finishes an interrupted in-place save first, so the file is never read half patched
+    recover_file(file_path)
+
+    with open(file_path, "r") as file:
+        for line_number, line in enumerate(file, 1):
+            if skipping and line[:1] != "[":
+                continue
+
+            kind, name, raw_value = BaseClass._tokenize_line(BaseClass._clean_line(line))
+
+            if kind == LINE_HEADING:
+                BaseClass._is_key_or_section_name_valid(name)
+                section_name = name
+                section_keys = set()
+                skipping = sections is not None and name not in sections
+
+            elif kind == LINE_ENTRY:
+                if section_name is None:
+                    raise ValueError(f"Entry '{name}' on line {line_number} is not in a section")
+
+                if name in section_keys or hasattr(Section, name):
+                    raise AttributeError(f"Duplicate key '{name}' in section '{section_name}'")
+
+                section_keys.add(name)
+                value = BaseClass._convert_value(raw_value, parse_bool, parse_float, parse_int)
+                yield section_name, name, value, line_number
@@ -0,0 +1,190 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+# The directory is watched rather than the file, so editors that write a new file and rename it over the old one
+# are still seen
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+
+    if not hasattr(libc, "inotify_init1") or not hasattr(libc, "inotify_add_watch"):
+        return None
+
+    return libc
+
+
+class FileWatcher:
+    def __init__(self, file_path, on_change, debounce_ms=100, poll_interval_ms=500, use_inotify=True):
+        self._file_path = os.path.abspath(file_path)
+        self._on_change = on_change
+        self._debounce = debounce_ms / 1000
+        self._poll_interval = poll_interval_ms / 1000
+        self._use_inotify = use_inotify
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._inotify_fd = None
+        self._wake_fds = None
+        self._file_signature = None
+
+    def start(self):
+        if self._thread is not None:
+            raise RuntimeError(f"Already watching '{self._file_path}'")
+
+        self._stop_event.clear()
+
+        if self._use_inotify:
+            self._open_inotify()
+
+        if self._inotify_fd is None:
+            self._file_signature = self._get_file_signature()
+
+        self._thread = threading.Thread(target=self._run, name="settingsmanager-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+
+        if self._wake_fds is not None:
+            os.write(self._wake_fds[1], b"\0")
+
+        # The callback may stop the watcher from the watcher thread itself, which then exits on its own
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+
+        self._thread = None
+        self._close_inotify()
+
+    def is_using_inotify(self):
+        return self._inotify_fd is not None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if not self._wait_for_change(None):
+                continue
+
+            # Coalesce a burst of writes: only act once the file has been quiet for the debounce period
+            deadline = time.monotonic() + self._debounce
+
+            while not self._stop_event.is_set():
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    break
+
+                if self._wait_for_change(remaining):
+                    deadline = time.monotonic() + self._debounce
+
+            if not self._stop_event.is_set():
+                self._on_change()
+
+    def _wait_for_change(self, timeout):
+        if self._inotify_fd is not None:
+            return self._wait_for_inotify_event(timeout)
+
+        return self._wait_for_stat_change(timeout)
+
+    def _wait_for_inotify_event(self, timeout):
+        readable, _, _ = select.select([self._inotify_fd, self._wake_fds[0]], [], [], timeout)
+
+        if self._inotify_fd not in readable:
+            return False
+
+        try:
+            data = os.read(self._inotify_fd, 65536)
+        except BlockingIOError:
+            return False
+
+        file_name = os.fsencode(os.path.basename(self._file_path))
+        changed = False
+        offset = 0
+
+        while offset < len(data):
+            _, _, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+
+            if name == file_name:
+                changed = True
+
+        return changed
+
+    def _wait_for_stat_change(self, timeout):
+        if timeout is None or timeout > self._poll_interval:
+            timeout = self._poll_interval
+
+        if self._stop_event.wait(timeout):
+            return False
+
+        file_signature = self._get_file_signature()
+
+        if file_signature == self._file_signature:
+            return False
+
+        self._file_signature = file_signature
+        return True
+
+    def _get_file_signature(self):
+        try:
+            file_stat = os.stat(self._file_path)
+        except FileNotFoundError:
+            return None
+
+        return file_stat.st_mtime_ns, file_stat.st_size, file_stat.st_ino
+
+    def _open_inotify(self):
+        libc = _load_libc()
+
+        if libc is None:
+            return
+
+        inotify_fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+
+        if inotify_fd < 0:
+            return
+
+        directory = os.fsencode(os.path.dirname(self._file_path))
+
+        if libc.inotify_add_watch(inotify_fd, directory, _WATCH_MASK) < 0:
+            os.close(inotify_fd)
+            return
+
+        self._inotify_fd = inotify_fd
+        self._wake_fds = os.pipe()
+
+    def _close_inotify(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+        if self._wake_fds is not None:
+            os.close(self._wake_fds[0])
+            os.close(self._wake_fds[1])
+            self._wake_fds = None
@@ -0,0 +1,129 @@
+import sys
+
+sys.path.append("../")
+
+import unittest
+import asyncio
+from settingsmanager import AsyncSettingsManager
+import os
+import shutil
+import threading
+
+
+class CountingSettingsManager(AsyncSettingsManager):
+    def __init__(self, *args, **kwargs):
+        self.counts = {"load": 0, "save": 0}
+        super().__init__(*args, **kwargs)
+
+    def _load_state(self):
+        self.counts["load"] += 1
+        return super()._load_state()
+
+    def save(self, new_file_path=None):
+        self.counts["save"] += 1
+        super().save(new_file_path)
+
+
+class TestAsyncSettingsManager(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        shutil.copy("settings_test.txt", "settings_test_async.txt")
+
+    def tearDown(self):
+        os.remove("settings_test_async.txt")
+
+    def edit_test_value(self, value):
+        with open("settings_test.txt", "r") as file: lines = file.readlines()
+        lines[1] = f"test = {value}\n"
+        with open("settings_test_async.txt", "w") as file: file.writelines(lines)
+
+    async def test_load(self):
+        settings = await AsyncSettingsManager.load("settings_test_async.txt", parse_int=False)
+        self.assertEqual(settings.general.test, "test value")
+        self.assertEqual(settings.general.test_int, "590")
+
+    async def test_arefresh(self):
+        settings = await AsyncSettingsManager.load("settings_test_async.txt")
+        general = settings.general
+        self.edit_test_value("edited value")
+
+        changes = await settings.arefresh()
+        self.assertListEqual(changes["changed"], [("general", "test", "test value", "edited value")])
+        self.assertEqual(settings.general.test, "edited value")
+        self.assertEqual(general.test, "test value")
+
+        #### Overlapping refreshes share a run
+        settings = CountingSettingsManager("settings_test_async.txt")
+        await asyncio.gather(*[settings.arefresh() for _ in range(10)])
+        self.assertEqual(settings.counts["load"], 3)
+
+    async def test_asave(self):
+        settings = CountingSettingsManager("settings_test_async.txt")
+        settings.general.test = "saved value"
+        await settings.asave()
+        self.assertEqual(AsyncSettingsManager("settings_test_async.txt").general.test, "saved value")
+
+        #### Overlapping saves share a run, which writes every change made before it
+        saves = []
+
+        for index in range(10):
+            settings.set_value(f"key_{index}", index, "general")
+            saves.append(asyncio.ensure_future(settings.asave()))
+            await asyncio.sleep(0)
+
+        await asyncio.gather(*saves)
+        self.assertLess(settings.counts["save"], 11)
+
+        settings = AsyncSettingsManager("settings_test_async.txt")
+        self.assertListEqual([settings.general.get_attributes()[f"key_{index}"] for index in range(10)],
+                             list(range(10)))
+
+        #### Values are read and changed on the loop while the file is being written
+        writing = threading.Event()
+        read = threading.Event()
+        timed_out = []
+
+        def wait_while_writing(phase, seconds):
+            if phase == "write":
+                writing.set()
+                timed_out.append(not read.wait(5))
+
+        settings = AsyncSettingsManager("settings_test_async.txt", stats_hook=wait_while_writing)
+        settings.general.test = "saving"
+        save = asyncio.ensure_future(settings.asave())
+
+        while not writing.is_set():
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(settings.general.test_int, 590)
+        settings.general.test_float = 2.5
+        read.set()
+        await save
+
+        self.assertListEqual(timed_out, [False])
+        self.assertSetEqual(settings.general._dirty_keys, {"test_float"})
+        self.assertEqual(AsyncSettingsManager("settings_test_async.txt").general.test, "saving")
+
+    async def test_arefresh_and_has_changed(self):
+        settings = await AsyncSettingsManager.load("settings_test_async.txt", check_stat=True)
+        self.assertEqual(await settings.arefresh_and_has_changed(), False)
+
+        self.edit_test_value("edited value")
+        self.assertEqual(await settings.arefresh_and_has_changed(), True)
+        self.assertEqual(settings.general.test, "edited value")
+
+    async def test_awatch(self):
+        settings = await AsyncSettingsManager.load("settings_test_async.txt")
+        changes = settings.awatch(debounce_ms=50, poll_interval_ms=20)
+        next_change = asyncio.ensure_future(changes.__anext__())
+
+        # Let the watcher start before the file is edited
+        await asyncio.sleep(0.1)
+        self.edit_test_value("edited value")
+
+        self.assertIs(await asyncio.wait_for(next_change, 5), settings)
+        self.assertEqual(settings.general.test, "edited value")
+        await changes.aclose()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,7 @@ sys.path.append("../")
 
 import unittest
 from settingsmanager import SettingsManager
+from settingsmanager.base import LINE_OTHER, LINE_HEADING, LINE_ENTRY
 
 
 class TestSettingsManager(unittest.TestCase):
@@ -154,6 +155,46 @@ class TestSettingsManager(unittest.TestCase):
         string = "# commented_out = value"
         self.assertEqual(self.settings._get_value_from_line(string), None)
 
+    def test_tokenize_line(self):
+        self.assertEqual(self.settings._tokenize_line("[heading]"), (LINE_HEADING, "heading", None))
+        self.assertEqual(self.settings._tokenize_line("key=value"), (LINE_ENTRY, "key", "value"))
+        self.assertEqual(self.settings._tokenize_line("key=a=b"), (LINE_ENTRY, "key", "a=b"))
+        self.assertEqual(self.settings._tokenize_line("valid_key0=12.5"), (LINE_ENTRY, "valid_key0", "12.5"))
+        self.assertEqual(self.settings._tokenize_line("key="), (LINE_ENTRY, "key", ""))
+
+        #### Cleaned twice, as with _is_line_an_entry on an already cleaned line
+        self.assertEqual(self.settings._tokenize_line("key= value"), (LINE_ENTRY, "key", "value"))
+        self.assertEqual(self.settings._tokenize_line("key =value"), (LINE_ENTRY, "key", "value"))
+
+        #### Not entries
+        self.assertEqual(self.settings._tokenize_line(""), (LINE_OTHER, None, None))
+        self.assertEqual(self.settings._tokenize_line("[]"), (LINE_OTHER, None, None))
+        self.assertEqual(self.settings._tokenize_line("# comment=comment"), (LINE_OTHER, None, None))
+        self.assertEqual(self.settings._tokenize_line("_key=value"), (LINE_OTHER, None, None))
+        self.assertEqual(self.settings._tokenize_line("1key=value"), (LINE_OTHER, None, None))
+        self.assertEqual(self.settings._tokenize_line("no equals sign"), (LINE_OTHER, None, None))
+
+    def test_tokenize_line_matches_line_helpers(self):
+        lines = ["[general]", "key=value", "key= value", "key  =  value", "bad key=value", "key=a = b",
+                 "# key=value", "[not heading", "x=True", "key_2=1.5", "=value", "KEY=", "k_=[v]"]
+
+        for line in lines:
+            cleaned = self.settings._clean_line(line)
+            kind, key, _ = self.settings._tokenize_line(cleaned)
+
+            self.assertEqual(kind == LINE_HEADING, self.settings._is_line_a_heading(cleaned))
+            if kind != LINE_HEADING:
+                self.assertEqual(kind == LINE_ENTRY, self.settings._is_line_an_entry(cleaned))
+                self.assertEqual(key, self.settings._get_key_from_line(cleaned))
+
+    def test_convert_value(self):
+        values = ["value", "True", "false", "590", "-12", "1.989", "12.345!", "1.2.3", "", "1_000", "inf", "nan."]
+
+        for value in values:
+            for flags in [(True, True, True), (False, True, True), (True, False, True), (True, True, False)]:
+                expected = self.settings._get_value_from_line(f"key={value}", *flags)
+                self.assertEqual(self.settings._convert_value(value, *flags), expected)
+
     def test_attempt_parse_bool(self):
         input = "True"
         self.assertEqual(self.settings._attempt_parse_bool(input), True)
@@ -0,0 +1,104 @@
+import sys
+
+sys.path.append("../")
+
+import unittest
+from settingsmanager import SettingsManager
+from settingsmanager import LayeredSettings
+import os
+import time
+
+
+class TestLayered(unittest.TestCase):
+    def setUp(self):
+        with open("settings_test_base.txt", "w") as file:
+            file.write("[general]\nname = base\nport = 80\ndebug = False\n\n[database]\nhost = localhost\n")
+
+        with open("settings_test_env.txt", "w") as file:
+            file.write("[general]\nport = 8080\n")
+
+        with open("settings_test_host.txt", "w") as file:
+            file.write("[general]\ndebug = True\n\n[host]\nid = 7\n")
+
+    def tearDown(self):
+        for file_path in ["settings_test_base.txt", "settings_test_env.txt", "settings_test_host.txt"]:
+            os.remove(file_path)
+
+    def test_merged_view(self):
+        env = SettingsManager("settings_test_env.txt")
+        settings = LayeredSettings(["settings_test_base.txt", env, "settings_test_host.txt"])
+        self.assertIs(settings.get_layers()[1], env)
+
+        #### Highest layer wins, keys only in lower layers are kept
+        self.assertEqual(settings.general.name, "base")
+        self.assertEqual(settings.general.port, 8080)
+        self.assertEqual(settings.general.debug, True)
+        self.assertEqual(settings.database.host, "localhost")
+        self.assertEqual(settings.host.id, 7)
+        self.assertDictEqual(settings.general.get_attributes(), {"name": "base", "port": 8080, "debug": True})
+        self.assertListEqual([section.get_name() for section in settings.get_sections()],
+                             ["general", "database", "host"])
+        self.assertEqual(settings.get_value("port", "general"), 8080)
+        self.assertIs(settings.get_section("general"), settings.general)
+
+        self.assertRaises(AttributeError, getattr, settings, "missing")
+        self.assertRaises(AttributeError, getattr, settings.general, "missing")
+        self.assertRaises(AttributeError, settings.get_value, "missing", "general")
+        self.assertRaises(ValueError, LayeredSettings, [])
+
+    def test_refresh_and_has_changed(self):
+        settings = LayeredSettings(["settings_test_base.txt", "settings_test_env.txt", "settings_test_host.txt"])
+        general = settings.general
+        self.assertFalse(settings.refresh_and_has_changed())
+
+        time.sleep(0.01)
+
+        with open("settings_test_env.txt", "w") as file:
+            file.write("[general]\nport = 9090\n\n[extra]\nkey = value\n")
+
+        self.assertTrue(settings.refresh_and_has_changed())
+        self.assertEqual(general.port, 9090)
+        self.assertEqual(settings.extra.key, "value")
+
+        with open("settings_test_env.txt", "w") as file:
+            file.write("[general]\n")
+
+        settings.refresh()
+        self.assertEqual(general.port, 80)
+        self.assertRaises(AttributeError, getattr, settings, "extra")
+
+    def test_set_value(self):
+        settings = LayeredSettings(["settings_test_base.txt", "settings_test_env.txt", "settings_test_host.txt"])
+
+        #### Write layer is the highest by default
+        settings.set_value("port", 443, "general")
+        self.assertEqual(settings.general.port, 443)
+
+        #### Overridden by a higher layer, so the merged value stays
+        settings.set_value("name", "env", settings.general, layer=1)
+        settings.set_value("debug", False, "general", layer=0)
+        self.assertEqual(settings.general.name, "env")
+        self.assertEqual(settings.general.debug, True)
+
+        settings.set_value("key", "value", "new_section", layer=1)
+        self.assertEqual(settings.new_section.key, "value")
+        settings.save()
+
+        base, env, host = settings.get_layers()
+        self.assertEqual(SettingsManager("settings_test_host.txt").general.port, 443)
+        self.assertEqual(SettingsManager("settings_test_env.txt").new_section.key, "value")
+        self.assertEqual(SettingsManager("settings_test_base.txt").general.debug, False)
+
+        #### Changes made to a layer directly are picked up by invalidate
+        env.general.port = 1
+        host.add_entry("extra", 1, "host")
+        settings.invalidate(host)
+        self.assertEqual(settings.host.extra, 1)
+        self.assertEqual(settings.general.port, 443)
+
+        self.assertRaises(IndexError, settings.set_value, "key", 1, "general", layer=3)
+        self.assertRaises(ValueError, settings.invalidate, SettingsManager("settings_test_env.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,8 +5,18 @@ sys.path.append("../")
 import unittest
 from settingsmanager import SettingsManager
 from settingsmanager import Section
+from settingsmanager import SaveConflictError
+from settingsmanager import SchemaError
+from settingsmanager.cache import get_cache_path, make_cache_key, read_cache, write_cache
+from settingsmanager.journal import get_journal_path
+from settingsmanager.merge import get_lock_path, lock_file
+from settingsmanager.patch import get_patch_path, _write_journal
+from settingsmanager.stats import COUNTERS, PHASES
+import settingsmanager.source
 import os
 import shutil
+import tempfile
+import threading
 
 
 class TestSettingsManager(unittest.TestCase):
@@ -94,6 +104,172 @@ class TestSettingsManager(unittest.TestCase):
         self.assertEqual(self.settings.general.test, "test value")
         self.assertRaises(AttributeError, self.settings.add_entry, *["key", "value", "added_section"])
 
+    def test_incremental_refresh(self):
+        shutil.copy("settings_test.txt", "settings_test_incremental.txt")
+        settings = SettingsManager("settings_test_incremental.txt", instrument=True)
+        general = settings.general
+        space_test = settings.space_test
+        self.assertEqual(general.test_int, 590)
+
+        #### Nothing changed
+        self.assertDictEqual(settings.refresh(), {"added": [], "removed": [], "changed": []})
+        self.assertIs(settings.general, general)
+        self.assertEqual(settings.stats()["counters"]["sections_rebuilt"], 3)
+
+        #### Only the edited section is parsed again, and the others are kept even though their lines moved
+        with open("settings_test.txt") as file: lines = file.readlines()
+        lines[1:6] = ["test_boolean = True\n", "test_boolean2 = False\n", "# comment\n", "test_int = 591\n",
+                      "test_float = 1.989\n", "test_new = new value\n"]
+        lines += ["\n", "[empty_section]\n"]
+        with open("settings_test_incremental.txt", "w") as file: file.writelines(lines)
+
+        changes = settings.refresh()
+        self.assertListEqual(changes["added"], [("general", "test_new", None, "new value"),
+                                                ("empty_section", None, None, None)])
+        self.assertListEqual(changes["removed"], [("general", "test", "test value", None)])
+        self.assertListEqual(changes["changed"], [("general", "test_int", 590, 591)])
+        self.assertIsNot(settings.general, general)
+        self.assertIs(settings.space_test, space_test)
+        self.assertEqual(general.test_int, 590)
+        self.assertEqual(settings.stats()["counters"]["sections_rebuilt"], 5)
+
+        #### Kept sections are saved at their new lines
+        settings.space_test.test = "edited"
+        settings.save()
+        self.assertEqual(SettingsManager("settings_test_incremental.txt").space_test.test, "edited")
+        self.assertEqual(SettingsManager("settings_test_incremental.txt").general.test_int, 591)
+
+        #### Unsaved changes and removed sections
+        settings.space_before_section.test = "unsaved"
+        with open("settings_test_incremental.txt", "w") as file:
+            file.writelines(lines[:lines.index("[space_before_section]\n")])
+
+        changes = settings.refresh()
+        self.assertListEqual(changes["changed"], [("space_test", "test", "edited", "test1")])
+        self.assertIn(("space_before_section", "test", "unsaved", None), changes["removed"])
+        self.assertIn(("empty_section", None, None, None), changes["removed"])
+        self.assertEqual(settings.space_test.test, "test1")
+
+        #### Entries before the first heading are still an error
+        with open("settings_test_incremental.txt", "w") as file: file.writelines(["key = value\n"] + lines)
+        self.assertRaises(ValueError, settings.refresh)
+
+        #### Not compared when sections are loaded lazily
+        self.assertIsNone(SettingsManager("settings_test.txt", lazy_sections=True).refresh())
+        os.remove("settings_test_incremental.txt")
+
+    def test_remove(self):
+        contents = ("[general]\nname = app\n# the port\nport = 80\ndebug = False\n\n"
+                    "[old]\nkey = value\n\n\n[database]\nhost = localhost\n\n[last]\nkey = value\n")
+
+        for options in ({}, {"in_place_save": True}, {"lazy_sections": True}):
+            with open("settings_test_remove.txt", "w") as file: file.write(contents)
+
+            settings = SettingsManager("settings_test_remove.txt", instrument=True, **options)
+            settings.remove_entry("port", "general")
+            settings.remove_section("old")
+            settings.remove_section(settings.last)
+
+            self.assertDictEqual(settings.general.get_attributes(), {"name": "app", "debug": False})
+            self.assertRaises(AttributeError, getattr, settings.general, "port")
+            self.assertRaises(AttributeError, getattr, settings, "old")
+            self.assertRaises(AttributeError, settings.remove_entry, "port", "general")
+            self.assertRaises(AttributeError, settings.remove_section, "old")
+
+            #### Lines are only dropped by the save, keeping comments and blank lines around them
+            with open("settings_test_remove.txt") as file: self.assertEqual(file.read(), contents)
+
+            settings.database.host = "remote"
+            settings.save()
+
+            with open("settings_test_remove.txt") as file:
+                self.assertEqual(file.read(), "[general]\nname = app\n# the port\ndebug = False\n\n"
+                                              "[database]\nhost = remote\n")
+
+            self.assertEqual(settings.stats()["counters"]["lines_removed"], 8)
+
+            #### Sections after the dropped lines are saved at their new lines
+            settings.add_entry("port", 5432, "database")
+            settings.general.name = "renamed"
+            settings.save()
+
+            with open("settings_test_remove.txt") as file:
+                self.assertEqual(file.read(), "[general]\nname = renamed\n# the port\ndebug = False\n\n"
+                                              "[database]\nhost = remote\nport = 5432\n")
+
+        #### Comments directly above the next heading are kept with it
+        with open("settings_test_comments.txt", "w") as file:
+            file.write("[a]\nx = 1\n\n# settings for b\n[b]\ny = 2\n# about y\n\n[c]\nz = 3\n# about z\n[d]\n")
+
+        settings_comments = SettingsManager("settings_test_comments.txt")
+        settings_comments.remove_section("a")
+        settings_comments.remove_section("c")
+        settings_comments.save()
+
+        with open("settings_test_comments.txt") as file:
+            self.assertEqual(file.read(), "# settings for b\n[b]\ny = 2\n# about y\n\n[d]\n")
+
+        os.remove("settings_test_comments.txt")
+
+        #### A section removed and added again is written as new
+        settings.remove_section("database")
+        settings.add_section("database")
+        settings.database.host = "other"
+        settings.save()
+        self.assertEqual(SettingsManager("settings_test_remove.txt").database.get_attributes(), {"host": "other"})
+
+        #### Undone by a failed transaction
+        settings = SettingsManager("settings_test_remove.txt")
+
+        with self.assertRaises(RuntimeError):
+            with settings.transaction():
+                settings.remove_entry("name", "general")
+                settings.remove_section("database")
+                raise RuntimeError
+
+        self.assertEqual(settings.general.name, "renamed")
+        settings.save()
+        self.assertEqual(SettingsManager("settings_test_remove.txt").database.host, "other")
+
+        #### Saved straight away in journal mode
+        settings = SettingsManager("settings_test_remove.txt", journal=True)
+        settings.general.name = "journaled"
+        settings.remove_entry("debug", "general")
+        self.assertFalse(os.path.exists(get_journal_path("settings_test_remove.txt")))
+        self.assertDictEqual(SettingsManager("settings_test_remove.txt").general.get_attributes(),
+                             {"name": "journaled"})
+
+        #### Merged onto changes made on disk
+        settings_a = SettingsManager("settings_test_remove.txt", merge_on_save=True)
+        settings_b = SettingsManager("settings_test_remove.txt", merge_on_save=True)
+        settings_a.general.name = "edited by a"
+        settings_a.add_entry("port", 80, "general")
+        settings_a.save()
+
+        settings_b.remove_entry("name", "general")
+        settings_b.remove_section("database")
+        self.assertRaises(SaveConflictError, settings_b.save)
+
+        settings_b = SettingsManager("settings_test_remove.txt", merge_on_save=True, conflict_policy="ours")
+        settings_a.general.name = "edited again"
+        settings_a.save()
+        settings_b.remove_entry("name", "general")
+        settings_b.remove_section("database")
+        settings_b.save()
+
+        with open("settings_test_remove.txt") as file:
+            self.assertEqual(file.read(), "[general]\n# the port\nport = 80\n")
+
+        #### Queries
+        settings = SettingsManager("settings_test_remove.txt")
+        self.assertListEqual(settings.find(), [("general", "port", 80)])
+        settings.remove_entry("port", "general")
+        self.assertListEqual(settings.find(), [])
+        settings.remove_section("general")
+        self.assertListEqual(settings.sections_with("port"), [])
+        os.remove("settings_test_remove.txt")
+        os.remove(".settings_test_remove.txt.lock")
+
     def test_save(self):
         #### Save an exact copy
         self.settings.save("copied_settings_test.txt")
@@ -135,6 +311,834 @@ class TestSettingsManager(unittest.TestCase):
         os.remove("copied_settings_test.txt")
         os.remove("edited_settings_test.txt")
 
+    def test_save_only_changed(self):
+        shutil.copy("settings_test.txt", "settings_test_dirty.txt")
+        settings = SettingsManager("settings_test_dirty.txt")
+
+        #### Nothing changed, so the file is left alone
+        with open("settings_test_dirty.txt", "a") as file: file.write("external=edit\n")
+        settings.save()
+        with open("settings_test_dirty.txt") as file: lines = file.readlines()
+        self.assertEqual(lines[-1], "external=edit\n")
+
+        #### Only the changed line is re-rendered
+        settings.refresh()
+        settings.space_before_section.test = "edited value"
+        settings.save()
+        with open("settings_test_dirty.txt") as file: lines = file.readlines()
+        self.assertEqual(lines[19], "test = edited value\n")
+        self.assertEqual(lines[20], "external=edit\n")
+
+        #### No temporary files left behind
+        self.assertListEqual([name for name in os.listdir(".") if name.endswith(".tmp")], [])
+
+        #### A symlinked file is saved through the link, and a new file gets the permissions open() gives it
+        os.symlink("settings_test_dirty.txt", "settings_test_link.txt")
+        settings = SettingsManager("settings_test_link.txt")
+        settings.general.test = "saved through link"
+        settings.save()
+        self.assertTrue(os.path.islink("settings_test_link.txt"))
+        self.assertEqual(SettingsManager("settings_test_dirty.txt").general.test, "saved through link")
+
+        settings.save("settings_test_new_mode.txt")
+        with open("settings_test_mode.txt", "w"): pass
+        self.assertEqual(os.stat("settings_test_new_mode.txt").st_mode, os.stat("settings_test_mode.txt").st_mode)
+
+        for file_path in ("settings_test_link.txt", "settings_test_dirty.txt", "settings_test_new_mode.txt",
+                          "settings_test_mode.txt"):
+            os.remove(file_path)
+
+    def test_dirty_keys(self):
+        self.assertEqual(self.settings.general._has_unsaved_changes(), False)
+
+        self.settings.general.test = "edited value"
+        self.settings.general.set_value("test_int", 1)
+        self.settings.general.add_entry("new_key", "new value")
+        self.assertSetEqual(self.settings.general._dirty_keys, {"test", "test_int", "new_key"})
+        self.assertEqual(self.settings.space_test._has_unsaved_changes(), False)
+
+        new_section = self.settings.add_section("new_section")
+        self.assertEqual(new_section._has_unsaved_changes(), True)
+
+        self.settings.refresh()
+        self.assertSetEqual(self.settings.general._dirty_keys, set())
+
+    def test_lazy_values(self):
+        #### Values are converted on first access only
+        self.assertDictEqual(self.settings.general._entries, {
+            "test": "test value", "test_boolean": "True", "test_boolean2": "False", "test_int": "590",
+            "test_float": "1.989"
+        })
+        self.assertEqual(self.settings.general.test_int, 590)
+        self.assertIsNone(self.settings.general._entries["test_int"])
+        self.assertEqual(self.settings.general._has_unsaved_changes(), False)
+
+        #### Assigning replaces the raw value
+        self.settings.general.test_float = "edited"
+        self.assertEqual(self.settings.general.test_float, "edited")
+        self.assertIsNone(self.settings.general._entries["test_float"])
+
+        #### Parse flags are applied on access
+        settings_unparsed = SettingsManager("settings_test.txt", parse_bool=False, parse_int=False)
+        self.assertEqual(settings_unparsed.general.test_boolean, "True")
+        self.assertEqual(settings_unparsed.general.test_int, "590")
+        self.assertEqual(settings_unparsed.general.test_float, 1.989)
+
+        #### Missing keys
+        self.assertEqual(hasattr(self.settings.general, "does_not_exist"), False)
+        self.assertRaises(AttributeError, getattr, self.settings.general, "_does_not_exist")
+
+    def test_compact_sections(self):
+        #### Internal fields are slots, and only converted values are instance attributes
+        self.assertDictEqual(self.settings.general.__dict__, {})
+        self.assertEqual(self.settings.general.test, "test value")
+        self.assertDictEqual(self.settings.general.__dict__, {"test": "test value"})
+
+        #### Sections without changes share an empty set of dirty keys
+        self.assertIs(self.settings.general._dirty_keys, self.settings.space_test._dirty_keys)
+        self.settings.general.test = "edited value"
+        self.assertSetEqual(self.settings.space_test._dirty_keys, set())
+
+        #### Keys repeated across sections are stored once
+        keys = [list(section._get_keys()) for section in self.settings.get_sections()]
+        self.assertIs(keys[1][0], keys[2][0])
+
+    def test_lazy_sections(self):
+        settings = SettingsManager("settings_test.txt", lazy_sections=True)
+
+        #### Sections are indexed but not parsed
+        section_names = [section.get_name() for section in settings.get_sections()]
+        self.assertListEqual(section_names, ["general", "space_test", "space_before_section"])
+        self.assertEqual(settings.general._loaded, False)
+        self.assertIsNone(settings._lines_raw)
+
+        #### Parsed on first use, with the same values as a full refresh
+        self.assertEqual(settings.general.test_int, 590)
+        self.assertEqual(settings.general._loaded, True)
+        self.assertEqual(settings.space_test._loaded, False)
+
+        for section in settings.get_sections():
+            expected_attributes = self.settings.get_section(section.get_name()).get_attributes()
+            self.assertDictEqual(section.get_attributes(), expected_attributes)
+
+        #### Unchanged
+        self.assertEqual(settings.refresh_and_has_changed(), False)
+
+    def test_lazy_sections_save(self):
+        shutil.copy("settings_test.txt", "settings_test_lazy.txt")
+
+        #### Nothing changed, so the file is never decoded
+        settings = SettingsManager("settings_test_lazy.txt", lazy_sections=True)
+        settings.save()
+        self.assertIsNone(settings._lines_raw)
+
+        #### Same output as a full refresh
+        for lazy_sections in [False, True]:
+            settings = SettingsManager("settings_test.txt", lazy_sections=lazy_sections)
+            settings.space_test.test = "edited value"
+            settings.add_entry("new_key", "new value", "general")
+            settings.add_section("new_section")
+            settings.add_entry("key", "value", "new_section")
+            settings.save(f"settings_test_lazy_{lazy_sections}.txt")
+
+            self.assertEqual(settings.space_test._start_index_in_file, 8)
+            self.assertEqual(settings.space_test._end_index_in_file, 16)
+
+        with open("settings_test_lazy_False.txt") as file: lines_expected = file.readlines()
+        with open("settings_test_lazy_True.txt") as file: lines = file.readlines()
+        self.assertListEqual(lines, lines_expected)
+
+        #### Entries above the first heading
+        with open("settings_test_lazy.txt", "w") as file: file.write("key = value\n[general]\n")
+        self.assertRaises(ValueError, SettingsManager, "settings_test_lazy.txt", lazy_sections=True)
+
+        os.remove("settings_test_lazy.txt")
+        os.remove("settings_test_lazy_False.txt")
+        os.remove("settings_test_lazy_True.txt")
+
+    def test_lazy_sections_changed(self):
+        shutil.copy("settings_test.txt", "settings_test_lazy.txt")
+
+        #### Headings split across the blocks the file is read in
+        block_size = settingsmanager.source._BLOCK_SIZE
+        settingsmanager.source._BLOCK_SIZE = 7
+
+        try:
+            settings = SettingsManager("settings_test_lazy.txt", lazy_sections=True)
+        finally:
+            settingsmanager.source._BLOCK_SIZE = block_size
+
+        for section in self.settings.get_sections():
+            self.assertDictEqual(settings.get_section(section.get_name()).get_attributes(), section.get_attributes())
+
+        #### Truncated by another writer before a section is used, so sections are read from the file as it is now
+        settings = SettingsManager("settings_test_lazy.txt", lazy_sections=True)
+        self.assertEqual(settings.general.test_int, 590)
+
+        with open("settings_test_lazy.txt", "w") as file: file.write("[space_test]\ntest = short\n")
+        self.assertEqual(settings.space_test.test, "short")
+        self.assertDictEqual(settings.space_before_section.get_attributes(), {})
+        self.assertEqual(settings.general.test_int, 590)
+
+        #### Saved over the file as it is now, with the sections no longer in it added back
+        settings.space_test.test = "edited"
+        settings.save()
+        settings = SettingsManager("settings_test_lazy.txt")
+        section_names = [section.get_name() for section in settings.get_sections()]
+        self.assertListEqual(section_names, ["space_test", "general", "space_before_section"])
+        self.assertDictEqual(settings.space_test.get_attributes(), {"test": "edited"})
+        self.assertEqual(settings.general.test_int, 590)
+
+        os.remove("settings_test_lazy.txt")
+
+    def test_cache(self):
+        shutil.copy("settings_test.txt", "settings_test_cache.txt")
+        self.assertEqual(os.path.basename(get_cache_path("settings_test_cache.txt")),
+                         ".settings_test_cache.txt.settingscache")
+        cache_dir = tempfile.mkdtemp()
+        cache_path = get_cache_path("settings_test_cache.txt", cache_dir)
+
+        #### Written on first load, with the same result as parsing
+        settings = SettingsManager("settings_test_cache.txt", use_cache=True, cache_dir=cache_dir)
+        self.assertEqual(os.path.exists(cache_path), True)
+
+        settings_cached = SettingsManager("settings_test_cache.txt", use_cache=True, cache_dir=cache_dir)
+        for section in self.settings.get_sections():
+            section_cached = settings_cached.get_section(section.get_name())
+            self.assertDictEqual(section_cached.get_attributes(), section.get_attributes())
+            self.assertEqual(section_cached._start_index_in_file, section._start_index_in_file)
+            self.assertEqual(section_cached._end_index_in_file, section._end_index_in_file)
+        self.assertListEqual(settings_cached._lines_raw, self.settings._lines_raw)
+
+        #### Loaded instead of parsing while the key matches
+        parse_flags = (True, True, True)
+        cache_key = make_cache_key("settings_test_cache.txt", settings._file_signature, parse_flags)
+        lines_raw, lines_cleaned, file_hash, sections = read_cache(cache_path, cache_key)
+        sections[0][4][0] = "from cache"
+        write_cache(cache_path, cache_key, (lines_raw, lines_cleaned, file_hash, sections))
+        settings_cached = SettingsManager("settings_test_cache.txt", use_cache=True, cache_dir=cache_dir)
+        self.assertEqual(settings_cached.general.test, "from cache")
+
+        #### Different parse flags
+        settings_unparsed = SettingsManager("settings_test_cache.txt", parse_int=False, use_cache=True,
+                                            cache_dir=cache_dir)
+        self.assertEqual(settings_unparsed.general.test, "test value")
+        self.assertEqual(settings_unparsed.general.test_int, "590")
+
+        #### File changed
+        settings.general.test = "edited value"
+        settings.save()
+        settings_cached = SettingsManager("settings_test_cache.txt", use_cache=True, cache_dir=cache_dir)
+        self.assertEqual(settings_cached.general.test, "edited value")
+
+        #### Corrupt cache
+        with open(cache_path, "wb") as file: file.write(b"not a cache")
+        settings = SettingsManager("settings_test_cache.txt", use_cache=True, cache_dir=cache_dir)
+        self.assertEqual(settings.general.test, "edited value")
+
+        #### Neither read nor written where others could have written it
+        cache_key = make_cache_key("settings_test_cache.txt", settings._file_signature, parse_flags)
+        self.assertIsNotNone(read_cache(cache_path, cache_key))
+        os.chmod(cache_path, 0o620)
+        self.assertIsNone(read_cache(cache_path, cache_key))
+        os.chmod(cache_path, 0o600)
+        os.chmod(cache_dir, 0o770)
+        self.assertIsNone(read_cache(cache_path, cache_key))
+        os.remove(cache_path)
+        write_cache(cache_path, cache_key, "data")
+        self.assertEqual(os.path.exists(cache_path), False)
+
+        shutil.rmtree(cache_dir)
+        os.remove("settings_test_cache.txt")
+
+    def test_thread_safe(self):
+        settings = SettingsManager("settings_test.txt", thread_safe=True)
+        errors = []
+        stop = threading.Event()
+
+        def read():
+            while not stop.is_set():
+                try:
+                    self.assertEqual(settings.general.test_int, 590)
+                    self.assertEqual(len(settings.space_test.get_attributes()), 3)
+                except Exception as error:
+                    errors.append(error)
+                    return
+
+        def write(key):
+            for index in range(200):
+                settings.set_value(key, index, "space_before_section")
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        writers = [threading.Thread(target=write, args=(f"key_{index}",)) for index in range(4)]
+
+        for thread in readers + writers:
+            thread.start()
+
+        for _ in range(50):
+            settings.refresh()
+
+        for thread in writers:
+            thread.join()
+
+        stop.set()
+
+        for thread in readers:
+            thread.join()
+
+        self.assertListEqual(errors, [])
+
+        #### Unchanged sections are kept, and others are swapped rather than cleared, so old references stay intact
+        general = settings.general
+        settings.refresh()
+        self.assertIs(settings.general, general)
+
+        general.test = "edited in memory"
+        settings.refresh()
+        self.assertIsNot(settings.general, general)
+        self.assertEqual(general.test, "edited in memory")
+        self.assertEqual(settings.general.test, "test value")
+
+        #### Values not yet converted are read without waiting for a refresh in progress
+        reads = []
+
+        def read_during_parse(phase, seconds):
+            if phase == "parse" and len(reads) == 0 and hasattr(settings, "_sections"):
+                reader = threading.Thread(target=lambda: reads.append(settings.general.test_float))
+                reader.start()
+                reader.join(5)
+                reads.append(reader.is_alive())
+
+        settings = None
+        settings = SettingsManager("settings_test.txt", thread_safe=True, stats_hook=read_during_parse)
+        settings.refresh()
+        self.assertListEqual(reads, [1.989, False])
+
+    def test_merge_on_save(self):
+        shutil.copy("settings_test.txt", "settings_test_merge.txt")
+        settings_a = SettingsManager("settings_test_merge.txt", merge_on_save=True)
+        settings_b = SettingsManager("settings_test_merge.txt", merge_on_save=True)
+
+        #### Changes to different keys are both kept
+        settings_a.general.test = "edited by a"
+        settings_a.add_entry("key_a", "value a", "general")
+        settings_a.save()
+
+        settings_b.space_test.test = "edited by b"
+        settings_b.add_section("section_b")
+        settings_b.add_entry("key_b", "value b", "section_b")
+        settings_b.save()
+
+        settings = SettingsManager("settings_test_merge.txt")
+        self.assertEqual(settings.general.test, "edited by a")
+        self.assertEqual(settings.general.key_a, "value a")
+        self.assertEqual(settings.space_test.test, "edited by b")
+        self.assertEqual(settings.section_b.key_b, "value b")
+        self.assertEqual(settings_b.general.key_a, "value a")
+
+        #### The same change on both sides is not a conflict
+        settings_a.refresh()
+        settings_a.general.test_int = 1
+        settings_b.general.test_int = 1
+        settings_a.save()
+        settings_b.save()
+
+        #### Conflicting changes
+        settings_a.refresh()
+        settings_b.refresh()
+        settings_a.general.test = "conflict a"
+        settings_a.save()
+        settings_b.general.test = "conflict b"
+
+        with self.assertRaises(SaveConflictError) as context:
+            settings_b.save()
+
+        expected_conflicts = [("general", "test", "edited by a", "conflict b", "conflict a")]
+        self.assertListEqual(context.exception.conflicts, expected_conflicts)
+        self.assertEqual(SettingsManager("settings_test_merge.txt").general.test, "conflict a")
+
+        settings_b._conflict_policy = "theirs"
+        settings_b.save()
+        self.assertEqual(SettingsManager("settings_test_merge.txt").general.test, "conflict a")
+
+        settings_a.general.test = "conflict a2"
+        settings_a.save()
+        settings_b.general.test = "conflict b2"
+        settings_b._conflict_policy = lambda section_name, key, base, ours, theirs: f"{ours} + {theirs}"
+        settings_b.save()
+        self.assertEqual(SettingsManager("settings_test_merge.txt").general.test, "conflict b2 + conflict a2")
+
+        self.assertRaises(ValueError, SettingsManager, "settings_test_merge.txt", conflict_policy="unknown")
+
+        os.remove("settings_test_merge.txt")
+        os.remove(".settings_test_merge.txt.lock")
+
+    def test_transaction(self):
+        shutil.copy("settings_test.txt", "settings_test_transaction.txt")
+        settings = SettingsManager("settings_test_transaction.txt")
+
+        #### Changes are saved when the block ends
+        with settings.transaction():
+            settings.general.test = "edited value"
+            settings.add_entry("new_key", "new value", "space_test")
+            settings.add_section("new_section")
+            settings.add_entry("key", "value", "new_section")
+
+        saved = SettingsManager("settings_test_transaction.txt")
+        self.assertEqual(saved.general.test, "edited value")
+        self.assertEqual(saved.space_test.new_key, "new value")
+        self.assertEqual(saved.new_section.key, "value")
+
+        #### Every change is undone if the block raises
+        settings.general.test_int = 1
+
+        with self.assertRaises(ValueError):
+            with settings.transaction():
+                settings.general.test = "rolled back"
+                settings.general.test_int = 2
+                settings.add_entry("rolled_back_key", "value", "general")
+                settings.add_section("rolled_back_section")
+                raise ValueError()
+
+        self.assertEqual(settings.general.test, "edited value")
+        self.assertEqual(settings.general.test_int, 1)
+        self.assertListEqual(list(settings.general._get_keys()), ["test", "test_boolean", "test_boolean2",
+                                                                  "test_int", "test_float"])
+        self.assertSetEqual(settings.general._dirty_keys, {"test_int"})
+        self.assertRaises(AttributeError, settings.get_section, "rolled_back_section")
+        self.assertEqual(SettingsManager("settings_test_transaction.txt").general.test, "edited value")
+
+        #### And if the save fails, leaving the unsaved changes from before the transaction to be saved
+        def fail_to_write(file_path):
+            raise OSError()
+
+        write_file = settings._write_file
+        settings._write_file = fail_to_write
+
+        with self.assertRaises(OSError):
+            with settings.transaction():
+                settings.general.test = "rolled back"
+                settings.add_entry("rolled_back_key", "value", "space_test")
+
+        settings._write_file = write_file
+        self.assertEqual(settings.general.test, "edited value")
+        self.assertSetEqual(settings.general._dirty_keys, {"test_int"})
+        self.assertSetEqual(settings.space_test._dirty_keys, set())
+        settings.save()
+
+        saved = SettingsManager("settings_test_transaction.txt")
+        self.assertEqual(saved.general.test, "edited value")
+        self.assertEqual(saved.general.test_int, 1)
+        self.assertListEqual(list(saved.space_test._get_keys()), ["test", "test_space", "test_two_spaces", "new_key"])
+
+        os.remove("settings_test_transaction.txt")
+
+    def test_update_many(self):
+        shutil.copy("settings_test.txt", "settings_test_update.txt")
+        settings = SettingsManager("settings_test_update.txt")
+
+        settings.update_many({"general": {"test": "edited value", "new_key": 1},
+                              settings.space_test: {"test": "edited value 2"}})
+
+        saved = SettingsManager("settings_test_update.txt")
+        self.assertEqual(saved.general.test, "edited value")
+        self.assertEqual(saved.general.new_key, 1)
+        self.assertEqual(saved.space_test.test, "edited value 2")
+
+        #### Nothing is changed if any section or key is invalid
+        self.assertRaises(AttributeError, settings.update_many, {"general": {"test": 1}, "missing": {"key": 1}})
+        self.assertRaises(ValueError, settings.update_many, {"general": {"test": 1, "_key": 1}})
+        self.assertRaises(AttributeError, settings.update_many, {"general": {"test": 1, "get_name": 1}})
+        self.assertEqual(settings.general.test, "edited value")
+        self.assertSetEqual(settings.general._dirty_keys, set())
+
+        os.remove("settings_test_update.txt")
+
+    def test_stats(self):
+        self.assertIsNone(self.settings.stats())
+
+        shutil.copy("settings_test.txt", "settings_test_stats.txt")
+        events = []
+        settings = SettingsManager("settings_test_stats.txt", stats_hook=lambda name, value: events.append((name, value)))
+        self.assertListEqual([name for name, _ in events if name in PHASES], ["read", "clean", "parse", "refresh"])
+        self.assertListEqual([event for event in events if event[0] in COUNTERS],
+                             [("refreshes", 1), ("bytes_read", os.path.getsize("settings_test.txt")),
+                              ("lines_parsed", 20), ("sections_rebuilt", 3)])
+
+        stats = settings.stats()
+        self.assertEqual(stats["phases"]["refresh"]["calls"], 1)
+        self.assertEqual(stats["phases"]["refresh"]["total"], stats["phases"]["refresh"]["last"])
+        self.assertEqual(stats["counters"]["lines_parsed"], 20)
+        self.assertEqual(stats["counters"]["bytes_read"], os.path.getsize("settings_test.txt"))
+        self.assertEqual(stats["counters"]["sections_rebuilt"], 3)
+
+        #### Saves
+        settings.save()
+        settings.general.test = "edited value"
+        settings.add_entry("new_key", "new value", "general")
+        settings.save()
+
+        stats = settings.stats()
+        self.assertEqual(stats["counters"]["saves_skipped"], 1)
+        self.assertEqual(stats["counters"]["saves"], 1)
+        self.assertEqual(stats["counters"]["lines_rendered"], 2)
+        self.assertEqual(stats["counters"]["bytes_written"], os.path.getsize("settings_test_stats.txt"))
+        self.assertEqual(stats["phases"]["save"]["calls"], 2)
+        self.assertEqual(stats["phases"]["write"]["calls"], 1)
+        self.assertIn(("saves_skipped", 1), events)
+        self.assertIn(("lines_rendered", 2), events)
+
+        settings.reset_stats()
+        self.assertEqual(settings.stats()["counters"]["saves"], 0)
+
+        os.remove("settings_test_stats.txt")
+
+    def test_schema(self):
+        shutil.copy("settings_test.txt", "settings_test_schema.txt")
+        schema = {
+            "general": {
+                "test": list,
+                "test_int": str,
+                "test_float": float,
+                "test_boolean2": bool,
+                "missing": (int, 10),
+                "missing_no_default": int,
+            },
+            "space_test": {"test_space": lambda value: value.upper()},
+            "not_in_file": {"key": (str, "default")},
+        }
+
+        for lazy_sections in (False, True):
+            settings = SettingsManager("settings_test_schema.txt", schema=schema, lazy_sections=lazy_sections)
+            self.assertListEqual(settings.general.test, ["test value"])
+            self.assertEqual(settings.general.test_int, "590")
+            self.assertEqual(settings.general.test_float, 1.989)
+            self.assertIs(settings.general.test_boolean2, False)
+            self.assertEqual(settings.general.missing, 10)
+            self.assertEqual(settings.space_test.test_space, "TEST2")
+            self.assertNotIn("missing_no_default", settings.general.get_attributes())
+            self.assertRaises(AttributeError, getattr, settings, "not_in_file")
+
+            #### Keys not in the schema are still guessed
+            self.assertIs(settings.general.test_boolean, True)
+
+        #### Defaults are not written unless changed
+        settings.general.test_int = "591"
+        settings.save()
+
+        with open("settings_test_schema.txt") as file:
+            self.assertNotIn("missing", file.read())
+
+        settings.general.missing = 11
+        settings.save()
+        self.assertEqual(SettingsManager("settings_test_schema.txt", schema=schema).general.missing, 11)
+
+        #### Every error is reported with its line number, and a failed refresh keeps the previous values
+        with open("settings_test_schema.txt", "a") as file:
+            file.write("\n[numbers]\nfirst = 1\nsecond = two\nthird = 3.0.1\n")
+
+        numbers_schema = {"numbers": {"first": int, "second": int, "third": float}}
+
+        for lazy_sections in (False, True):
+            with self.assertRaises(SchemaError) as context:
+                SettingsManager("settings_test_schema.txt", schema=numbers_schema, lazy_sections=lazy_sections)
+
+            self.assertListEqual([error[:4] for error in context.exception.errors],
+                                 [("numbers", "second", 25, "two"), ("numbers", "third", 26, "3.0.1")])
+
+        settings.refresh()
+        settings._schema["general"]["test_float"] = (int, None)
+        self.assertRaises(SchemaError, settings.refresh)
+        self.assertEqual(settings.general.test_float, 1.989)
+
+        self.assertRaises(ValueError, SettingsManager, "settings_test_schema.txt", schema={"general": {"test": 1}})
+        os.remove("settings_test_schema.txt")
+
+    def test_in_place_save(self):
+        shutil.copy("settings_test.txt", "settings_test_in_place.txt")
+        shutil.copy("settings_test.txt", "settings_test_replaced.txt")
+        settings = SettingsManager("settings_test_in_place.txt", in_place_save=True, instrument=True)
+        settings_replaced = SettingsManager("settings_test_replaced.txt")
+        inode = os.stat("settings_test_in_place.txt").st_ino
+
+        def change_both(change, patched=True):
+            change(settings)
+            change(settings_replaced)
+            settings.save()
+            settings_replaced.save()
+
+            with open("settings_test_in_place.txt", "rb") as file: data = file.read()
+            with open("settings_test_replaced.txt", "rb") as file: self.assertEqual(data, file.read())
+            self.assertEqual(os.stat("settings_test_in_place.txt").st_ino == inode, patched)
+            self.assertFalse(os.path.exists(get_patch_path("settings_test_in_place.txt")))
+
+        #### Same length, so only the line is written
+        change_both(lambda manager: setattr(manager.space_test, "test_space", "test9"))
+        counters = settings.stats()["counters"]
+        self.assertEqual(counters["saves_patched"], 1)
+        self.assertEqual(counters["bytes_not_rewritten"],
+                         os.path.getsize("settings_test.txt") - len("test_space = test9\n"))
+
+        #### Longer, shorter and new lines rewrite from the first change
+        change_both(lambda manager: setattr(manager.space_before_section, "test", "a longer test value"))
+        change_both(lambda manager: setattr(manager.space_before_section, "test", "short"))
+        change_both(lambda manager: manager.add_entry("new_key", "new value", "space_before_section"))
+        change_both(lambda manager: manager.add_section("new_section").add_entry("key", "value"))
+        self.assertEqual(settings.stats()["counters"]["saves_patched"], 5)
+        self.assertFalse(settings.refresh_and_has_changed())
+
+        #### Rewriting most of the file replaces it instead
+        change_both(lambda manager: setattr(manager.general, "test", "a longer test value"), patched=False)
+        self.assertEqual(settings.stats()["counters"]["saves_patched"], 5)
+
+        #### A patch interrupted by a crash is finished by the next read, unless the file has since been replaced
+        file_stat = os.stat("settings_test_in_place.txt")
+        _write_journal("settings_test_in_place.txt", (file_stat.st_dev, file_stat.st_ino), [(1, b"GENERAL")],
+                       file_stat.st_size)
+        self.assertEqual(SettingsManager("settings_test_in_place.txt").GENERAL.test, "a longer test value")
+        self.assertFalse(os.path.exists(get_patch_path("settings_test_in_place.txt")))
+
+        _write_journal("settings_test_in_place.txt", (file_stat.st_dev, file_stat.st_ino + 1), [(1, b"xxxxxxx")], 0)
+        self.assertEqual(SettingsManager("settings_test_in_place.txt").GENERAL.test, "a longer test value")
+        self.assertFalse(os.path.exists(get_patch_path("settings_test_in_place.txt")))
+
+        #### Readers wait for a patch in progress, holding the lock, rather than finishing it themselves
+        readers = []
+
+        with lock_file("settings_test_in_place.txt"):
+            _write_journal("settings_test_in_place.txt", (file_stat.st_dev, file_stat.st_ino), [(1, b"general")],
+                           file_stat.st_size)
+            reader = threading.Thread(target=lambda: readers.append(SettingsManager("settings_test_in_place.txt")))
+            reader.start()
+            reader.join(0.2)
+            self.assertTrue(reader.is_alive())
+
+            with open("settings_test_in_place.txt", "r+b") as file: file.write(b"[general")
+            os.remove(get_patch_path("settings_test_in_place.txt"))
+
+        reader.join()
+        self.assertEqual(readers[0].general.test, "a longer test value")
+
+        #### Readers that cannot write the file leave the journal for a writer
+        _write_journal("settings_test_in_place.txt", (file_stat.st_dev, file_stat.st_ino), [(1, b"GENERAL")],
+                       file_stat.st_size)
+        os.chmod("settings_test_in_place.txt", 0o444)
+
+        # Root can write the file regardless
+        if not os.access("settings_test_in_place.txt", os.W_OK):
+            self.assertEqual(SettingsManager("settings_test_in_place.txt").general.test, "a longer test value")
+            self.assertTrue(os.path.exists(get_patch_path("settings_test_in_place.txt")))
+
+        os.chmod("settings_test_in_place.txt", 0o644)
+        self.assertEqual(SettingsManager("settings_test_in_place.txt").GENERAL.test, "a longer test value")
+        self.assertFalse(os.path.exists(get_patch_path("settings_test_in_place.txt")))
+
+        #### Files with "\r\n" line endings are replaced as before
+        with open("settings_test_in_place.txt", "wb") as file: file.write(b"[general]\r\ntest = value\r\n")
+        settings = SettingsManager("settings_test_in_place.txt", in_place_save=True, instrument=True)
+        settings.general.test = "other"
+        settings.save()
+        self.assertEqual(settings.stats()["counters"]["saves_patched"], 0)
+        self.assertEqual(SettingsManager("settings_test_in_place.txt").general.test, "other")
+
+        #### Lines inserted and dropped in the same save are rewritten, even when the line count is unchanged
+        contents = "[pad]\n" + "".join(f"k{index:02} = 0\n" for index in range(40))
+        contents += "[a]\nx = 1\n[bbb]\ny = 2\n[ccc]\nz = 3\nw = 4\n"
+
+        for file_path in ("settings_test_in_place.txt", "settings_test_replaced.txt"):
+            with open(file_path, "w") as file: file.write(contents)
+
+        settings = SettingsManager("settings_test_in_place.txt", in_place_save=True, instrument=True)
+        settings_replaced = SettingsManager("settings_test_replaced.txt")
+        inode = os.stat("settings_test_in_place.txt").st_ino
+        change_both(lambda manager: (manager.add_entry("q", 5, "a"), manager.remove_entry("z", "ccc")))
+        self.assertEqual(settings.stats()["counters"]["saves_patched"], 1)
+        self.assertEqual(SettingsManager("settings_test_in_place.txt").a.q, 5)
+
+        os.remove("settings_test_in_place.txt")
+        os.remove("settings_test_replaced.txt")
+        os.remove(get_lock_path("settings_test_in_place.txt"))
+
+    def test_journal(self):
+        shutil.copy("settings_test.txt", "settings_test_journal.txt")
+        journal_path = get_journal_path("settings_test_journal.txt")
+        settings = SettingsManager("settings_test_journal.txt", journal=True, journal_threshold=6, instrument=True)
+
+        #### Changes are appended to the journal rather than saved to the file
+        settings.set_value("test_int", 1, "general")
+        settings.add_entry("new_key", "new value", "space_test")
+        settings.add_section("new_section")
+        settings.new_section.key = "value"
+
+        with open("settings_test.txt") as file: lines = file.readlines()
+        with open("settings_test_journal.txt") as file: self.assertListEqual(file.readlines(), lines)
+        with open(journal_path) as file:
+            self.assertListEqual(file.readlines(), ["general.test_int = 1\n", "space_test.new_key = new value\n",
+                                                    "[new_section]\n", "new_section.key = value\n"])
+
+        #### Refreshing replays the journal over the file
+        for lazy_sections in (False, True):
+            replayed = SettingsManager("settings_test_journal.txt", journal=True, lazy_sections=lazy_sections)
+            self.assertEqual(replayed.general.test_int, 1)
+            self.assertEqual(replayed.space_test.new_key, "new value")
+            self.assertEqual(replayed.new_section.key, "value")
+            self.assertSetEqual(replayed.general._dirty_keys, {"test_int"})
+
+        self.assertEqual(SettingsManager("settings_test_journal.txt").general.test_int, 590)
+
+        #### A record cut short by a crash is dropped
+        with open(journal_path, "a") as file: file.write("general.test = cut sh")
+        settings.refresh()
+        self.assertEqual(settings.general.test, "test value")
+        self.assertEqual(os.path.getsize(journal_path), len("".join(["general.test_int = 1\n",
+                                                                     "space_test.new_key = new value\n",
+                                                                     "[new_section]\n", "new_section.key = value\n"])))
+
+        #### Changes in a transaction are saved to the file when it ends, which empties the journal
+        with settings.transaction():
+            settings.general.test = "transaction value"
+
+        self.assertFalse(os.path.exists(journal_path))
+        self.assertEqual(SettingsManager("settings_test_journal.txt").general.test, "transaction value")
+        self.assertEqual(SettingsManager("settings_test_journal.txt").new_section.key, "value")
+
+        #### Reaching the threshold folds the journal into the file
+        for value in range(6):
+            settings.general.test_int = value
+
+        self.assertFalse(os.path.exists(journal_path))
+        self.assertEqual(SettingsManager("settings_test_journal.txt").general.test_int, 5)
+        self.assertEqual(settings.stats()["counters"]["journal_appends"], 10)
+        self.assertEqual(settings.stats()["counters"]["journal_compactions"], 2)
+
+        #### A crash after saving but before emptying the journal replays it over the saved sections
+        settings.add_section("extra")
+        settings.extra.key = "value"
+        settings.save()
+        with open(journal_path, "w") as file: file.write("[extra]\nextra.key = value\n")
+
+        replayed = SettingsManager("settings_test_journal.txt", journal=True)
+        self.assertEqual(replayed.extra.key, "value")
+        replayed.save()
+        with open("settings_test_journal.txt") as file: self.assertEqual(file.read().count("[extra]"), 1)
+
+        #### Or does so on a background thread
+        settings = SettingsManager("settings_test_journal.txt", journal=True, journal_threshold=2,
+                                   compact_in_background=True, thread_safe=True)
+        settings.general.test_int = 10
+        settings.general.test_int = 11
+        settings._compaction_thread.join()
+        self.assertFalse(os.path.exists(journal_path))
+        self.assertEqual(SettingsManager("settings_test_journal.txt").general.test_int, 11)
+
+        self.assertRaises(ValueError, SettingsManager, "settings_test_journal.txt", journal=True, merge_on_save=True)
+        self.assertRaises(ValueError, SettingsManager, "settings_test_journal.txt", compact_in_background=True)
+        os.remove("settings_test_journal.txt")
+
+    def test_load_many(self):
+        os.makedirs("settings_test_load_many", exist_ok=True)
+        paths = ["settings_test.txt", "settings_test_load_many", "settings_test.txt"]
+
+        for use_processes in (False, True):
+            results = SettingsManager.load_many(paths, max_workers=2, use_processes=use_processes, parse_int=False)
+
+            #### Managers or errors, in the order of paths
+            self.assertIsInstance(results[0], SettingsManager)
+            self.assertIsInstance(results[1], IsADirectoryError)
+            self.assertIsNot(results[0], results[2])
+
+            for settings in (results[0], results[2]):
+                self.assertEqual(settings.general.test, "test value")
+                self.assertEqual(settings.general.test_int, "590")
+                self.assertListEqual(settings._lines_raw, self.settings._lines_raw)
+
+                for section in self.settings.get_sections():
+                    section_loaded = settings.get_section(section.get_name())
+                    self.assertEqual(section_loaded._start_index_in_file, section._start_index_in_file)
+                    self.assertEqual(section_loaded._end_index_in_file, section._end_index_in_file)
+
+        #### Loaded managers save like any other
+        shutil.copy("settings_test.txt", "settings_test_load_many/settings_test.txt")
+        settings, = SettingsManager.load_many(["settings_test_load_many/settings_test.txt"], use_processes=True)
+        settings.add_entry("new_key", "new value", "general")
+        settings.save()
+        self.assertEqual(SettingsManager("settings_test_load_many/settings_test.txt").general.new_key, "new value")
+
+        self.assertRaises(ValueError, SettingsManager.load_many, paths, use_processes=True, lazy_sections=True)
+        shutil.rmtree("settings_test_load_many")
+
+    def test_query(self):
+        with open("settings_test_query.txt", "w") as file:
+            file.write("[database]\ndb_host = localhost\ndb_port = 5432\ntimeout = 30\n\n"
+                       "[cache]\ntimeout = 5\nsize = 64\n\n[api]\ndb_url = postgres://\nretries = 3\n")
+
+        settings = SettingsManager("settings_test_query.txt")
+
+        #### Glob patterns, sorted by section name then key
+        self.assertListEqual(settings.find(key_pattern="db_*"), [("api", "db_url", "postgres://"),
+                                                                  ("database", "db_host", "localhost"),
+                                                                  ("database", "db_port", 5432)])
+        self.assertListEqual(settings.find("c*", "*"), [("cache", "size", 64), ("cache", "timeout", 5)])
+        self.assertListEqual(settings.find("*", "timeout"), [("cache", "timeout", 5), ("database", "timeout", 30)])
+        self.assertListEqual(settings.find("data?ase", "[dt]*_port"), [("database", "db_port", 5432)])
+        self.assertListEqual(settings.find("missing"), [])
+        self.assertListEqual([section.get_name() for section in settings.sections_with("timeout")],
+                             ["cache", "database"])
+        self.assertListEqual(settings.sections_with("missing"), [])
+        self.assertDictEqual(settings.prefix("database", "db_"), {"db_host": "localhost", "db_port": 5432})
+        self.assertDictEqual(settings.prefix(settings.api, "x"), {})
+        self.assertRaises(AttributeError, settings.prefix, "missing", "db_")
+
+        #### Kept up to date as keys and sections are added
+        settings.add_entry("db_user", "admin", "database")
+        settings.api.timeout = 10
+        settings.add_section("queue")
+        settings.queue.timeout = 1
+        settings.database.timeout = 60
+        self.assertDictEqual(settings.prefix("database", "db_"), {"db_host": "localhost", "db_port": 5432,
+                                                                   "db_user": "admin"})
+        self.assertListEqual(settings.find("*", "timeout"), [("api", "timeout", 10), ("cache", "timeout", 5),
+                                                              ("database", "timeout", 60), ("queue", "timeout", 1)])
+
+        #### And as refreshes replace sections
+        settings.save()
+
+        with open("settings_test_query.txt", "a") as file: file.write("\n[worker]\ntimeout = 2\n")
+
+        cache = settings.cache
+        settings.refresh()
+        self.assertIs(settings.cache, cache)
+        self.assertListEqual([section.get_name() for section in settings.sections_with("timeout")],
+                             ["api", "cache", "database", "queue", "worker"])
+
+        with open("settings_test_query.txt", "w") as file: file.write("[database]\ndb_host = remote\n")
+
+        settings.refresh()
+        self.assertListEqual(settings.find(), [("database", "db_host", "remote")])
+
+        # Keys added to a section no longer in the manager are not indexed
+        cache.db_name = "stale"
+        self.assertListEqual(settings.find(key_pattern="db_*"), [("database", "db_host", "remote")])
+
+        #### And after a transaction is rolled back
+        with self.assertRaises(RuntimeError):
+            with settings.transaction():
+                settings.add_entry("db_port", 1, "database")
+                self.assertEqual(len(settings.find(key_pattern="db_*")), 2)
+                raise RuntimeError
+
+        self.assertListEqual(settings.find(key_pattern="db_*"), [("database", "db_host", "remote")])
+
+        #### Lazily loaded sections
+        settings = SettingsManager("settings_test_query.txt", lazy_sections=True)
+        self.assertListEqual(settings.find(key_pattern="db_*"), [("database", "db_host", "remote")])
+
+        with open("settings_test_query.txt", "w") as file: file.write("[database]\ndb_port = 1\n")
+
+        settings.refresh()
+        self.assertListEqual(settings.find(key_pattern="db_*"), [("database", "db_port", 1)])
+        os.remove("settings_test_query.txt")
+
     def test_get_sections(self):
         sections = self.settings.get_sections()
         section_names = [section.get_name() for section in sections]
@@ -188,6 +1192,32 @@ class TestSettingsManager(unittest.TestCase):
         #### Tidy files
         os.remove("settings_test_has_changed.txt")
 
+    def test_refresh_and_has_changed_check_stat(self):
+        shutil.copy("settings_test.txt", "settings_test_check_stat.txt")
+        settings = SettingsManager("settings_test_check_stat.txt", check_stat=True)
+
+        #### No change, answered by stat
+        self.assertEqual(settings.refresh_and_has_changed(), False)
+        self.assertDictEqual(settings.get_poll_counts(), {"stat": 1, "hash": 0, "parsed": 0})
+
+        #### Touched but identical, answered by hash
+        file_stat = os.stat("settings_test_check_stat.txt")
+        os.utime("settings_test_check_stat.txt", ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+        self.assertEqual(settings.refresh_and_has_changed(), False)
+        self.assertEqual(settings.refresh_and_has_changed(), False)
+        self.assertDictEqual(settings.get_poll_counts(), {"stat": 2, "hash": 1, "parsed": 0})
+
+        #### Edited key
+        with open("settings_test_check_stat.txt", "r") as file: lines = file.readlines()
+        lines[1] = "test = edited value\n"
+        with open("settings_test_check_stat.txt", "w") as file: file.writelines(lines)
+        self.assertEqual(settings.refresh_and_has_changed(), True)
+        self.assertEqual(settings.general.test, "edited value")
+        self.assertEqual(settings.refresh_and_has_changed(), False)
+        self.assertDictEqual(settings.get_poll_counts(), {"stat": 3, "hash": 1, "parsed": 1})
+
+        os.remove("settings_test_check_stat.txt")
+
     def test_read_file(self):
         #### Reset line lists
         self.settings._lines_raw = None
@@ -237,6 +1267,29 @@ class TestSettingsManager(unittest.TestCase):
         self.assertEqual(self.settings.space_before_section._start_index_in_file, 20)
         self.assertEqual(self.settings.space_before_section._end_index_in_file, 22)
 
+    def test_insert_lines(self):
+        #### Batch insert into several sections matches inserting one line at a time
+        settings_single = SettingsManager("settings_test.txt")
+        settings_single._insert_line_into_section(settings_single.general, "a\n")
+        settings_single._insert_line_into_section(settings_single.space_test, "b\n")
+        settings_single._insert_line_into_section(settings_single.general, "c\n")
+        settings_single._insert_line_into_section(settings_single.space_before_section, "d\n")
+
+        self.settings._insert_lines([
+            (self.settings.space_before_section._end_index_in_file, "d\n"),
+            (self.settings.general._end_index_in_file, "a\n"),
+            (self.settings.space_test._end_index_in_file, "b\n"),
+            (self.settings.general._end_index_in_file, "c\n")
+        ])
+
+        self.assertListEqual(self.settings._lines_raw, settings_single._lines_raw)
+        self.assertListEqual(self.settings._lines_cleaned, settings_single._lines_cleaned)
+
+        for section in self.settings.get_sections():
+            section_single = settings_single.get_section(section.get_name())
+            self.assertEqual(section._start_index_in_file, section_single._start_index_in_file)
+            self.assertEqual(section._end_index_in_file, section_single._end_index_in_file)
+
     def test_insert_new_section_line(self):
         new_section = Section("new_section")
         self.settings._insert_new_section_line(new_section)
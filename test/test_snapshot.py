@@ -0,0 +1,115 @@
+import sys
+
+sys.path.append("../")
+
+import unittest
+from settingsmanager import SettingsManager
+from settingsmanager import SettingsSnapshot
+import multiprocessing
+import os
+
+
+def read_in_worker(name, queue):
+    snapshot = SettingsSnapshot(name)
+    queue.put((snapshot.get_generation(), snapshot.general.get_attributes(), snapshot.database.host))
+    snapshot.close()
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.name = f"settings_test_snapshot_{os.getpid()}"
+
+        with open("settings_test_snapshot.txt", "w") as file:
+            file.write("[general]\nname = app\nport = 80\nratio = 0.5\ndebug = False\n\n[database]\nhost = localhost\n")
+
+    def tearDown(self):
+        os.remove("settings_test_snapshot.txt")
+
+    def test_snapshot(self):
+        settings = SettingsManager("settings_test_snapshot.txt")
+        settings.publish_snapshot(self.name)
+
+        with self.assertRaises(RuntimeError):
+            settings.publish_snapshot(self.name)
+
+        snapshot = SettingsSnapshot(self.name)
+        self.assertEqual(snapshot.get_generation(), 1)
+
+        #### Values keep their types, sections and keys their file order
+        self.assertEqual(snapshot.general.name, "app")
+        self.assertEqual(snapshot.general.port, 80)
+        self.assertEqual(snapshot.general.ratio, 0.5)
+        self.assertIs(snapshot.general.debug, False)
+        self.assertListEqual(list(snapshot.general.get_attributes()), ["name", "port", "ratio", "debug"])
+        self.assertListEqual([section.get_name() for section in snapshot.get_sections()], ["general", "database"])
+        self.assertEqual(snapshot.get_section("database").host, "localhost")
+
+        with self.assertRaises(AttributeError):
+            snapshot.missing
+
+        with self.assertRaises(AttributeError):
+            snapshot.general.missing
+
+        with self.assertRaises(AttributeError):
+            snapshot.get_section("missing")
+
+        #### Read-only
+        with self.assertRaises(AttributeError):
+            snapshot.general.port = 81
+
+        #### Unchanged until the manager refreshes or saves a change
+        self.assertFalse(snapshot.refresh_and_has_changed())
+        self.assertFalse(settings.refresh_and_has_changed())
+        settings.save()
+        self.assertFalse(snapshot.refresh_and_has_changed())
+        self.assertEqual(snapshot.get_generation(), 1)
+
+        general = snapshot.general
+        settings.general.port = 8080
+        self.assertEqual(snapshot.general.port, 80)
+        settings.save()
+
+        self.assertTrue(snapshot.refresh_and_has_changed())
+        self.assertEqual(snapshot.get_generation(), 2)
+        self.assertEqual(snapshot.general.port, 8080)
+
+        # Sections taken before keep their generation
+        self.assertEqual(general.port, 80)
+        self.assertEqual(general.name, "app")
+
+        with open("settings_test_snapshot.txt", "a") as file:
+            file.write("\n[cache]\nsize = 64\n")
+
+        settings.refresh()
+        self.assertTrue(snapshot.refresh_and_has_changed())
+        self.assertEqual(snapshot.cache.size, 64)
+
+        snapshot.close()
+        settings.stop_publishing_snapshot()
+
+        with self.assertRaises(FileNotFoundError):
+            SettingsSnapshot(self.name)
+
+    def test_worker_process(self):
+        settings = SettingsManager("settings_test_snapshot.txt")
+        settings.publish_snapshot(self.name)
+
+        try:
+            queue = multiprocessing.Queue()
+            process = multiprocessing.Process(target=read_in_worker, args=(self.name, queue))
+            process.start()
+            generation, general, host = queue.get(timeout=30)
+            process.join()
+
+            self.assertEqual(generation, 1)
+            self.assertDictEqual(general, {"name": "app", "port": 80, "ratio": 0.5, "debug": False})
+            self.assertEqual(host, "localhost")
+
+            #### The worker exiting leaves the snapshot in place
+            self.assertEqual(SettingsSnapshot(self.name).general.port, 80)
+        finally:
+            settings.stop_publishing_snapshot()
+
+
+if __name__ == "__main__":
+    unittest.main()
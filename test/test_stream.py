@@ -0,0 +1,44 @@
+import sys
+
+sys.path.append("../")
+
+import unittest
+from settingsmanager import SettingsManager
+from settingsmanager import iter_entries
+import os
+
+
+class TestStream(unittest.TestCase):
+    def test_iter_entries(self):
+        entries = list(iter_entries("settings_test.txt"))
+        self.assertEqual(entries[0], ("general", "test", "test value", 2))
+        self.assertEqual(entries[3], ("general", "test_int", 590, 5))
+        self.assertEqual(entries[5], ("space_test", "test", "test1", 10))
+
+        #### Same entries and values as a refresh
+        settings = SettingsManager("settings_test.txt")
+        expected = [(section.get_name(), key, value) for section in settings.get_sections()
+                    for key, value in section.get_attributes().items()]
+        self.assertListEqual([entry[:3] for entry in entries], expected)
+
+    def test_iter_entries_options(self):
+        entries = list(iter_entries("settings_test.txt", sections=["space_test"]))
+        self.assertListEqual(entries, [("space_test", "test", "test1", 10), ("space_test", "test_space", "test2", 12),
+                                       ("space_test", "test_two_spaces", "test3", 15)])
+
+        entries = list(iter_entries("settings_test.txt", sections=["general"], parse_bool=False, parse_int=False))
+        self.assertListEqual([value for _, _, value, _ in entries], ["test value", "True", "False", "590", 1.989])
+
+    def test_iter_entries_errors(self):
+        with open("settings_test_stream.txt", "w") as file: file.write("key = value\n[general]\n")
+        self.assertRaises(ValueError, list, iter_entries("settings_test_stream.txt"))
+
+        with open("settings_test_stream.txt", "w") as file: file.write("[general]\nkey = 1\nkey = 2\n")
+        self.assertRaises(AttributeError, list, iter_entries("settings_test_stream.txt"))
+
+        os.remove("settings_test_stream.txt")
+        self.assertRaises(FileNotFoundError, list, iter_entries("settings_test_stream.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import sys
+
+sys.path.append("../")
+
+import unittest
+from settingsmanager import SettingsManager
+from settingsmanager.watcher import FileWatcher
+import os
+import shutil
+import threading
+import time
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        shutil.copy("settings_test.txt", "settings_test_watch.txt")
+        self.settings = SettingsManager("settings_test_watch.txt", thread_safe=True)
+        self.changes = []
+        self.changed = threading.Event()
+
+    def tearDown(self):
+        self.settings.stop_watching()
+        os.remove("settings_test_watch.txt")
+
+    def on_change(self, settings):
+        self.changes.append(settings.general.test)
+        self.changed.set()
+
+    def edit_test_value(self, value, file_path="settings_test_watch.txt"):
+        with open("settings_test.txt", "r") as file: lines = file.readlines()
+        lines[1] = f"test = {value}\n"
+        with open(file_path, "w") as file: file.writelines(lines)
+
+    def test_watch_needs_thread_safe(self):
+        settings = SettingsManager("settings_test_watch.txt")
+        self.assertRaises(ValueError, settings.watch, self.on_change)
+
+    def test_watch(self):
+        self.settings.watch(self.on_change, debounce_ms=50, poll_interval_ms=20)
+        self.edit_test_value("edited value")
+
+        self.assertEqual(self.changed.wait(5), True)
+        self.assertListEqual(self.changes, ["edited value"])
+        self.assertEqual(self.settings.general.test, "edited value")
+
+        #### Already watching
+        self.assertRaises(RuntimeError, self.settings.watch, self.on_change)
+
+    def test_watch_atomic_replace(self):
+        self.settings.watch(self.on_change, debounce_ms=50, poll_interval_ms=20)
+        self.edit_test_value("replaced value", "settings_test_watch.txt.new")
+        os.replace("settings_test_watch.txt.new", "settings_test_watch.txt")
+
+        self.assertEqual(self.changed.wait(5), True)
+        self.assertEqual(self.settings.general.test, "replaced value")
+
+    def test_watch_debounce(self):
+        self.settings.watch(self.on_change, debounce_ms=300, poll_interval_ms=20)
+
+        for index in range(5):
+            self.edit_test_value(f"value {index}")
+            time.sleep(0.01)
+
+        self.assertEqual(self.changed.wait(5), True)
+        time.sleep(0.5)
+        self.assertListEqual(self.changes, ["value 4"])
+
+    def test_watch_unchanged_content(self):
+        self.settings.watch(self.on_change, debounce_ms=50, poll_interval_ms=20)
+        os.utime("settings_test_watch.txt")
+
+        self.assertEqual(self.changed.wait(0.5), False)
+
+    def test_stop_watching(self):
+        self.settings.watch(self.on_change, debounce_ms=50, poll_interval_ms=20)
+        self.settings.stop_watching()
+        self.edit_test_value("edited value")
+
+        self.assertEqual(self.changed.wait(0.5), False)
+        self.assertEqual(self.settings.general.test, "test value")
+
+    def test_stat_polling_fallback(self):
+        watcher = FileWatcher("settings_test_watch.txt", self.changed.set, debounce_ms=50, poll_interval_ms=20,
+                              use_inotify=False)
+        watcher.start()
+        self.assertEqual(watcher.is_using_inotify(), False)
+
+        self.edit_test_value("edited value")
+        time.sleep(0.01)
+        os.utime("settings_test_watch.txt", ns=(0, time.time_ns() + 10 ** 9))
+
+        self.assertEqual(self.changed.wait(5), True)
+        watcher.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()